@@ -0,0 +1,72 @@
+"""Compare row-wise get_area_name against the vectorized assign_areas path.
+
+Usage: python benchmarks/bench_area_assignment.py [n_rows ...] [--areas N]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.data_processor import DataProcessor
+
+
+def make_points(n, seed=0):
+    """Random accident coordinates spread over greater Coimbatore"""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'Latitude': rng.uniform(10.85, 11.15, n),
+        'Longitude': rng.uniform(76.85, 77.10, n),
+    })
+
+
+def make_gazetteer(n, seed=1):
+    """Synthetic gazetteer of n localities layered on top of the built-in areas"""
+    processor = DataProcessor()
+    areas = dict(processor.coimbatore_areas)
+    rng = np.random.default_rng(seed)
+    for i in range(n):
+        areas[f'Locality_{i}'] = (rng.uniform(10.85, 11.15), rng.uniform(76.85, 77.10))
+    return areas
+
+
+def run(n_rows, areas, apply_limit):
+    processor = DataProcessor()
+    processor.coimbatore_areas = areas
+    df = make_points(n_rows)
+
+    start = time.perf_counter()
+    fast = processor.assign_areas(df)
+    fast_time = time.perf_counter() - start
+
+    if n_rows <= apply_limit:
+        start = time.perf_counter()
+        slow = df.apply(lambda row: processor.get_area_name(row['Latitude'], row['Longitude']), axis=1)
+        slow_time = time.perf_counter() - start
+        match = bool((slow == fast).all())
+        print(f"{n_rows:>10,} rows | {len(areas):>5} areas | apply {slow_time:8.3f}s | "
+              f"assign_areas {fast_time:8.3f}s | speedup {slow_time / fast_time:8.1f}x | identical: {match}")
+    else:
+        print(f"{n_rows:>10,} rows | {len(areas):>5} areas | apply    (skipped) | "
+              f"assign_areas {fast_time:8.3f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('sizes', nargs='*', type=int, default=[10_000, 100_000, 2_000_000])
+    parser.add_argument('--areas', type=int, default=0, help="extra synthetic localities")
+    parser.add_argument('--apply-limit', type=int, default=200_000,
+                        help="skip the slow apply path above this many rows")
+    args = parser.parse_args()
+
+    areas = make_gazetteer(args.areas)
+    for n in args.sizes:
+        run(n, areas, args.apply_limit)
+
+
+if __name__ == '__main__':
+    main()
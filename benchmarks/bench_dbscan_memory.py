@@ -0,0 +1,54 @@
+"""Peak memory and runtime of metric DBSCAN at several neighbor-pair budgets.
+
+Each run happens in a fresh process so its peak resident memory is its own.
+
+Usage: python benchmarks/bench_dbscan_memory.py [n_rows ...] [--budgets PAIRS ...] [--eps METERS]
+"""
+import argparse
+import os
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_grid_clustering import make_accidents
+from utils.metric_dbscan import MetricDBSCAN
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    scale = 1 if sys.platform == 'darwin' else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 1024 ** 2
+
+
+def run(n, budget, eps_meters, min_samples):
+    coords, _ = make_accidents(n)
+    before = peak_rss_mb()
+    start = time.perf_counter()
+    labels = MetricDBSCAN(eps_meters, min_samples, batch_neighbors=budget).fit_predict(coords)
+    elapsed = time.perf_counter() - start
+    return elapsed, before, peak_rss_mb(), int(labels.max()) + 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('sizes', nargs='*', type=int, default=[100_000, 500_000, 2_000_000])
+    parser.add_argument('--budgets', nargs='+', type=int, default=[1_000_000, 5_000_000])
+    parser.add_argument('--eps', type=float, default=100.0)
+    parser.add_argument('--min-samples', type=int, default=10)
+    args = parser.parse_args()
+
+    for n in args.sizes:
+        for budget in args.budgets:
+            with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as pool:
+                elapsed, before, peak, clusters = pool.submit(run, n, budget, args.eps, args.min_samples).result()
+            print(f"{n:>10,} rows | budget {budget:>10,} pairs | {elapsed:7.2f}s | peak {peak:7.0f} MB "
+                  f"(+{peak - before:6.0f} MB over the input) | {clusters:,} clusters")
+
+
+if __name__ == '__main__':
+    main()
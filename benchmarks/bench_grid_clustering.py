@@ -0,0 +1,74 @@
+"""Compare raw-point clustering against grid pre-aggregated weighted clustering.
+
+Usage: python benchmarks/bench_grid_clustering.py [n_rows ...] [--cell METERS]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+from sklearn.metrics import adjusted_rand_score
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.ml_model import HotspotModel
+
+
+def make_accidents(n, n_junctions=5000, seed=0):
+    """Accidents snapped to junctions, with a few meters of recording jitter"""
+    rng = np.random.default_rng(seed)
+    junctions = np.column_stack([rng.normal(11.0, 0.04, n_junctions), rng.normal(76.96, 0.04, n_junctions)])
+    popularity = rng.pareto(1.5, n_junctions) + 1
+    picks = rng.choice(n_junctions, n, p=popularity / popularity.sum())
+    jitter = rng.normal(0, 0.00003, (n, 2)) * (rng.random((n, 1)) < 0.5)
+    return (junctions[picks] + jitter).round(6), rng.integers(1, 5, n)
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def run(n, cell_meters, raw_limit):
+    coords, severity = make_accidents(n)
+    model = HotspotModel()
+    model.metric_dbscan.set_params(eps_meters=100, min_samples=10)
+
+    engines = {
+        'K-Means (k=8)': lambda grid: model.detect_hotspots_kmeans(coords, 8, grid_meters=grid)[0],
+        'DBSCAN (100 m)': lambda grid: model.detect_hotspots_dbscan_meters(coords, grid_meters=grid),
+    }
+    if n <= raw_limit:
+        engines['DBSCAN (scaled)'] = lambda grid: model.detect_hotspots_dbscan(coords, grid_meters=grid)
+
+    for name, engine in engines.items():
+        gridded, grid_time = timed(lambda: engine(cell_meters))
+        reduction = model.grid.reduction_
+        line = f"{n:>10,} rows | {name:<16} | grid {grid_time:7.2f}s ({reduction:6.1f} rows/cell)"
+        if n <= raw_limit:
+            raw, raw_time = timed(lambda: engine(None))
+            line += f" | raw {raw_time:7.2f}s | speedup {raw_time / grid_time:6.1f}x | ARI {adjusted_rand_score(raw, gridded):.3f}"
+        print(line)
+
+    # Severity-weighted cells just change the weights fed to the same engines
+    _, weighted_time = timed(lambda: model.detect_hotspots_kmeans(coords, 8, grid_meters=cell_meters,
+                                                                  sample_weight=severity))
+    print(f"{n:>10,} rows | {'K-Means severity':<16} | grid {weighted_time:7.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('sizes', nargs='*', type=int, default=[100_000, 1_000_000])
+    parser.add_argument('--cell', type=float, default=10.0, help="grid cell size in meters")
+    parser.add_argument('--raw-limit', type=int, default=300_000,
+                        help="skip raw-point clustering above this many rows")
+    args = parser.parse_args()
+
+    for n in args.sizes:
+        run(n, args.cell, args.raw_limit)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""Time the Insights page aggregates: one pass with InsightAggregator vs. the per-chart pandas calls.
+
+Usage: python benchmarks/bench_insights.py [n_rows ...] [--raw]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.data_processor import DataProcessor
+from utils.insights import InsightAggregator
+from utils.result_cache import ResultCache, make_key
+
+
+def make_accidents(n, compact=True, seed=0):
+    """Accidents with the columns the Insights page breaks down, as the upload page stores them"""
+    rng = np.random.default_rng(seed)
+    processor = DataProcessor()
+    df = pd.DataFrame({
+        'Latitude': rng.uniform(10.95, 11.05, n),
+        'Longitude': rng.uniform(76.9, 77.0, n),
+        'Severity': rng.integers(1, 5, n),
+        'Weather': rng.choice(['Clear', 'Rain', 'Fog', 'Cloudy'], n),
+        'Road_Type': rng.choice(['Highway', 'City Road', 'Rural Road'], n),
+        'Light_Condition': rng.choice(['Day', 'Night', 'Dusk'], n),
+        'Speed_Limit': rng.choice([30, 40, 50, 60, 80], n),
+        'Vehicles_Involved': rng.integers(1, 5, n),
+        'Hour': rng.integers(0, 24, n),
+        'DayOfWeek': rng.choice(['Monday', 'Wednesday', 'Friday', 'Sunday'], n)
+    })
+    df['Area'] = processor.assign_areas(df)
+    return processor.compact(df) if compact else df
+
+
+def per_chart(df):
+    """The aggregates as the page used to compute them, one pandas call per chart"""
+    for col in ['Hour', 'DayOfWeek', 'Weather', 'Road_Type', 'Severity']:
+        df[col].value_counts()
+    for col in ['Weather', 'Road_Type', 'Light_Condition', 'Speed_Limit', 'Area']:
+        df.groupby(col, observed=True)['Severity'].mean()
+    df[df['Severity'] >= 3]['Weather'].value_counts()
+    df[['Severity', 'Vehicles_Involved', 'Speed_Limit', 'Hour']].corr()
+    df['Area'].value_counts()
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('sizes', nargs='*', type=int, default=[100_000, 1_000_000, 5_000_000])
+    parser.add_argument('--raw', action='store_true', help="use object columns instead of the compact frame")
+    args = parser.parse_args()
+
+    for n in args.sizes:
+        df = make_accidents(n, compact=not args.raw)
+        cache = ResultCache()
+        key = make_key('bench', n, 'insights')
+        pandas_time = timed(per_chart, df)
+        first_time = timed(cache.get_or_compute, key, lambda: InsightAggregator().compute(df))
+        rerun_time = timed(cache.get_or_compute, key, lambda: InsightAggregator().compute(df))
+        print(f"{n:>10,} rows | per-chart pandas {pandas_time:7.3f}s | one pass {first_time:7.3f}s "
+              f"({pandas_time / first_time:4.1f}x) | cached rerun {rerun_time * 1e3:7.3f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+"""Time the FFT kernel density risk surface at increasing point counts.
+
+Usage: python benchmarks/bench_kde.py [n_rows ...] [--cell METERS] [--bandwidth METERS]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.kde import GridKDE
+
+
+def make_accidents(n, n_junctions=5000, seed=0):
+    """City-scale accidents around junctions, with severity 1-4"""
+    rng = np.random.default_rng(seed)
+    junctions = np.column_stack([rng.uniform(10.9, 11.1, n_junctions), rng.uniform(76.85, 77.1, n_junctions)])
+    coords = junctions[rng.integers(0, n_junctions, n)] + rng.normal(0, 0.0005, (n, 2))
+    return coords, rng.integers(1, 5, n).astype(float)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('sizes', nargs='*', type=int, default=[100_000, 1_000_000, 10_000_000])
+    parser.add_argument('--cell', type=float, default=25.0, help="grid cell size in meters")
+    parser.add_argument('--bandwidth', type=float, default=150.0, help="kernel bandwidth in meters")
+    args = parser.parse_args()
+
+    for n in args.sizes:
+        coords, severity = make_accidents(n)
+        kde = GridKDE(args.cell, args.bandwidth)
+        start = time.perf_counter()
+        kde.fit(coords, sample_weight=severity)
+        fit_time = time.perf_counter() - start
+        start = time.perf_counter()
+        bands = kde.contours()['features']
+        contour_time = time.perf_counter() - start
+        print(f"{n:>11,} rows | grid {kde.shape[0]}x{kde.shape[1]} | surface {fit_time:6.2f}s | "
+              f"{len(bands)} contour bands {contour_time:5.2f}s")
+
+
+if __name__ == '__main__':
+    main()
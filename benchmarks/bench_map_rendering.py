@@ -0,0 +1,66 @@
+"""Time point map building and measure HTML size: per-row folium markers vs. one vectorized PointLayer.
+
+Usage: python benchmarks/bench_map_rendering.py [n_rows ...] [--legacy-max N] [--map point|cluster]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.visualization import MapVisualizer
+
+
+def make_accidents(n, seed=0):
+    """Accidents scattered over the city with the columns the map popups show"""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'Latitude': rng.uniform(10.9, 11.1, n),
+        'Longitude': rng.uniform(76.85, 77.1, n),
+        'Severity': rng.integers(1, 5, n),
+        'Weather': pd.Categorical(rng.choice(['Clear', 'Rain', 'Fog', 'Cloudy'], n)),
+        'Road_Type': pd.Categorical(rng.choice(['Highway', 'City Road', 'Rural Road'], n)),
+        'Vehicles_Involved': rng.integers(1, 5, n),
+        'Cluster': rng.integers(-1, 20, n)
+    })
+
+
+def build(df, map_type, vectorized):
+    """Seconds to build and render the map to HTML, and the HTML size in bytes"""
+    visualizer = MapVisualizer()
+    start = time.perf_counter()
+    if map_type == 'cluster':
+        m = visualizer.create_cluster_map(df, vectorized=vectorized)
+    else:
+        m = visualizer.create_point_map(df, vectorized=vectorized)
+    html = m.get_root().render()
+    return time.perf_counter() - start, len(html.encode())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('sizes', nargs='*', type=int, default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--legacy-max', type=int, default=100_000,
+                        help="largest size to run the per-row marker path at (it takes minutes beyond this)")
+    parser.add_argument('--map', choices=['point', 'cluster'], default='point')
+    args = parser.parse_args()
+
+    for n in args.sizes:
+        df = make_accidents(n)
+        fast_time, fast_size = build(df, args.map, vectorized=True)
+        line = f"{n:>10,} rows | layer {fast_time:7.2f}s {fast_size / 1e6:8.1f} MB"
+        if n <= args.legacy_max:
+            slow_time, slow_size = build(df, args.map, vectorized=False)
+            line += (f" | per-row markers {slow_time:7.2f}s {slow_size / 1e6:8.1f} MB"
+                     f" | {slow_time / fast_time:5.0f}x faster, {slow_size / fast_size:4.0f}x smaller")
+        else:
+            line += " | per-row markers skipped (--legacy-max)"
+        print(line)
+
+
+if __name__ == '__main__':
+    main()
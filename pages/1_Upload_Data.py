@@ -2,6 +2,7 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 from utils.data_processor import DataProcessor
+from utils.dataset_cache import DatasetCache
 import plotly.express as px
 import base64
 
@@ -22,8 +23,9 @@ st.markdown("""
 </div>
 """, unsafe_allow_html=True)
 
-# Initialize data processor
+# Initialize data processor and processed dataset cache
 processor = DataProcessor()
+dataset_cache = DatasetCache()
 
 # File upload section
 col1, col2 = st.columns([2, 1])
@@ -100,15 +102,36 @@ with col2:
 # Data preview and processing
 if uploaded_file is not None:
     try:
-        # Load and process data
-        df = processor.load_data(uploaded_file)
-        df = processor.validate_coordinates(df)
+        # Reuse the processed dataset if this exact file was seen before.
+        # The upload is hashed once; reruns with the same upload reuse its key
+        upload_id = (uploaded_file.file_id, uploaded_file.name, uploaded_file.size)
+        if st.session_state.get('upload_id') != upload_id:
+            st.session_state['upload_key'] = dataset_cache.key_for(uploaded_file, DataProcessor.VERSION,
+                                                                   processor.coimbatore_areas)
+            st.session_state['upload_id'] = upload_id
+        cache_key = st.session_state['upload_key']
+        df = dataset_cache.get(cache_key)
         
-        # Add area information
-        df['Area'] = df.apply(lambda row: processor.get_area_name(row['Latitude'], row['Longitude']), axis=1)
+        if df is None:
+            # Load and process data, streaming the CSV in chunks
+            progress_bar = st.progress(0.0, text="Reading file...")
+            
+            def report_progress(fraction, rows):
+                progress_bar.progress(fraction, text=f"Reading file... {rows:,} records loaded")
+            
+            df = processor.process(uploaded_file, progress_callback=report_progress)
+            progress_bar.empty()
+            dataset_cache.put(cache_key, df, source=uploaded_file.name)
+            report = processor.memory_report
+            st.caption(f"In-memory size: {report['after']:.0f} bytes per record "
+                       f"(down from {report['before']:.0f})")
+        else:
+            st.caption(f"Loaded processed data from cache "
+                       f"({processor.bytes_per_row(df):.0f} bytes per record in memory)")
         
         # Store in session state
         st.session_state['accident_data'] = df
+        st.session_state['dataset_key'] = cache_key
         st.session_state['data_uploaded'] = True
         
         # Display success message
@@ -139,6 +162,7 @@ if uploaded_file is not None:
         # Area distribution
         st.markdown("###  Area Distribution")
         area_counts = df['Area'].value_counts()
+        area_counts = area_counts[area_counts > 0]
         
         col1, col2 = st.columns(2)
         
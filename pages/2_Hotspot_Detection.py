@@ -1,12 +1,15 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
+import io
 from utils.data_processor import DataProcessor
 from utils.ml_model import HotspotModel
 from utils.visualization import MapVisualizer
+from utils.result_cache import ResultCache, make_key, dataset_fingerprint
+from utils.hotspot_stats import CONFIDENCE_Z, GiStarAnalysis
+from utils.tiles import TileLayerSource, shared_server
 import plotly.express as px
 import plotly.graph_objects as go
-from sklearn.metrics import silhouette_score
 
 st.set_page_config(page_title="Hotspot Detection", page_icon="", layout="wide")
 
@@ -43,11 +46,22 @@ if 'accident_data' not in st.session_state:
     """, unsafe_allow_html=True)
     st.stop()
 
+# Clustering results shared by all sessions on this server
+@st.cache_resource
+def get_cluster_cache():
+    return ResultCache(max_entries=64, max_bytes=512 * 1024 ** 2)
+
 # Load data
 df = st.session_state['accident_data']
 processor = DataProcessor()
 model = HotspotModel()
 visualizer = MapVisualizer()
+cluster_cache = get_cluster_cache()
+
+# Dataset version: the upload key, or a content hash for data loaded another way
+if 'dataset_key' not in st.session_state:
+    st.session_state['dataset_key'] = dataset_fingerprint(df)
+dataset_key = st.session_state['dataset_key']
 
 # Algorithm selection
 st.markdown("##  Choose Clustering Algorithm")
@@ -57,8 +71,9 @@ col1, col2 = st.columns(2)
 with col1:
     algorithm = st.radio(
         "Select clustering method:",
-        ["DBSCAN", "K-Means"],
-        help="DBSCAN: Density-based, automatically finds clusters. K-Means: Specify number of clusters."
+        ["DBSCAN", "K-Means", "Gi* Hotspots"],
+        help="DBSCAN: Density-based, automatically finds clusters. K-Means: Specify number of clusters. "
+             "Gi* Hotspots: grid cells whose accident counts are statistically significant."
     )
 
 with col2:
@@ -67,6 +82,7 @@ with col2:
         <h4>🔍 Algorithm Info</h4>
         <p><strong>DBSCAN:</strong> Good for finding irregular-shaped clusters, automatically determines number of clusters</p>
         <p><strong>K-Means:</strong> Faster for large datasets, requires specifying number of clusters</p>
+        <p><strong>Gi* Hotspots:</strong> Getis-Ord statistic; tests whether a hotspot is significant, not just dense</p>
     </div>
     """, unsafe_allow_html=True)
 
@@ -74,27 +90,223 @@ with col2:
 st.markdown("##  Algorithm Parameters")
 
 if algorithm == "DBSCAN":
+    distance_mode = st.radio(
+        "Neighborhood radius units:",
+        ["Meters", "Standardized", "Space-time"],
+        horizontal=True,
+        help="Meters: same physical radius for every dataset, scales to millions of points. "
+             "Standardized: radius in scaled coordinate units. "
+             "Space-time: accidents must be close in both distance and time, revealing short-lived hotspots."
+    )
+    
     col1, col2 = st.columns(2)
     with col1:
-        eps = st.slider("EPS (Neighborhood radius)", 0.001, 0.05, 0.01, 0.001,
-                       help="Larger values form larger clusters")
+        if distance_mode in ("Meters", "Space-time"):
+            eps_meters = st.slider("EPS (Neighborhood radius, meters)", 10, 1000, 100, 10,
+                                   help="Accidents within this distance are neighbors")
+        else:
+            eps = st.slider("EPS (Neighborhood radius)", 0.001, 0.05, 0.01, 0.001,
+                           help="Larger values form larger clusters")
     with col2:
         min_samples = st.slider("Minimum samples", 2, 10, 3,
                                help="Minimum points to form a cluster")
     
-    model.dbscan = model.dbscan.set_params(eps=eps, min_samples=min_samples)
+    if distance_mode == "Space-time":
+        col1, col2 = st.columns(2)
+        with col1:
+            time_window = st.number_input("Time window", min_value=1, max_value=10_000, value=3,
+                                          help="Accidents within this time of each other are neighbors")
+        with col2:
+            time_unit = st.selectbox("Time unit", ["Minutes", "Hours", "Days"], index=2)
+        eps_minutes = time_window * {'Minutes': 1, 'Hours': 60, 'Days': 24 * 60}[time_unit]
+    
+    if distance_mode == "Meters":
+        model.metric_dbscan = model.metric_dbscan.set_params(eps_meters=eps_meters, min_samples=min_samples)
+    elif distance_mode == "Space-time":
+        model.st_dbscan = model.st_dbscan.set_params(eps_meters=eps_meters, eps_minutes=eps_minutes,
+                                                     min_samples=min_samples)
+    else:
+        model.dbscan = model.dbscan.set_params(eps=eps, min_samples=min_samples)
+    
+    if distance_mode == "Meters":
+        with st.expander(" Parameter sweep: compare many EPS / minimum samples settings in one run"):
+            col1, col2 = st.columns(2)
+            with col1:
+                sweep_eps = st.multiselect("EPS values (meters)", [25, 50, 75, 100, 150, 200, 300, 500, 750, 1000],
+                                           default=[50, 100, 200])
+            with col2:
+                sweep_min_samples = st.multiselect("Minimum samples values", list(range(2, 21)), default=[3, 5, 10])
+            
+            if st.button(" Run Parameter Sweep", use_container_width=True, disabled=not (sweep_eps and sweep_min_samples)):
+                with st.spinner("Building the neighbor graph once and evaluating every setting..."):
+                    sweep_key = make_key(dataset_key, 'DBSCAN-sweep', eps=tuple(sorted(sweep_eps)),
+                                         min_samples=tuple(sorted(sweep_min_samples)))
+                    st.session_state['dbscan_sweep'] = cluster_cache.get_or_compute(
+                        sweep_key,
+                        lambda: model.sweep_dbscan(df[['Latitude', 'Longitude']].values, sweep_eps, sweep_min_samples)
+                    )
+            
+            if 'dbscan_sweep' in st.session_state:
+                sweep = st.session_state['dbscan_sweep']
+                best = sweep.loc[sweep['silhouette'].idxmax()]
+                st.dataframe(sweep.round(3), use_container_width=True, hide_index=True)
+                fig = px.imshow(
+                    sweep.pivot(index='min_samples', columns='eps_meters', values='silhouette'),
+                    title="Cluster quality (silhouette) by setting",
+                    labels={'x': 'EPS (meters)', 'y': 'Minimum samples', 'color': 'Silhouette'},
+                    color_continuous_scale='viridis',
+                    text_auto='.2f',
+                    aspect='auto'
+                )
+                st.plotly_chart(fig, use_container_width=True)
+                st.info(f"Best silhouette: EPS {best['eps_meters']:.0f} m, minimum samples {best['min_samples']:.0f} "
+                        f"({best['n_clusters']:.0f} hotspots, {best['noise_ratio']:.0%} noise)")
+
+elif algorithm == "Gi* Hotspots":
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        gi_cell_meters = st.slider("Cell size (meters)", 25, 500, 100, 25,
+                                   help="Accidents are counted per square cell of this size")
+    with col2:
+        gi_rings = st.slider("Neighborhood (cells)", 1, 3, 1,
+                             help="Cells within this many rows/columns count as neighbors")
+    with col3:
+        gi_confidence = st.selectbox("Confidence level", sorted(CONFIDENCE_Z), index=1, format_func=lambda c: f"{c}%")
+    col1, col2 = st.columns(2)
+    with col1:
+        gi_severity = st.checkbox("Weight by severity", help="Test total severity per cell instead of counts")
+    with col2:
+        gi_morans_i = st.checkbox("Also compute local Moran's I",
+                                  help="Adds High-High / Low-Low / outlier classes for each cell")
+    model.gi_star = GiStarAnalysis(cell_meters=gi_cell_meters, rings=gi_rings, confidence=gi_confidence,
+                                   morans_i=gi_morans_i)
 
 else:  # K-Means
     n_clusters = st.slider("Number of clusters", 2, 10, 5,
                           help="Number of hotspot clusters to identify")
+    kmeans_mode = st.radio(
+        "K-Means engine:",
+        ["Exact", "Streaming (mini-batch)"],
+        horizontal=True,
+        index=1 if len(df) > 500_000 else 0,
+        help="Streaming fits mini-batch K-Means chunk by chunk; much faster and lighter on large datasets."
+    )
+
+    with st.expander(" Choose the number of clusters: elbow and silhouette curves"):
+        k_max = st.slider("Largest number of clusters to try", 3, 20, 10)
+
+        if st.button(" Run K Sweep", use_container_width=True):
+            with st.spinner(f"Fitting K-Means for k = 2..{k_max} in parallel..."):
+                sweep_key = make_key(dataset_key, 'K-Means-sweep', k_max=k_max)
+                st.session_state['kmeans_sweep'] = cluster_cache.get_or_compute(
+                    sweep_key,
+                    lambda: model.sweep_kmeans(df[['Latitude', 'Longitude']].values, k_max)
+                )
+
+        if 'kmeans_sweep' in st.session_state:
+            sweep = st.session_state['kmeans_sweep']
+            curve = sweep['curve']
+            col1, col2 = st.columns(2)
+            with col1:
+                fig = px.line(curve, x='k', y='inertia', markers=True, title="Elbow curve (inertia)")
+                if sweep['elbow_k'] is not None:
+                    fig.add_vline(x=sweep['elbow_k'], line_dash='dash', line_color='gray')
+                st.plotly_chart(fig, use_container_width=True)
+            with col2:
+                fig = px.line(curve, x='k', y='silhouette', markers=True, title="Cluster quality (silhouette)")
+                if sweep['silhouette_k'] is not None:
+                    fig.add_vline(x=sweep['silhouette_k'], line_dash='dash', line_color='gray')
+                st.plotly_chart(fig, use_container_width=True)
+            st.info(f"Suggested number of clusters: {sweep['suggested_k']} "
+                    f"(elbow at k = {sweep['elbow_k']}, best silhouette at k = {sweep['silhouette_k']})")
+
+# Grid pre-aggregation (cells merge accidents regardless of time, so not for space-time clustering;
+# Gi* works on its own cells)
+space_time = algorithm == "DBSCAN" and distance_mode == "Space-time"
+grid_supported = not space_time and algorithm != "Gi* Hotspots"
+col1, col2 = st.columns(2)
+with col1:
+    use_grid = st.checkbox("Pre-aggregate into grid cells", value=len(df) > 100_000 and grid_supported,
+                           disabled=not grid_supported,
+                           help="Cluster fine grid cells instead of individual accidents. "
+                                "Much faster when many accidents share a junction.") and grid_supported
+    grid_meters = st.slider("Grid cell size (meters)", 5, 50, 10, 5, disabled=not use_grid)
+with col2:
+    weight_by = st.selectbox("Weight cells by", ["Accident count", "Total severity"], disabled=not use_grid,
+                             help="With severity weighting, DBSCAN's minimum samples counts severity points")
 
 # Perform clustering
 if st.button(" Detect Hotspots", use_container_width=True):
     with st.spinner("🔍 Analyzing accident patterns and detecting hotspots..."):
         coordinates = df[['Latitude', 'Longitude']].values
+        weight_by_severity = use_grid and weight_by == "Total severity"
+        grid_options = {
+            'grid_meters': grid_meters if use_grid else None,
+            'sample_weight': df['Severity'].to_numpy() if weight_by_severity else None
+        }
+        
+        # Results are shared across sessions, keyed by dataset and parameters
+        if algorithm == "DBSCAN":
+            if distance_mode == "Meters":
+                params = {'eps_meters': eps_meters, 'min_samples': min_samples}
+            elif distance_mode == "Space-time":
+                params = {'eps_meters': eps_meters, 'eps_minutes': eps_minutes, 'min_samples': min_samples}
+            else:
+                params = {'eps': eps, 'min_samples': min_samples}
+            engine = f"DBSCAN-{distance_mode}"
+        elif algorithm == "Gi* Hotspots":
+            params = {'cell_meters': gi_cell_meters, 'rings': gi_rings, 'confidence': gi_confidence,
+                      'morans_i': gi_morans_i, 'gi_severity': gi_severity}
+            engine = "Gi*"
+        else:
+            params = {'n_clusters': n_clusters}
+            engine = f"K-Means-{kmeans_mode}"
+        cache_key = make_key(dataset_key, engine, grid_meters=grid_options['grid_meters'],
+                             severity_weighted=weight_by_severity, **params)
+        
+        def run_clustering():
+            centers = None
+            if algorithm == "DBSCAN":
+                if distance_mode == "Meters":
+                    clusters = model.detect_hotspots_dbscan_meters(coordinates, **grid_options)
+                elif distance_mode == "Space-time":
+                    clusters = model.detect_hotspots_st_dbscan(coordinates, df['Date_Time'])
+                else:
+                    clusters = model.detect_hotspots_dbscan(coordinates, **grid_options)
+            elif algorithm == "Gi* Hotspots":
+                clusters = model.detect_hotspots_gi(
+                    coordinates, sample_weight=df['Severity'].to_numpy() if gi_severity else None
+                )
+            elif kmeans_mode == "Exact":
+                clusters, centers = model.detect_hotspots_kmeans(coordinates, n_clusters, **grid_options)
+            else:
+                clusters, centers = model.detect_hotspots_minibatch(coordinates, n_clusters, **grid_options)
+            # The clustering methods report errors and fall back to all-zero labels; never cache those
+            if algorithm != "Gi* Hotspots" and model.algorithm_ is None:
+                raise RuntimeError(f"{engine} clustering did not complete; see the server log for details")
+            grid = None if model.grid is None else (len(model.grid.cells_), model.grid.reduction_)
+            artifact = None
+            if model.algorithm_ is not None:
+                buffer = io.BytesIO()
+                model.save(buffer)
+                artifact = buffer.getvalue()
+            gi = None
+            if algorithm == "Gi* Hotspots" and hasattr(model.gi_star, 'table_'):
+                gi = {'cells': model.gi_star.table_, 'cell_lat': model.gi_star.cell_lat_,
+                      'cell_lon': model.gi_star.cell_lon_, 'confidence': model.gi_star.confidence}
+            return {'clusters': np.asarray(clusters), 'centers': centers, 'grid': grid, 'artifact': artifact,
+                    'gi': gi}
+        
+        cached = cache_key in cluster_cache
+        try:
+            result = cluster_cache.get_or_compute(cache_key, run_clustering)
+        except (ValueError, RuntimeError) as e:
+            # Nothing is cached or published for a failed run
+            st.error(f"Hotspot detection failed: {e}")
+            st.stop()
+        clusters = result['clusters']
         
         if algorithm == "DBSCAN":
-            clusters = model.detect_hotspots_dbscan(coordinates)
             n_clusters_found = len(set(clusters)) - (1 if -1 in clusters else 0)
             noise_points = np.sum(clusters == -1)
             
@@ -106,25 +318,55 @@ if st.button(" Detect Hotspots", use_container_width=True):
             # Display results
             st.success(f" Found {n_clusters_found} hotspots with {noise_points} noise points")
             
-        else:  # K-Means
-            clusters, centers = model.detect_hotspots_kmeans(coordinates, n_clusters)
+        elif algorithm == "Gi* Hotspots":
+            n_clusters_found = len(set(clusters)) - (1 if -1 in clusters else 0)
+            in_hotspots = np.sum(clusters != -1)
+            
+            st.session_state['clusters'] = clusters
+            st.session_state['algorithm'] = 'Gi*'
+            st.session_state['n_clusters'] = n_clusters_found
+            
+            st.success(f" Found {n_clusters_found} significant hotspots ({gi_confidence}% confidence) "
+                       f"containing {in_hotspots} accidents")
             
+        else:  # K-Means
             # Store results
             st.session_state['clusters'] = clusters
-            st.session_state['centers'] = centers
+            st.session_state['centers'] = result['centers']
             st.session_state['algorithm'] = 'K-Means'
             st.session_state['n_clusters'] = n_clusters
             
             st.success(f" Identified {n_clusters} hotspots using K-Means")
         
+        if result['grid'] is not None:
+            n_cells, reduction = result['grid']
+            st.caption(f"Clustered {n_cells:,} grid cells ({reduction:.1f} accidents per cell)")
+        if cached:
+            st.caption("Reused a previously computed result for these settings")
+        
         # Add clusters to dataframe
         df['Cluster'] = st.session_state['clusters']
         st.session_state['clustered_data'] = df
+        st.session_state['cluster_key'] = cache_key
+        visualizer.cluster_store.put(dataset_key, clusters, st.session_state['algorithm'])
+        st.session_state['model_artifact'] = result['artifact']
+        st.session_state['space_time'] = space_time
+        st.session_state['gi_result'] = result['gi']
+        st.session_state.pop('cluster_quality', None)
 
 # Display results if clustering is done
 if 'clusters' in st.session_state:
     df = st.session_state['clustered_data']
     
+    # Cluster quality (sampled silhouette above the size threshold), computed once per clustering
+    if 'cluster_quality' not in st.session_state:
+        with st.spinner("Evaluating cluster quality..."):
+            st.session_state['cluster_quality'] = cluster_cache.get_or_compute(
+                make_key('quality', st.session_state.get('cluster_key')),
+                lambda: model.quality.evaluate(df[['Latitude', 'Longitude']].to_numpy(), df['Cluster'].to_numpy())
+            )
+    quality = st.session_state['cluster_quality']
+    
     st.markdown("##  Hotspot Analysis Results")
     
     # Key metrics
@@ -139,7 +381,7 @@ if 'clusters' in st.session_state:
         st.metric("Total Accidents", total_accidents)
     
     with col3:
-        if st.session_state['algorithm'] == 'DBSCAN':
+        if st.session_state['algorithm'] != 'K-Means':
             noise_points = np.sum(st.session_state['clusters'] == -1)
             st.metric("Noise Points", noise_points)
         else:
@@ -148,31 +390,56 @@ if 'clusters' in st.session_state:
     
     with col4:
         if st.session_state['algorithm'] == 'K-Means':
-            silhouette_avg = silhouette_score(df[['Latitude', 'Longitude']], df['Cluster'])
-            st.metric("Cluster Quality", f"{silhouette_avg:.3f}")
+            st.metric("Cluster Quality", f"{quality['silhouette']:.3f}",
+                      help="Silhouette score (-1 to 1, higher is better)")
         else:
             cluster_accidents = len(df[df['Cluster'] != -1])
             st.metric("Clustered Accidents", cluster_accidents)
     
+    if quality['davies_bouldin'] is not None:
+        if quality['exact']:
+            silhouette_note = f"Silhouette {quality['silhouette']:.3f} (exact, {quality['sample_size']:,} accidents)"
+        else:
+            low, high = quality['silhouette_ci']
+            silhouette_note = (f"Silhouette {quality['silhouette']:.3f} (95% CI {low:.3f}–{high:.3f}, "
+                               f"stratified sample of {quality['sample_size']:,} of {quality['n_points']:,} accidents)")
+        st.caption(f"{silhouette_note} · Davies–Bouldin {quality['davies_bouldin']:.3f} (lower is better) · "
+                   f"Calinski–Harabasz {quality['calinski_harabasz']:,.0f} (higher is better)")
+    
     # Cluster statistics
     st.markdown("###  Cluster Statistics")
     
-    if st.session_state['algorithm'] == 'DBSCAN':
-        cluster_df = df[df['Cluster'] != -1].copy()
-    else:
-        cluster_df = df.copy()
-    
-    cluster_stats = cluster_df.groupby('Cluster').agg({
-        'Severity': ['count', 'mean', 'max'],
-        'Vehicles_Involved': 'mean',
-        'Speed_Limit': 'mean'
-    }).round(2)
-    
-    cluster_stats.columns = ['Accident_Count', 'Avg_Severity', 'Max_Severity', 'Avg_Vehicles', 'Avg_Speed_Limit']
-    cluster_stats = cluster_stats.sort_values('Accident_Count', ascending=False)
+    cluster_stats = model.cluster_statistics(df, drop_noise=st.session_state['algorithm'] != 'K-Means')
     
     st.dataframe(cluster_stats, use_container_width=True)
     
+    # When each space-time hotspot was active
+    if st.session_state.get('space_time'):
+        spans = df[df['Cluster'] != -1].groupby('Cluster')['Date_Time'].agg(['min', 'max', 'count'])
+        spans.columns = ['First_Accident', 'Last_Accident', 'Accident_Count']
+        spans['Active_Days'] = ((spans['Last_Accident'] - spans['First_Accident']).dt.total_seconds() / 86400).round(1)
+        st.markdown("####  Hotspot Time Windows")
+        st.dataframe(spans.sort_values('Accident_Count', ascending=False), use_container_width=True)
+
+    # Gi* cell statistics: which cells are significantly hot (or cold)
+    gi_result = st.session_state.get('gi_result')
+    if st.session_state['algorithm'] == 'Gi*' and gi_result is not None:
+        cells = gi_result['cells']
+        st.markdown("####  Gi* Cell Significance")
+        class_counts = cells['Class'].value_counts()
+        st.caption(" · ".join(f"{name}: {count:,} cells" for name, count in class_counts.items()))
+        significant = cells[cells['Class'] != 'Not Significant']
+        st.dataframe(significant.head(1000).round({'Gi_Z': 2, 'Gi_P': 4}), use_container_width=True)
+        st.download_button(
+            label=" Download Gi* Cell Table",
+            data=cells.to_csv(index=False),
+            file_name="gi_star_cells.csv",
+            mime="text/csv"
+        )
+        if st.button(" Show Gi* Map", use_container_width=True):
+            gi_map = visualizer.create_gi_map(cells, gi_result['cell_lat'], gi_result['cell_lon'])
+            st.components.v1.html(gi_map._repr_html_(), height=500)
+
     # Visualizations
     st.markdown("###  Hotspot Visualization")
     
@@ -206,22 +473,43 @@ if 'clusters' in st.session_state:
     # Area analysis within clusters
     st.markdown("###  Area-wise Cluster Analysis")
     
-    if st.session_state['algorithm'] == 'DBSCAN':
+    if st.session_state['algorithm'] != 'K-Means':
         valid_clusters = df[df['Cluster'] != -1]
     else:
         valid_clusters = df
     
     area_cluster = pd.crosstab(valid_clusters['Area'], valid_clusters['Cluster'])
+    area_cluster = area_cluster[area_cluster.sum(axis=1) > 0]
     st.dataframe(area_cluster.style.background_gradient(cmap='Blues'), use_container_width=True)
     
+    # Fitted model, reusable for scoring new points with HotspotModel.load(...).predict(points)
+    if st.session_state.get('model_artifact') is not None:
+        st.download_button(
+            label=" Download Hotspot Model (.npz)",
+            data=st.session_state['model_artifact'],
+            file_name="hotspot_model.npz",
+            mime="application/octet-stream",
+            help="Scaler, hotspot centers or core points, labels and metadata. "
+                 "Load it with HotspotModel.load() to assign new accidents to hotspots without refitting."
+        )
+    
     # Generate map
     st.markdown("### Interactive Hotspot Map")
     
+    hotspot_tiles = st.checkbox("Serve as map tiles", value=len(df) > 50_000, key="hotspot_tiles",
+                                help="Render hotspots into cached image tiles served by the app's tile "
+                                     "endpoint, instead of sending every accident to the browser")
+    
     if st.button(" Generate Hotspot Map", use_container_width=True):
         with st.spinner("Creating interactive map..."):
             try:
-                # Create map
-                hotspot_map = visualizer.create_cluster_map(df, st.session_state['algorithm'])
+                # Create map; large results are drawn as cached image tiles instead of markers
+                if hotspot_tiles:
+                    source = TileLayerSource('hotspots', df[['Latitude', 'Longitude']].to_numpy(),
+                                             df['Cluster'].to_numpy())
+                    hotspot_map = visualizer.create_tiled_map(shared_server().register(source), name="Hotspots")
+                else:
+                    hotspot_map = visualizer.create_cluster_map(df, st.session_state['algorithm'])
                 
                 # Display map
                 st.components.v1.html(hotspot_map._repr_html_(), height=600)
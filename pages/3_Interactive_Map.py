@@ -2,8 +2,14 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 from utils.visualization import MapVisualizer
+from utils.kde import GridKDE
+from utils.hex_grid import HexGrid, edge_meters
+from utils.map_lod import ViewportIndex, viewport_bounds
+from utils.result_cache import ResultCache, dataset_fingerprint, make_key
+from utils.tiles import TileLayerSource, shared_server
 import folium
 from streamlit_folium import st_folium
+import streamlit.components.v1 as components
 import plotly.express as px
 
 st.set_page_config(page_title="Interactive Map", page_icon="", layout="wide")
@@ -44,9 +50,18 @@ if 'accident_data' not in st.session_state:
     """, unsafe_allow_html=True)
     st.stop()
 
+# Rendered map HTML, shared by all sessions on this server; map objects stay per session
+@st.cache_resource
+def get_map_cache():
+    return ResultCache(max_entries=16, max_bytes=256 * 1024 ** 2)
+
 # Load data
 df = st.session_state['accident_data']
 visualizer = MapVisualizer()
+map_cache = get_map_cache()
+if 'dataset_key' not in st.session_state:
+    st.session_state['dataset_key'] = dataset_fingerprint(df)
+dataset_key = st.session_state['dataset_key']
 
 # Initialize session state for map
 if 'map_generated' not in st.session_state:
@@ -64,8 +79,10 @@ col1, col2 = st.columns(2)
 with col1:
     map_type = st.radio(
         "Map Type:",
-        ["Point Map", "Heat Map", "Cluster Map"],
-        help="Point: Individual accidents. Heat: Density visualization. Cluster: Grouped accidents.",
+        ["Point Map", "Heat Map", "Cluster Map", "Risk Surface", "Hex Map"],
+        help="Point: Individual accidents. Heat: Density visualization. Cluster: Grouped accidents. "
+             "Risk Surface: kernel density bands computed on the server, exportable as raster or polygons. "
+             "Hex Map: accidents aggregated into hexagons, one polygon per hexagon however large the data.",
         key="map_type_selector"
     )
 
@@ -87,6 +104,12 @@ with col1:
     
     if map_type == "Heat Map":
         radius = st.slider("Heat Radius", 5, 30, 15, key="heat_radius")
+    elif map_type == "Risk Surface":
+        bandwidth = st.slider("Kernel bandwidth (meters)", 50, 1000, 200, 50, key="kde_bandwidth",
+                              help="Larger bandwidths give smoother, broader risk zones")
+    elif map_type == "Hex Map":
+        hex_resolution = st.select_slider("Hexagon size", options=[7, 8, 9, 10], value=9, key="hex_resolution",
+                                          format_func=lambda res: f"{edge_meters(res):,.0f} m")
     else:
         radius = st.slider("Point Radius", 5, 15, 8, key="point_radius")
 
@@ -95,6 +118,20 @@ with col2:
     
     if map_type == "Point Map":
         point_size = st.slider("Point Size", 3, 10, 6, key="point_size_slider")
+        adaptive_detail = st.checkbox("Adaptive detail", value=len(df) > 5000, key="adaptive_detail",
+                                      help="Only send what the current view needs: accident counts per area "
+                                           "when zoomed out, individual accidents once zoomed in")
+    elif map_type == "Risk Surface":
+        severity_weighted = st.checkbox("Weight by severity", key="kde_severity")
+    elif map_type == "Heat Map":
+        heat_severity = st.checkbox("Weight by severity", key="heat_severity",
+                                    help="Severe accidents add more heat than minor ones")
+        heat_tiles = st.checkbox("Serve as map tiles", value=len(df) > 200_000, key="heat_tiles",
+                                 help="Render the heat layer into cached image tiles served locally, "
+                                      "instead of sending the accidents to the browser")
+    elif map_type == "Hex Map":
+        hex_value = st.selectbox("Color hexagons by", ["Accidents", "Avg_Severity", "Max_Severity"],
+                                 format_func=lambda column: column.replace('_', ' '), key="hex_value")
 
 # Generate map button
 col1, col2, col3 = st.columns([2, 1, 1])
@@ -102,62 +139,205 @@ with col1:
     generate_map = st.button(" Generate Map", use_container_width=True, type="primary")
 
 # Generate or display map
+if map_type == "Cluster Map":
+    # Clusters come from page 2 when available, so the map changes with each detection run
+    published = visualizer.cluster_store.get(dataset_key)
+    map_settings = {'clusters': st.session_state.get('cluster_key') if 'clusters' in st.session_state
+                    else published and published['algorithm']}
+elif map_type == "Heat Map":
+    map_settings = {'radius': radius, 'severity': heat_severity, 'tiles': heat_tiles}
+elif map_type == "Risk Surface":
+    map_settings = {'bandwidth': bandwidth, 'severity': severity_weighted, 'opacity': opacity}
+elif map_type == "Hex Map":
+    map_settings = {'resolution': hex_resolution, 'value': hex_value, 'opacity': opacity}
+else:
+    map_settings = {'point_size': point_size, 'opacity': opacity}
+# The adaptive point map changes with every pan and zoom, so only its index is cached
+adaptive_map = map_type == "Point Map" and adaptive_detail
+map_key = make_key(dataset_key, map_type, base_map, zoom_level, **map_settings)
+
+
+def finish_map(m):
+    """Apply the zoom and base map settings shared by every map type"""
+    m.options['zoom'] = zoom_level
+    if base_map == "CartoDB Positron":
+        folium.TileLayer('CartoDB positron').add_to(m)
+    elif base_map == "CartoDB Dark_Matter":
+        folium.TileLayer('CartoDB dark_matter').add_to(m)
+    else:
+        folium.TileLayer('OpenStreetMap').add_to(m)
+    return m
+
+
 if generate_map or st.session_state.map_generated:
-    with st.spinner("Creating interactive map..."):
-        try:
-            # Store map settings in session state
-            st.session_state.map_type = map_type
-            st.session_state.map_generated = True
-            
-            if map_type == "Cluster Map":
-                # Check if clusters exist, if not create simple clusters
-                if 'clusters' in st.session_state:
-                    df_with_clusters = st.session_state['clustered_data']
-                    m = visualizer.create_cluster_map(df_with_clusters)
-                else:
-                    # Create simple clustering for visualization
-                    st.info("Using simple clustering for visualization")
-                    m = visualizer.create_cluster_map(df)
-                    
-            elif map_type == "Heat Map":
-                m = visualizer.create_heat_map(df, radius=radius)
+    # Store map settings in session state
+    st.session_state.map_type = map_type
+    st.session_state.map_generated = True
+    st.session_state.map_layer = None
+    map_object = None
+    
+    cached_map = None if adaptive_map else map_cache.get(map_key)
+    if cached_map is None:
+        with st.spinner("Creating interactive map..."):
+            try:
+                extras = {}
                 
-            else:  # Point Map
-                m = visualizer.create_point_map(df, point_size=point_size, opacity=opacity)
+                if map_type == "Cluster Map":
+                    # Check if clusters exist, if not create simple clusters
+                    if 'clusters' in st.session_state:
+                        df_with_clusters = st.session_state['clustered_data']
+                        m = visualizer.create_cluster_map(df_with_clusters)
+                    else:
+                        # The latest detection run on this dataset, else a default clustering computed once
+                        published = visualizer.cluster_store.get(dataset_key)
+                        if published is None:
+                            st.info("Using a default K-Means clustering; run Hotspot Detection for tuned hotspots")
+                        else:
+                            st.info(f"Showing the latest {published['algorithm']} hotspots detected for this dataset")
+                        m = visualizer.create_cluster_map(df, dataset_key=dataset_key)
+                    
+                elif map_type == "Heat Map" and heat_tiles:
+                    # The tile source (and its spatial index) is reused until the data or settings change
+                    tile_key = (dataset_key, radius, heat_severity)
+                    if st.session_state.get('heat_tile_key') != tile_key:
+                        weights = df['Severity'].to_numpy(dtype=float) if heat_severity else None
+                        st.session_state['heat_tile_source'] = TileLayerSource(
+                            'heat', df[['Latitude', 'Longitude']].to_numpy(), weights, radius=radius)
+                        st.session_state['heat_tile_key'] = tile_key
+                    tile_url = shared_server().register(st.session_state['heat_tile_source'])
+                    m = visualizer.create_tiled_map(tile_url, name="Accident heat")
             
-            # Set base map
-            if base_map == "CartoDB Positron":
-                folium.TileLayer('CartoDB positron').add_to(m)
-            elif base_map == "CartoDB Dark_Matter":
-                folium.TileLayer('CartoDB dark_matter').add_to(m)
-            else:
-                folium.TileLayer('OpenStreetMap').add_to(m)
+                elif map_type == "Heat Map":
+                    m = visualizer.create_heat_map(df, radius=radius, severity_weighted=heat_severity)
             
-            # Store the map in session state
-            st.session_state.current_map = m
+                elif map_type == "Risk Surface":
+                    # Grid cells a fifth of the bandwidth keep the surface smooth at any data size
+                    surface = GridKDE(cell_meters=max(bandwidth / 5, 10), bandwidth_meters=bandwidth).fit(
+                        df[['Latitude', 'Longitude']].to_numpy(),
+                        sample_weight=df['Severity'].to_numpy() if severity_weighted else None
+                    )
+                    extras['risk_surface'] = surface
+                    if surface.dropped_:
+                        st.caption(f"{surface.dropped_:,} accidents far outside the main area are left off the surface")
+                    m = visualizer.create_risk_surface_map(surface, opacity=opacity)
             
-            # Display success message
-            st.success(f" {map_type} generated successfully!")
+                elif map_type == "Hex Map":
+                    hex_grid = HexGrid(hex_resolution)
+                    hexes = hex_grid.aggregate(df)
+                    extras['hex_cells'] = hexes
+                    m = visualizer.create_hex_map(hexes, hex_grid, value=hex_value, opacity=opacity)
+                
+                elif adaptive_detail:  # Point Map, level of detail driven by the current view
+                    if st.session_state.get('viewport_index_key') != dataset_key:
+                        st.session_state['viewport_index'] = ViewportIndex(df)
+                        st.session_state['viewport_index_key'] = dataset_key
+                    last_view = st.session_state.get('main_map') or {}
+                    bounds, zoom = last_view.get('bounds'), last_view.get('zoom')
+                    if bounds and bounds['_southWest']['lat'] is not None and zoom is not None:
+                        view_bounds = ((bounds['_southWest']['lat'], bounds['_southWest']['lng']),
+                                       (bounds['_northEast']['lat'], bounds['_northEast']['lng']))
+                    else:
+                        zoom = 12
+                        view_bounds = viewport_bounds(visualizer.coimbatore_center, zoom)
+                    view = st.session_state['viewport_index'].view(view_bounds, zoom)
+                    st.session_state.map_view = view
+                    st.session_state.map_layer = visualizer.create_viewport_layer(view, point_size=point_size,
+                                                                                  opacity=opacity)
+                    m = visualizer.create_base_map()
+                
+                else:  # Point Map
+                    m = visualizer.create_point_map(df, point_size=point_size, opacity=opacity)
             
-        except Exception as e:
-            st.error(f"Error creating map: {str(e)}")
-            st.info("Try using Point Map instead for simpler visualization")
+                map_object = finish_map(m)
+                
+                # Render once; only the HTML is shared, so no session ever touches another's map object
+                cached_map = {'html': map_object.get_root().render(), 'extras': extras}
+                if not adaptive_map:
+                    map_cache.put(map_key, cached_map)
+                
+                # Display success message
+                st.success(f" {map_type} generated successfully!")
+                
+            except Exception as e:
+                st.error(f"Error creating map: {str(e)}")
+                st.info("Try using Point Map instead for simpler visualization")
+    elif generate_map:
+        st.caption("Reused a previously built map for these settings")
+    
+    if cached_map is not None:
+        # Only the live maps need their object: the adaptive point map and the clickable risk surface.
+        # Every other map is shown straight from its HTML
+        if map_type == "Risk Surface" and map_object is None:
+            map_object = finish_map(visualizer.create_risk_surface_map(cached_map['extras']['risk_surface'],
+                                                                       opacity=opacity))
+        st.session_state.current_map = map_object if adaptive_map or map_type == "Risk Surface" else None
+        st.session_state.map_html = cached_map['html']
+        for name, value in cached_map['extras'].items():
+            st.session_state[name] = value
 
 # Display the map if it exists
-if st.session_state.map_generated and st.session_state.current_map is not None:
+if st.session_state.map_generated and (st.session_state.current_map is not None or st.session_state.get('map_html')):
     st.markdown("###  Interactive Map")
     
     # Display the map
-    map_data = st_folium(
-        st.session_state.current_map, 
-        width=1200, 
-        height=600,
-        key="main_map"
-    )
+    if st.session_state.get('map_layer') is not None:
+        # Only the layer for the current view is sent; panning or zooming reruns with the new bounds
+        map_data = st_folium(
+            st.session_state.current_map,
+            width=1200,
+            height=600,
+            key="main_map",
+            feature_group_to_add=st.session_state.map_layer,
+            returned_objects=['bounds', 'zoom', 'last_clicked']
+        )
+        view = st.session_state.map_view
+        if view['mode'] == 'markers':
+            st.caption(f"Showing all {view['in_view']:,} accidents in view")
+        else:
+            st.caption(f"{view['in_view']:,} accidents in view, grouped into {len(view['data']):,} areas; "
+                       f"zoom in to see individual accidents")
+    elif st.session_state.current_map is not None:
+        # Clicks on the risk surface are sampled below
+        map_data = st_folium(
+            st.session_state.current_map, 
+            width=1200, 
+            height=600,
+            key="main_map",
+            returned_objects=['last_clicked']
+        )
+    else:
+        # Already rendered when it was built, so it is shown as is instead of being serialized again
+        components.html(st.session_state.map_html, height=600)
+        map_data = None
     
     # Show map interaction info
     if map_data and map_data.get("last_clicked"):
         st.info(f" Last clicked location: {map_data['last_clicked']}")
+        if st.session_state.map_type == "Risk Surface" and 'risk_surface' in st.session_state:
+            clicked = map_data['last_clicked']
+            risk = st.session_state['risk_surface'].sample([[clicked['lat'], clicked['lng']]])[0]
+            st.info(f" Risk density here: {risk:,.1f} accidents/km²")
+    
+    # Risk surface exports
+    if st.session_state.map_type == "Risk Surface" and 'risk_surface' in st.session_state:
+        surface = st.session_state['risk_surface']
+        col1, col2 = st.columns(2)
+        with col1:
+            st.download_button(" Download Raster (.asc)", surface.to_ascii_grid(), file_name="risk_surface.asc",
+                               mime="text/plain", help="ESRI ASCII grid in accidents/km², opens in QGIS")
+        with col2:
+            st.download_button(" Download Contours (.geojson)", surface.to_geojson(),
+                               file_name="risk_contours.geojson", mime="application/geo+json")
+    
+    # Standalone copy of the map (the adaptive point map only exists live)
+    if st.session_state.get('map_layer') is None and st.session_state.get('map_html'):
+        st.download_button(" Download Map (.html)", st.session_state.map_html,
+                           file_name=f"{st.session_state.map_type.lower().replace(' ', '_')}.html", mime="text/html")
+    
+    # Hexagon aggregates
+    if st.session_state.map_type == "Hex Map" and 'hex_cells' in st.session_state:
+        st.download_button(" Download Hexagon Table (.csv)", st.session_state['hex_cells'].to_csv(index=False),
+                           file_name="hex_aggregates.csv", mime="text/csv")
     
     # Add a button to regenerate map with current settings
     if st.button("🔄 Regenerate Map", key="regenerate_map"):
@@ -228,9 +408,10 @@ col1, col2 = st.columns(2)
 
 with col1:
     if st.button(" Save Map as HTML", use_container_width=True):
-        if st.session_state.current_map:
+        if st.session_state.get('map_html'):
             try:
-                st.session_state.current_map.save("hotspot_map.html")
+                with open("hotspot_map.html", "w", encoding="utf-8") as f:
+                    f.write(st.session_state.map_html)
                 st.success("Map saved as 'hotspot_map.html' in your project folder!")
             except Exception as e:
                 st.error(f"Error saving map: {e}")
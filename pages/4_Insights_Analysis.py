@@ -5,6 +5,8 @@ import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 from utils.data_processor import DataProcessor
+from utils.insights import InsightAggregator, daily_counts, summary_report
+from utils.result_cache import ResultCache, dataset_fingerprint, make_key
 
 st.set_page_config(page_title="Insights Analysis", page_icon="", layout="wide")
 
@@ -22,6 +24,11 @@ def load_css():
 
 load_css()
 
+@st.cache_resource
+def get_insights_cache():
+    """Aggregates and exports shared by every session, keyed by dataset version"""
+    return ResultCache(max_entries=16, max_bytes=256 * 1024 ** 2)
+
 # Header
 st.markdown("""
 <div style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); padding: 60px 0; text-align: center; color: white; border-radius: 20px; margin-bottom: 40px;">
@@ -51,6 +58,18 @@ if 'accident_data' not in st.session_state:
 # Load data
 df = st.session_state['accident_data']
 processor = DataProcessor()
+if 'dataset_key' not in st.session_state:
+    st.session_state['dataset_key'] = dataset_fingerprint(df)
+dataset_key = st.session_state['dataset_key']
+
+# Add area information if not already present
+if 'Area' not in df.columns:
+    df['Area'] = processor.assign_areas(df)
+
+# Every chart below reads these; they are computed once per dataset version
+insights = get_insights_cache().get_or_compute(make_key(dataset_key, 'insights'),
+                                               lambda: InsightAggregator().compute(df))
+factor_tables = insights['factors']
 
 # Overview metrics
 st.markdown("##  Overview Metrics")
@@ -58,19 +77,19 @@ st.markdown("##  Overview Metrics")
 col1, col2, col3, col4 = st.columns(4)
 
 with col1:
-    total_accidents = len(df)
+    total_accidents = insights['total']
     st.metric("Total Accidents", total_accidents)
 
 with col2:
-    avg_severity = df['Severity'].mean()
+    avg_severity = insights['avg_severity']
     st.metric("Average Severity", f"{avg_severity:.2f}")
 
 with col3:
-    fatal_accidents = len(df[df['Severity'] == 4])
+    fatal_accidents = insights['fatal']
     st.metric("High Severity (4)", fatal_accidents)
 
 with col4:
-    avg_vehicles = df['Vehicles_Involved'].mean()
+    avg_vehicles = insights['avg_vehicles']
     st.metric("Avg Vehicles Involved", f"{avg_vehicles:.1f}")
 
 # Time-based Analysis
@@ -80,7 +99,7 @@ col1, col2 = st.columns(2)
 
 with col1:
     # Hourly distribution
-    hourly = df['Hour'].value_counts().sort_index()
+    hourly = factor_tables['Hour']['Accidents']
     fig = px.area(
         x=hourly.index,
         y=hourly.values,
@@ -92,8 +111,7 @@ with col1:
 
 with col2:
     # Day of week distribution
-    day_order = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-    daily = df['DayOfWeek'].value_counts().reindex(day_order, fill_value=0)
+    daily = daily_counts(insights)
     fig = px.bar(
         x=daily.index,
         y=daily.values,
@@ -111,7 +129,7 @@ col1, col2 = st.columns(2)
 
 with col1:
     # Weather impact - FIXED
-    weather_counts = df['Weather'].value_counts()
+    weather_counts = factor_tables['Weather']['Accidents'].sort_values(ascending=False)
     fig = px.bar(
         x=weather_counts.values,
         y=weather_counts.index,
@@ -125,7 +143,7 @@ with col1:
 
 with col2:
     # Road type analysis - FIXED (no more color_continuous_scale error)
-    road_counts = df['Road_Type'].value_counts()
+    road_counts = factor_tables['Road_Type']['Accidents'].sort_values(ascending=False)
     fig = px.pie(
         values=road_counts.values,
         names=road_counts.index,
@@ -140,7 +158,7 @@ col1, col2 = st.columns(2)
 
 with col1:
     # Severity distribution
-    severity_counts = df['Severity'].value_counts().sort_index()
+    severity_counts = insights['severity_counts']
     fig = px.bar(
         x=severity_counts.index,
         y=severity_counts.values,
@@ -158,7 +176,7 @@ with col2:
         ['Weather', 'Road_Type', 'Light_Condition', 'Speed_Limit']
     )
     
-    severity_by_factor = df.groupby(factors)['Severity'].mean().sort_values(ascending=False)
+    severity_by_factor = factor_tables[factors]['Avg_Severity'].sort_values(ascending=False)
     fig = px.bar(
         x=severity_by_factor.index,
         y=severity_by_factor.values,
@@ -173,10 +191,8 @@ with col2:
 st.markdown("##  Correlation Analysis")
 
 # Create correlation matrix
-numeric_cols = ['Severity', 'Vehicles_Involved', 'Speed_Limit', 'Hour']
-if all(col in df.columns for col in numeric_cols):
-    corr_matrix = df[numeric_cols].corr()
-    
+corr_matrix = insights['correlation']
+if corr_matrix is not None:
     fig = px.imshow(
         corr_matrix,
         title="Correlation Matrix of Numerical Features",
@@ -192,10 +208,9 @@ col1, col2 = st.columns(2)
 
 with col1:
     # High severity accidents analysis
-    high_severity = df[df['Severity'] >= 3]
-    
-    if not high_severity.empty:
-        risk_factors = high_severity['Weather'].value_counts().head(5)
+    if insights['high_severity'] > 0:
+        risk_factors = factor_tables['Weather']['High_Severity'].nlargest(5)
+        risk_factors = risk_factors[risk_factors > 0]
         fig = px.bar(
             x=risk_factors.values,
             y=risk_factors.index,
@@ -209,8 +224,8 @@ with col1:
 
 with col2:
     # Speed limit vs severity
-    if not high_severity.empty:
-        speed_severity = df.groupby('Speed_Limit')['Severity'].mean()
+    if insights['high_severity'] > 0:
+        speed_severity = factor_tables['Speed_Limit']['Avg_Severity']
         fig = px.scatter(
             x=speed_severity.index,
             y=speed_severity.values,
@@ -225,18 +240,14 @@ with col2:
 # Coimbatore Specific Analysis
 st.markdown("##  Coimbatore Area Analysis")
 
-# Add area information if not already present
-if 'Area' not in df.columns:
-    df['Area'] = df.apply(lambda row: processor.get_area_name(row['Latitude'], row['Longitude']), axis=1)
-
 coimbatore_areas = ['Kovaipudur', 'Gandhipuram', 'Ukkadam', 'Kuniyamuthur']
-coimbatore_data = df[df['Area'].isin(coimbatore_areas)]
+coimbatore_data = factor_tables['Area'][factor_tables['Area'].index.isin(coimbatore_areas)]
 
 if not coimbatore_data.empty:
     col1, col2 = st.columns(2)
     
     with col1:
-        area_counts = coimbatore_data['Area'].value_counts()
+        area_counts = coimbatore_data['Accidents'].sort_values(ascending=False)
         fig = px.bar(
             x=area_counts.values,
             y=area_counts.index,
@@ -249,7 +260,7 @@ if not coimbatore_data.empty:
         st.plotly_chart(fig, use_container_width=True)
     
     with col2:
-        area_severity = coimbatore_data.groupby('Area')['Severity'].mean().sort_values(ascending=False)
+        area_severity = coimbatore_data['Avg_Severity'].sort_values(ascending=False)
         fig = px.bar(
             x=area_severity.index,
             y=area_severity.values,
@@ -268,37 +279,25 @@ col1, col2 = st.columns(2)
 
 with col1:
     # Download summary report
-    summary_report = f"""
-    Road Accident Analysis Summary Report
-    ====================================
-    
-    Total Accidents: {len(df)}
-    Average Severity: {df['Severity'].mean():.2f}
-    High Severity Accidents (4): {len(df[df['Severity'] == 4])}
-    
-    Time Patterns:
-    - Peak Hour: {df['Hour'].value_counts().idxmax()}:00
-    - Most Common Day: {df['DayOfWeek'].value_counts().idxmax()}
-    
-    Risk Factors:
-    - Most Dangerous Weather: {df.groupby('Weather')['Severity'].mean().idxmax()}
-    - Most Dangerous Road Type: {df.groupby('Road_Type')['Severity'].mean().idxmax()}
-    """
+    summary = summary_report(insights)
     
     st.download_button(
         label=" Download Summary Report",
-        data=summary_report,
+        data=summary,
         file_name="accident_analysis_report.txt",
         mime="text/plain"
     )
 
 with col2:
-    # Download detailed data
-    analysis_data = df.copy()
-    if 'clusters' in st.session_state:
-        analysis_data['Cluster'] = st.session_state['clusters']
+    # Download detailed data; writing the CSV is the slowest step of the page, so it is cached too
+    def export_csv():
+        analysis_data = df.copy()
+        if 'clusters' in st.session_state:
+            analysis_data['Cluster'] = st.session_state['clusters']
+        return analysis_data.to_csv(index=False)
     
-    csv = analysis_data.to_csv(index=False)
+    clusters_key = st.session_state.get('cluster_key') if 'clusters' in st.session_state else None
+    csv = get_insights_cache().get_or_compute(make_key(dataset_key, 'export', clusters=clusters_key), export_csv)
     st.download_button(
         label=" Download Analysis Data",
         data=csv,
@@ -0,0 +1,42 @@
+import io
+
+import pandas as pd
+import pytest
+
+from utils.data_processor import DataProcessor
+
+ROWS = [
+    (11.00, 76.96, 2, 'Clear', 'Highway', 2, 'Day', 60),
+    (11.01, 76.95, 3, 'Rain', 'City Road', 1, 'Night', 40),
+    (10.99, 76.96, 1, 'Fog', 'Rural Road', 3, 'Dusk', 50),
+    (11.02, 76.97, 4, 'Clear', 'Highway', 2, 'Day', 80),
+]
+COLUMNS = ['Latitude', 'Longitude', 'Severity', 'Weather', 'Road_Type', 'Vehicles_Involved',
+           'Light_Condition', 'Speed_Limit']
+
+
+def make_csv(times):
+    df = pd.DataFrame(ROWS, columns=COLUMNS)
+    df['Date_Time'] = times
+    return io.BytesIO(df.to_csv(index=False).encode())
+
+
+def test_later_chunk_in_another_format():
+    upload = make_csv(['2024-01-15 08:30:00', '2024-01-16 09:00:00', '17/01/2024 10:15', '18/01/2024 23:45'])
+    df = DataProcessor().load_data(upload, chunksize=2)
+    assert df['Date_Time'].tolist() == pd.to_datetime(
+        ['2024-01-15 08:30', '2024-01-16 09:00', '2024-01-17 10:15', '2024-01-18 23:45']).tolist()
+    assert df['Hour'].tolist() == [8, 9, 10, 23]
+
+
+def test_chunk_mixing_formats():
+    upload = make_csv(['2024-01-15 08:30:00', '17/01/2024 10:15', '2024-01-16 09:00:00', None])
+    df = DataProcessor().load_data(upload)
+    assert df['Date_Time'].iloc[1] == pd.Timestamp('2024-01-17 10:15')
+    assert df['Date_Time'].isna().tolist() == [False, False, False, True]
+
+
+def test_unparseable_value_names_chunk_and_row():
+    upload = make_csv(['2024-01-15 08:30:00', '2024-01-16 09:00:00', '2024-01-17 10:15:00', 'yesterday'])
+    with pytest.raises(ValueError, match=r"'yesterday' in chunk 2 \(row 4\)"):
+        DataProcessor().load_data(upload, chunksize=2)
@@ -0,0 +1,28 @@
+import json
+
+import folium
+
+from utils.map_layers import PointLayer
+
+HOSTILE = '</script><script>alert(1)</script>'
+
+
+def make_layer(weather):
+    return PointLayer([11.0, 11.01], [76.96, 76.97], [0, 1], ['red', 'blue'],
+                      fields={'Weather': ('Weather', weather)}, title='Accident & <Severity>')
+
+
+def test_payload_cannot_close_the_script():
+    layer = make_layer([HOSTILE, 'Clear'])
+    assert '<' not in layer.payload and '>' not in layer.payload and '&' not in layer.payload
+    data = json.loads(layer.payload)
+    assert data['fields'][0]['labels'] == [HOSTILE, 'Clear']
+    assert data['title'] == '<b>Accident & <Severity></b>'
+
+
+def test_rendered_map_has_no_injected_script():
+    m = folium.Map(location=[11.0, 76.96])
+    make_layer([HOSTILE, 'Clear']).add_to(m)
+    html = m.get_root().render()
+    assert HOSTILE not in html
+    assert 'alert(1)' in html
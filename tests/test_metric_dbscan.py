@@ -0,0 +1,25 @@
+import numpy as np
+
+from utils.metric_dbscan import MetricDBSCAN
+
+
+def test_neighbor_graph_of_no_rows_is_empty():
+    graph = MetricDBSCAN().neighbor_graph(np.empty((0, 2)), max_eps_meters=200)
+    assert len(graph.points) == 0 and len(graph.src) == 0
+    assert graph.labels(100, 3).tolist() == []
+
+
+def test_neighbor_graph_without_pairs():
+    graph = MetricDBSCAN().neighbor_graph([[11.0, 76.96], [11.5, 77.5]], max_eps_meters=200)
+    assert len(graph.src) == 0
+    assert graph.labels(100, 1).tolist() == [0, 1]
+    assert graph.labels(100, 2).tolist() == [-1, -1]
+
+
+def test_neighbor_graph_matches_fit_predict():
+    rng = np.random.default_rng(0)
+    coords = np.column_stack([rng.normal(11.0, 0.005, 2000), rng.normal(76.96, 0.005, 2000)]).round(5)
+    graph = MetricDBSCAN().neighbor_graph(coords, max_eps_meters=150)
+    for eps, min_samples in [(50, 3), (100, 5), (150, 10)]:
+        expected = MetricDBSCAN(eps, min_samples).fit_predict(coords)
+        assert np.array_equal(graph.labels(eps, min_samples), expected)
@@ -0,0 +1,38 @@
+import numpy as np
+import pandas as pd
+
+from utils.ml_model import HotspotModel
+from utils.st_dbscan import STDBSCAN
+
+
+def make_burst():
+    """Six accidents at one junction within an hour, one of them without a time"""
+    coords = np.column_stack([np.full(6, 11.0), np.full(6, 76.96)]) + np.arange(6)[:, None] * 1e-5
+    times = pd.to_datetime(['2024-01-01 08:00', '2024-01-01 08:10', '', '2024-01-01 08:20',
+                            '2024-01-01 08:30', '2024-01-01 08:40'])
+    return coords, pd.Series(times)
+
+
+def test_blank_timestamp_is_noise():
+    coords, times = make_burst()
+    dbscan = STDBSCAN(eps_meters=100, eps_minutes=60, min_samples=3)
+    labels = dbscan.fit_predict(coords, times)
+    assert labels[2] == -1
+    assert not dbscan.core_sample_mask_[2]
+    assert (np.delete(labels, 2) == 0).all()
+
+
+def test_all_blank_timestamps():
+    coords, _ = make_burst()
+    labels = STDBSCAN(min_samples=3).fit_predict(coords, pd.Series(pd.NaT, index=range(6)))
+    assert (labels == -1).all()
+
+
+def test_model_remembers_st_dbscan_fit():
+    coords, times = make_burst()
+    model = HotspotModel()
+    model.st_dbscan.set_params(eps_minutes=60)
+    labels = model.detect_hotspots_st_dbscan(coords, times)
+    assert model.algorithm_ == 'ST-DBSCAN'
+    assert labels[2] == -1
+    assert model.predict([[11.0, 76.96], [11.1, 77.1]]).tolist() == [0, -1]
@@ -0,0 +1,92 @@
+import numpy as np
+import pandas as pd
+
+
+class AreaIndex:
+    """Grid index over a gazetteer of named areas for bulk area lookup"""
+
+    def __init__(self, areas, radius=0.02, default="Other Area"):
+        self.radius = radius
+        self.default = default
+        self.names = np.array(list(areas.keys()), dtype=object)
+        centers = np.array(list(areas.values()), dtype=float).reshape(-1, 2)
+        self.area_lat = centers[:, 0]
+        self.area_lon = centers[:, 1]
+        self._build()
+
+    def _cell(self, lat, lon):
+        """Integer grid cell of each coordinate (cell size equals the radius)"""
+        row = np.floor(lat / self.radius).astype(np.int64)
+        col = np.floor(lon / self.radius).astype(np.int64)
+        return row, col
+
+    def _key(self, row, col):
+        return row * 1_000_003 + col
+
+    def _build(self):
+        """Register every area in the 3x3 block of cells its match box can touch"""
+        n = len(self.names)
+        if n == 0:
+            self.keys = np.empty(0, dtype=np.int64)
+            self.area_ids = np.empty(0, dtype=np.int64)
+            self.max_per_cell = 0
+            return
+
+        row, col = self._cell(self.area_lat, self.area_lon)
+        offsets = np.array([-1, 0, 1])
+        d_row = np.repeat(offsets, 3)
+        d_col = np.tile(offsets, 3)
+
+        keys = self._key(row[:, None] + d_row, col[:, None] + d_col).ravel()
+        ids = np.repeat(np.arange(n), 9)
+
+        # Sort by cell, then by gazetteer order so the first hit is the first match
+        order = np.lexsort((ids, keys))
+        self.keys = keys[order]
+        self.area_ids = ids[order]
+        _, counts = np.unique(self.keys, return_counts=True)
+        self.max_per_cell = int(counts.max())
+
+    def lookup(self, lat, lon):
+        """Return the index of the first area within radius of each point, or -1"""
+        lat = np.asarray(lat, dtype=float)
+        lon = np.asarray(lon, dtype=float)
+        result = np.full(len(lat), -1, dtype=np.int64)
+        if len(self.names) == 0 or len(lat) == 0:
+            return result
+
+        valid = np.isfinite(lat) & np.isfinite(lon)
+        pts = np.flatnonzero(valid)
+        row, col = self._cell(lat[pts], lon[pts])
+        key = self._key(row, col)
+        start = np.searchsorted(self.keys, key, side='left')
+        end = np.searchsorted(self.keys, key, side='right')
+
+        # Walk each cell's candidate list in gazetteer order, one slot at a time
+        pending = np.ones(len(pts), dtype=bool)
+        for slot in range(self.max_per_cell):
+            active = pending & (start + slot < end)
+            if not active.any():
+                break
+            sel = np.flatnonzero(active)
+            cand = self.area_ids[start[sel] + slot]
+            p = pts[sel]
+            hit = (np.abs(lat[p] - self.area_lat[cand]) < self.radius) & \
+                  (np.abs(lon[p] - self.area_lon[cand]) < self.radius)
+            result[p[hit]] = cand[hit]
+            pending[sel[hit]] = False
+
+        return result
+
+    def assign(self, lat, lon):
+        """Return the area name for each point"""
+        ids = self.lookup(lat, lon)
+        names = np.append(self.names, self.default)
+        return names[ids]
+
+    def assign_frame(self, df):
+        """Return a Series of area names aligned with the frame's index"""
+        if len(df) == 0:
+            return pd.Series([], index=df.index, dtype=object)
+        names = self.assign(df['Latitude'].to_numpy(), df['Longitude'].to_numpy())
+        return pd.Series(names, index=df.index, dtype=object)
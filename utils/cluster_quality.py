@@ -0,0 +1,107 @@
+import numpy as np
+from sklearn.metrics import (calinski_harabasz_score, davies_bouldin_score,
+                             silhouette_samples, silhouette_score)
+
+# Two-sided 95% Student t quantiles by degrees of freedom (1..20)
+T_975 = [12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+         2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086]
+
+
+class ClusterQuality:
+    """Cluster quality metrics that stay affordable on large datasets
+
+    The exact silhouette score needs all pairwise distances, so above
+    ``exact_threshold`` points it is estimated from a stratified sample
+    (every cluster represented in proportion to its size) with an approximate
+    95% confidence interval from independent replicates. Davies-Bouldin and Calinski-Harabasz only need
+    centroid distances and are always computed on every point.
+    """
+
+    def __init__(self, exact_threshold=20_000, sample_size=10_000, n_replicates=5, random_state=42):
+        self.exact_threshold = exact_threshold
+        self.sample_size = sample_size
+        self.n_replicates = max(n_replicates, 2)
+        self.random_state = random_state
+
+    def evaluate(self, coordinates, labels, extra_metrics=True):
+        """Silhouette (exact or sampled), Davies-Bouldin and Calinski-Harabasz; noise (-1) is ignored"""
+        X = np.asarray(coordinates, dtype=float)
+        labels = np.asarray(labels)
+        valid = labels != -1
+        X, labels = X[valid], labels[valid]
+        n_clusters = len(np.unique(labels))
+
+        result = {
+            'n_points': len(X),
+            'n_clusters': n_clusters,
+            'silhouette': 0.0,
+            'silhouette_ci': (0.0, 0.0),
+            'sample_size': 0,
+            'exact': True,
+            'davies_bouldin': None,
+            'calinski_harabasz': None
+        }
+        if n_clusters < 2 or n_clusters >= len(X):
+            return result
+
+        if len(X) <= self.exact_threshold:
+            score = float(silhouette_score(X, labels))
+            result.update(silhouette=score, silhouette_ci=(score, score), sample_size=len(X))
+        else:
+            score, ci, size = self.sampled_silhouette(X, labels)
+            result.update(silhouette=score, silhouette_ci=ci, sample_size=size, exact=False)
+
+        if not extra_metrics:
+            return result
+        result['davies_bouldin'] = float(davies_bouldin_score(X, labels))
+        result['calinski_harabasz'] = float(calinski_harabasz_score(X, labels))
+        return result
+
+    def sampled_silhouette(self, X, labels):
+        """Stratified-sample silhouette estimate, its ~95% CI and the sample size used
+
+        The sample budget is split over independent stratified replicates;
+        the spread of the replicate scores gives the confidence interval.
+        """
+        clusters, sizes = np.unique(labels, return_counts=True)
+        rng = np.random.default_rng(self.random_state)
+        size = max(self.sample_size // self.n_replicates, 2)
+
+        scores = []
+        used = 0
+        for _ in range(self.n_replicates):
+            rows = self.stratified_sample(labels, size, rng)
+            values = silhouette_samples(X[rows], labels[rows])
+            # Weight each sampled cluster's mean by its share of the full dataset
+            present, codes = np.unique(labels[rows], return_inverse=True)
+            codes = codes.ravel()
+            means = np.bincount(codes, weights=values) / np.bincount(codes)
+            shares = sizes[np.searchsorted(clusters, present)]
+            scores.append(float(np.sum(shares * means) / shares.sum()))
+            used += len(rows)
+
+        estimate = float(np.mean(scores))
+        t = T_975[min(self.n_replicates - 2, len(T_975) - 1)]
+        half_width = float(t * np.std(scores, ddof=1) / np.sqrt(self.n_replicates))
+        ci = (max(estimate - half_width, -1.0), min(estimate + half_width, 1.0))
+        return estimate, ci, used
+
+    def stratified_sample(self, labels, size, rng):
+        """Row indices of a proportional per-cluster sample
+
+        Every sampled cluster gets at least two rows. When there are more
+        clusters than the budget allows, the smallest ones may be left out.
+        """
+        _, codes, sizes = np.unique(labels, return_inverse=True, return_counts=True)
+        codes = codes.ravel()
+        quota = np.round(size * sizes / len(labels))
+        if 2 * len(sizes) <= size:
+            quota = np.maximum(quota, 2)
+        quota = np.where(quota == 1, 2, quota)
+        quota = np.minimum(quota, sizes).astype(np.int64)
+
+        # Random order within each cluster, then keep the first `quota` rows of each
+        order = np.lexsort((rng.random(len(labels)), codes))
+        starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+        rank = np.arange(len(labels)) - starts[codes[order]]
+        return np.sort(order[rank < quota[codes[order]]])
@@ -0,0 +1,58 @@
+import threading
+
+import numpy as np
+
+from utils.ml_model import HotspotModel
+from utils.result_cache import ResultCache, dataset_fingerprint, make_key
+
+
+class ClusterStore:
+    """Latest cluster labels per dataset version, shared by the pages and the map renderer
+
+    Page 2 publishes each detection run here, so any map of the same
+    dataset shows those hotspots. When a dataset has no published result,
+    a default K-Means clustering is computed once through HotspotModel and
+    kept, so rendering never has to fit a model.
+    """
+
+    def __init__(self, cache=None, default_clusters=5):
+        self.cache = cache or ResultCache(max_entries=32, max_bytes=256 * 1024 ** 2)
+        self.default_clusters = default_clusters
+
+    def put(self, dataset_key, labels, algorithm):
+        """Publish a clustering of the dataset, replacing any earlier one"""
+        self.cache.put(make_key(dataset_key, 'labels'),
+                       {'labels': np.asarray(labels, dtype=np.int64).copy(), 'algorithm': algorithm})
+
+    def get(self, dataset_key):
+        """The published {'labels', 'algorithm'} of a dataset version, or None"""
+        return self.cache.get(make_key(dataset_key, 'labels'))
+
+    def labels_for(self, df, dataset_key=None):
+        """Cluster labels for every row of df: the published ones, else a cached default K-Means run"""
+        dataset_key = dataset_key or dataset_fingerprint(df)
+        published = self.get(dataset_key)
+        if published is not None and len(published['labels']) == len(df):
+            return published['labels']
+        return self.cache.get_or_compute(make_key(dataset_key, 'default-kmeans', k=self.default_clusters),
+                                         lambda: self._default_labels(df))
+
+    def _default_labels(self, df):
+        n_clusters = min(self.default_clusters, len(df))
+        if n_clusters < 2:
+            return np.zeros(len(df), dtype=np.int64)
+        clusters, _ = HotspotModel().detect_hotspots_kmeans(df[['Latitude', 'Longitude']].to_numpy(), n_clusters)
+        return np.asarray(clusters, dtype=np.int64)
+
+
+_shared_store = None
+_shared_lock = threading.Lock()
+
+
+def shared_cluster_store():
+    """The process-wide cluster store, so every session of a server sees the same results"""
+    global _shared_store
+    with _shared_lock:
+        if _shared_store is None:
+            _shared_store = ClusterStore()
+        return _shared_store
@@ -1,8 +1,54 @@
+import os
 import pandas as pd
 import numpy as np
 from datetime import datetime
+from utils.area_index import AreaIndex
+
+# Declared dtypes for the nine documented input columns
+# Integer columns are nullable while parsing, so a blank value does not reject the file
+ACCIDENT_SCHEMA = {
+    'Latitude': 'float64',
+    'Longitude': 'float64',
+    'Severity': 'Int64',
+    'Date_Time': str,
+    'Weather': str,
+    'Road_Type': str,
+    'Vehicles_Involved': 'Int64',
+    'Light_Condition': str,
+    'Speed_Limit': 'Int64'
+}
+
+# Date_Time formats tried, in order, when none is given explicitly
+DATETIME_FORMATS = [
+    '%Y-%m-%d %H:%M:%S',
+    '%Y-%m-%d %H:%M',
+    '%Y-%m-%dT%H:%M:%S',
+    '%d-%m-%Y %H:%M:%S',
+    '%d-%m-%Y %H:%M',
+    '%d/%m/%Y %H:%M:%S',
+    '%d/%m/%Y %H:%M',
+    '%m/%d/%Y %H:%M:%S',
+    '%m/%d/%Y %H:%M',
+    '%Y/%m/%d %H:%M:%S',
+    '%Y-%m-%d'
+]
+
+# Fixed category sets used by the compact in-memory frame
+WEATHER_CATEGORIES = ['Clear', 'Rain', 'Fog', 'Snow', 'Cloudy', 'Windy']
+ROAD_TYPE_CATEGORIES = ['Highway', 'City Road', 'Rural Road', 'Residential Street']
+LIGHT_CONDITION_CATEGORIES = ['Day', 'Night', 'Dawn', 'Dusk']
+DAY_CATEGORIES = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+MONTH_CATEGORIES = ['January', 'February', 'March', 'April', 'May', 'June', 'July',
+                    'August', 'September', 'October', 'November', 'December']
 
 class DataProcessor:
+    # Bump whenever processing output changes so cached datasets are invalidated
+    VERSION = 2
+    DEFAULT_CHUNKSIZE = 250_000
+    DATETIME_SAMPLE_SIZE = 100
+    # Largest coordinate change (degrees, ~1 m) accepted when narrowing to float32
+    COORDINATE_TOLERANCE = 1e-5
+    
     def __init__(self):
         self.coimbatore_areas = {
             'Kovaipudur': (11.0014, 76.9627),
@@ -10,18 +56,189 @@ class DataProcessor:
             'Ukkadam': (10.9905, 76.9614),
             'Kuniyamuthur': (11.0189, 76.9565)
         }
+        self._area_index = None
+        self.memory_report = None
+    
+    def load_gazetteer(self, file_path):
+        """Load named areas from a CSV with Area, Latitude and Longitude columns"""
+        areas = pd.read_csv(file_path)
+        self.coimbatore_areas = {
+            row.Area: (row.Latitude, row.Longitude)
+            for row in areas.itertuples(index=False)
+        }
+        self._area_index = None
+        return self.coimbatore_areas
+    
+    def load_data(self, file_path, chunksize=None, datetime_format=None, progress_callback=None):
+        """Load and preprocess accident data
+
+        The CSV is streamed in chunks of ``chunksize`` rows (DEFAULT_CHUNKSIZE
+        by default) with the declared ACCIDENT_SCHEMA dtypes, and time features
+        are derived per chunk. ``progress_callback(fraction, rows)`` is called
+        after every chunk.
+        """
+        chunks = list(self.iter_chunks(file_path, chunksize, datetime_format, progress_callback))
+        if len(chunks) == 1:
+            return chunks[0]
+        return pd.concat(chunks, ignore_index=True)
     
-    def load_data(self, file_path):
-        """Load and preprocess accident data"""
+    def iter_chunks(self, file_path, chunksize=None, datetime_format=None, progress_callback=None):
+        """Yield preprocessed chunks of an accident CSV without loading it whole"""
         if hasattr(file_path, 'read'):
             # It's a file upload object
-            df = pd.read_csv(file_path)
+            handle = file_path
+            total_bytes = getattr(file_path, 'size', None) or self._stream_size(file_path)
+            owns_handle = False
+            if getattr(handle, 'seekable', lambda: False)():
+                handle.seek(0)
         else:
             # It's a file path
-            df = pd.read_csv(file_path)
+            handle = open(file_path, 'rb')
+            total_bytes = os.path.getsize(file_path)
+            owns_handle = True
+        
+        try:
+            reader = pd.read_csv(
+                handle,
+                dtype=ACCIDENT_SCHEMA,
+                chunksize=chunksize or self.DEFAULT_CHUNKSIZE
+            )
+            rows = 0
+            fmt = datetime_format
+            for number, chunk in enumerate(reader, start=1):
+                chunk = self._plain_integers(chunk)
+                chunk['Date_Time'], fmt = self._parse_datetimes(chunk['Date_Time'], fmt, number)
+                rows += len(chunk)
+                yield self._add_time_features(chunk)
+                
+                if progress_callback is not None:
+                    progress_callback(self._progress(handle, total_bytes), rows)
+        finally:
+            if owns_handle:
+                handle.close()
+        
+        if progress_callback is not None:
+            progress_callback(1.0, rows)
+    
+    def iter_coordinates(self, file_path, chunksize=None):
+        """Yield valid (Latitude, Longitude) arrays chunk by chunk"""
+        for chunk in self.iter_chunks(file_path, chunksize):
+            chunk = self.validate_coordinates(chunk)
+            yield chunk[['Latitude', 'Longitude']].to_numpy()
+    
+    def process(self, file_path, progress_callback=None, compact=True):
+        """Load, validate and area-tag an accident file"""
+        df = self.load_data(file_path, progress_callback=progress_callback)
+        df = self.validate_coordinates(df)
+        df['Area'] = self.assign_areas(df)
+        
+        if compact:
+            before = self.bytes_per_row(df)
+            df = self.compact(df)
+            self.memory_report = {'before': before, 'after': self.bytes_per_row(df)}
+        return df
+    
+    def compact(self, df):
+        """Shrink a frame with categoricals, downcast integers and float32 coordinates"""
+        df = df.copy(deep=False)
+        
+        for col, categories in self.category_sets().items():
+            if col not in df.columns:
+                continue
+            # Keep the fixed set first and append any unexpected values so nothing is lost
+            observed = pd.Index(df[col].dropna().unique())
+            extra = sorted(str(v) for v in observed.difference(categories))
+            ordered = col in ('DayOfWeek', 'Month')
+            dtype = pd.CategoricalDtype(list(categories) + extra, ordered=ordered and not extra)
+            df[col] = df[col].astype(dtype)
         
+        for col in ['Severity', 'Hour', 'Vehicles_Involved', 'Speed_Limit']:
+            if col in df.columns and pd.api.types.is_integer_dtype(df[col]):
+                df[col] = pd.to_numeric(df[col], downcast='integer')
+            elif col in df.columns and pd.api.types.is_float_dtype(df[col]):
+                # Columns with blanks stay float so they can hold NaN
+                df[col] = pd.to_numeric(df[col], downcast='float')
+        
+        for col in ['Latitude', 'Longitude']:
+            if col in df.columns and df[col].dtype == np.float64:
+                narrow = df[col].astype(np.float32)
+                error = np.nanmax(np.abs(narrow.to_numpy(np.float64) - df[col].to_numpy()), initial=0.0)
+                if error <= self.COORDINATE_TOLERANCE:
+                    df[col] = narrow
+        
+        return df
+    
+    def category_sets(self):
+        """Fixed category sets for the compact frame's categorical columns"""
+        return {
+            'Weather': WEATHER_CATEGORIES,
+            'Road_Type': ROAD_TYPE_CATEGORIES,
+            'Light_Condition': LIGHT_CONDITION_CATEGORIES,
+            'DayOfWeek': DAY_CATEGORIES,
+            'Month': MONTH_CATEGORIES,
+            'Area': list(self.coimbatore_areas) + [self.get_area_index().default]
+        }
+    
+    def bytes_per_row(self, df):
+        """In-memory size of a frame per record, including string payloads"""
+        if len(df) == 0:
+            return 0.0
+        return df.memory_usage(deep=True).sum() / len(df)
+    
+    def detect_datetime_format(self, values):
+        """Pick the first known Date_Time format that parses a sample of values"""
+        sample = values.dropna().astype(str).head(self.DATETIME_SAMPLE_SIZE)
+        if sample.empty:
+            return None
+        for fmt in DATETIME_FORMATS:
+            try:
+                pd.to_datetime(sample, format=fmt)
+                return fmt
+            except (ValueError, TypeError):
+                continue
+        return None
+    
+    def _parse_datetimes(self, values, fmt=None, chunk_number=1):
+        """Parse one chunk's Date_Time values; returns them and the format to try on the next chunk
+
+        ``fmt`` (the previous chunk's format) is tried first, then a format
+        detected from this chunk, then pandas' per-value parsing for chunks
+        that mix formats. A value nothing parses raises a ValueError naming
+        its chunk and row.
+        """
+        if fmt is not None:
+            try:
+                return pd.to_datetime(values, format=fmt), fmt
+            except (ValueError, TypeError):
+                pass
+        detected = self.detect_datetime_format(values)
+        if detected is not None and detected != fmt:
+            try:
+                return pd.to_datetime(values, format=detected), detected
+            except (ValueError, TypeError):
+                pass
+        try:
+            return pd.to_datetime(values, format='mixed'), fmt
+        except (ValueError, TypeError):
+            parsed = pd.to_datetime(values, format='mixed', errors='coerce')
+            bad = values[parsed.isna() & values.notna()]
+            if bad.empty:
+                raise
+            # The reader numbers rows across chunks; row 1 is the first record after the header
+            raise ValueError(f"Date_Time value {bad.iloc[0]!r} in chunk {chunk_number} (row {bad.index[0] + 1:,}) "
+                             f"is not a recognised date and time") from None
+    
+    def _plain_integers(self, df):
+        """Nullable integer columns as int64, or float64 with NaN when some values are blank"""
+        for col, dtype in ACCIDENT_SCHEMA.items():
+            if dtype == 'Int64' and col in df.columns:
+                df[col] = df[col].astype('float64' if df[col].hasnans else 'int64')
+        return df
+    
+    def _add_time_features(self, df, datetime_format=None):
+        """Parse Date_Time (a no-op once it is parsed) and derive Hour, DayOfWeek and Month"""
         # Convert Date_Time to datetime
-        df['Date_Time'] = pd.to_datetime(df['Date_Time'])
+        df['Date_Time'] = pd.to_datetime(df['Date_Time'], format=datetime_format)
         
         # Extract time features
         df['Hour'] = df['Date_Time'].dt.hour
@@ -30,6 +247,26 @@ class DataProcessor:
         
         return df
     
+    def _stream_size(self, handle):
+        """Size in bytes of a seekable file object, or None"""
+        try:
+            position = handle.tell()
+            handle.seek(0, os.SEEK_END)
+            size = handle.tell()
+            handle.seek(position)
+            return size
+        except (AttributeError, OSError, ValueError):
+            return None
+    
+    def _progress(self, handle, total_bytes):
+        """Fraction of the input consumed so far"""
+        if not total_bytes:
+            return 0.0
+        try:
+            return min(handle.tell() / total_bytes, 1.0)
+        except (AttributeError, OSError, ValueError):
+            return 0.0
+    
     def validate_coordinates(self, df):
         """Validate if coordinates are within India range"""
         valid_lat = (df['Latitude'] >= 8) & (df['Latitude'] <= 37)
@@ -43,6 +280,16 @@ class DataProcessor:
                 return area
         return "Other Area"
     
+    def get_area_index(self):
+        """Build (or reuse) the spatial index over the area gazetteer"""
+        if self._area_index is None:
+            self._area_index = AreaIndex(self.coimbatore_areas)
+        return self._area_index
+    
+    def assign_areas(self, df):
+        """Label every row with its area name in one vectorized pass"""
+        return self.get_area_index().assign_frame(df)
+    
     def preprocess_for_clustering(self, df):
         """Prepare data for clustering algorithms"""
         # Select relevant features
@@ -0,0 +1,215 @@
+"""On-disk cache of processed accident datasets.
+
+Processed frames are stored as uncompressed Arrow IPC (Feather v2) files so a
+later upload of the same bytes is read straight back instead of being parsed,
+validated and area-tagged again. Entries are keyed by a hash of the raw upload,
+the processor version and the area gazetteer, and evicted least-recently-used
+once the cache grows past its size budget.
+
+Usage: python -m utils.dataset_cache {list,stats,purge} [--dir DIR]
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:  # pragma: no cover - cache is disabled without pyarrow
+    pa = None
+    feather = None
+
+DEFAULT_CACHE_DIR = os.environ.get('ACCIDENT_CACHE_DIR', os.path.join('.cache', 'datasets'))
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+class DatasetCache:
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+    @property
+    def enabled(self):
+        return feather is not None
+
+    def key_for(self, source, version, areas=None):
+        """Hash raw upload bytes (bytes, file object or path) with the processor version
+
+        ``areas`` is the gazetteer the rows are tagged with ({name: (lat, lon)});
+        a different gazetteer gives a different key.
+        """
+        digest = hashlib.sha256()
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            digest.update(source)
+        elif hasattr(source, 'read'):
+            position = source.tell()
+            source.seek(0)
+            for block in iter(lambda: source.read(HASH_BLOCK_SIZE), b''):
+                digest.update(block)
+            source.seek(position)
+        else:
+            with open(source, 'rb') as f:
+                for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+                    digest.update(block)
+        digest.update(f"|processor-v{version}".encode())
+        if areas is not None:
+            gazetteer = sorted((str(name), float(lat), float(lon)) for name, (lat, lon) in areas.items())
+            digest.update(f"|areas-{json.dumps(gazetteer)}".encode())
+        return digest.hexdigest()
+
+    def _data_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.arrow")
+
+    def _meta_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key):
+        """Return the cached frame for key, or None
+
+        The file is read through a memory map, so Arrow keeps no heap copy of
+        it; the pandas frame built from it is a regular in-memory frame.
+        """
+        if not self.enabled:
+            return None
+        path = self._data_path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            table = feather.read_table(path, memory_map=True)
+            df = table.to_pandas()
+        except (OSError, pa.ArrowException) as e:
+            print(f"Dataset cache read error: {e}")
+            self.remove(key)
+            return None
+        # Touch the entry so LRU eviction sees it as recently used
+        os.utime(path, None)
+        return df
+
+    def put(self, key, df, **metadata):
+        """Write a processed frame to the cache and enforce the size budget"""
+        if not self.enabled:
+            return None
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._data_path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            table = pa.Table.from_pandas(df, preserve_index=True)
+            feather.write_feather(table, tmp_path, compression='uncompressed')
+            os.replace(tmp_path, path)
+        except (OSError, pa.ArrowException, TypeError, ValueError) as e:
+            print(f"Dataset cache write error: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return None
+
+        meta = {'rows': len(df), 'columns': len(df.columns), 'created': time.time()}
+        meta.update(metadata)
+        with open(self._meta_path(key), 'w') as f:
+            json.dump(meta, f)
+
+        self.evict(keep=(key,))
+        return path
+
+    def remove(self, key):
+        """Delete one entry"""
+        for path in (self._data_path(key), self._meta_path(key)):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def entries(self):
+        """List cache entries, most recently used first"""
+        if not os.path.isdir(self.cache_dir):
+            return []
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.arrow'):
+                continue
+            key = name[:-len('.arrow')]
+            stat = os.stat(self._data_path(key))
+            meta = {}
+            try:
+                with open(self._meta_path(key)) as f:
+                    meta = json.load(f)
+            except (OSError, ValueError):
+                pass
+            entries.append({'key': key, 'bytes': stat.st_size, 'last_used': stat.st_mtime, **meta})
+        return sorted(entries, key=lambda e: e['last_used'], reverse=True)
+
+    def total_bytes(self):
+        return sum(entry['bytes'] for entry in self.entries())
+
+    def evict(self, max_bytes=None, keep=()):
+        """Drop least-recently-used entries until the cache fits in max_bytes, never those in keep"""
+        budget = self.max_bytes if max_bytes is None else max_bytes
+        entries = self.entries()
+        total = sum(entry['bytes'] for entry in entries)
+        entries = [entry for entry in entries if entry['key'] not in keep]
+        removed = []
+        while entries and total > budget:
+            entry = entries.pop()
+            self.remove(entry['key'])
+            total -= entry['bytes']
+            removed.append(entry['key'])
+        return removed
+
+    def purge(self, older_than=None):
+        """Remove every entry, or only those unused for older_than seconds"""
+        cutoff = None if older_than is None else time.time() - older_than
+        removed = []
+        for entry in self.entries():
+            if cutoff is None or entry['last_used'] < cutoff:
+                self.remove(entry['key'])
+                removed.append(entry['key'])
+        return removed
+
+
+def _format_bytes(n):
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if n < 1024 or unit == 'GB':
+            return f"{n:.1f} {unit}"
+        n /= 1024
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect or purge the processed dataset cache")
+    parser.add_argument('--dir', default=DEFAULT_CACHE_DIR, help="cache directory")
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('list', help="list cached datasets, most recently used first")
+    sub.add_parser('stats', help="show total cache size")
+    purge = sub.add_parser('purge', help="delete cached datasets")
+    purge.add_argument('--key', help="delete only this entry (prefix match)")
+    purge.add_argument('--older-than', type=float, metavar='DAYS',
+                       help="delete entries unused for this many days")
+    purge.add_argument('--max-size', type=float, metavar='MB',
+                       help="evict least-recently-used entries down to this size")
+    args = parser.parse_args(argv)
+
+    cache = DatasetCache(args.dir)
+
+    if args.command == 'list':
+        for entry in cache.entries():
+            used = time.strftime('%Y-%m-%d %H:%M', time.localtime(entry['last_used']))
+            print(f"{entry['key'][:16]}  {_format_bytes(entry['bytes']):>10}  "
+                  f"{entry.get('rows', '?'):>10} rows  last used {used}")
+    elif args.command == 'stats':
+        entries = cache.entries()
+        print(f"{len(entries)} entries, {_format_bytes(sum(e['bytes'] for e in entries))} "
+              f"(budget {_format_bytes(cache.max_bytes)}) in {cache.cache_dir}")
+    elif args.command == 'purge':
+        if args.key:
+            removed = [e['key'] for e in cache.entries() if e['key'].startswith(args.key)]
+            for key in removed:
+                cache.remove(key)
+        elif args.max_size is not None:
+            removed = cache.evict(int(args.max_size * 1024 ** 2))
+        else:
+            older_than = None if args.older_than is None else args.older_than * 86400
+            removed = cache.purge(older_than)
+        print(f"Removed {len(removed)} entries")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,39 @@
+import numpy as np
+
+EARTH_RADIUS_M = 6_371_008.8
+
+
+def to_unit_sphere(lat, lon):
+    """Convert latitude/longitude in degrees to 3D points on the unit sphere"""
+    lat = np.radians(np.asarray(lat, dtype=float))
+    lon = np.radians(np.asarray(lon, dtype=float))
+    cos_lat = np.cos(lat)
+    return np.column_stack([cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)])
+
+
+def meters_to_chord(meters):
+    """Chord length on the unit sphere for a great-circle distance in meters
+
+    Chord length grows monotonically with great-circle distance, so a
+    Euclidean radius query on unit-sphere points with this radius returns
+    exactly the points within ``meters`` by the haversine metric.
+    """
+    return 2.0 * np.sin(np.asarray(meters, dtype=float) / (2.0 * EARTH_RADIUS_M))
+
+
+def chord_to_meters(chord):
+    """Great-circle distance in meters for a chord length on the unit sphere"""
+    return 2.0 * EARTH_RADIUS_M * np.arcsin(np.clip(np.asarray(chord, dtype=float) / 2.0, 0.0, 1.0))
+
+
+def haversine_meters(lat1, lon1, lat2, lon2):
+    """Great-circle distance in meters between coordinate arrays"""
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2.0 * EARTH_RADIUS_M * np.arcsin(np.sqrt(a))
+
+
+def meters_per_degree(lat):
+    """Approximate meters per degree of latitude and of longitude at a latitude"""
+    lat_m = np.pi * EARTH_RADIUS_M / 180.0
+    return lat_m, lat_m * np.cos(np.radians(lat))
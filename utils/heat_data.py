@@ -0,0 +1,33 @@
+import numpy as np
+
+from utils.grid_aggregation import GridAggregator
+
+# Ground size of a web-map pixel at the equator at zoom 0
+EQUATOR_METERS_PER_PIXEL = 156_543.03392
+
+
+def meters_per_pixel(zoom, lat=0.0):
+    """Ground size of one web-map pixel at a zoom level and latitude"""
+    return EQUATOR_METERS_PER_PIXEL * np.cos(np.radians(lat)) / 2 ** zoom
+
+
+def heat_data(coordinates, sample_weight=None, zoom=15, radius=15, max_points=100_000):
+    """Weighted [lat, lon, weight] triples for a heat layer, one per occupied grid cell
+
+    Points are binned into cells a quarter of the heat radius wide at
+    ``zoom``, finer than the radius / 2 pixel cells Leaflet.heat sums points
+    into when drawing, so the rendered heat matches the raw points up to that
+    zoom. Each cell is placed at its points' centroid and carries their count
+    (or summed ``sample_weight``). Cells are doubled in size until at most
+    ``max_points`` remain, so the payload is bounded whatever the data size.
+    """
+    coords = np.asarray(coordinates, dtype=float).reshape(-1, 2)
+    if len(coords) == 0:
+        return np.empty((0, 3))
+    cell_meters = meters_per_pixel(zoom, float(np.mean(coords[:, 0]))) * radius / 4
+    while True:
+        grid = GridAggregator(cell_meters).fit(coords, sample_weight=sample_weight)
+        if len(grid.cells_) <= max_points:
+            break
+        cell_meters *= 2
+    return np.column_stack([grid.centroids_.round(6), grid.weights_])
@@ -0,0 +1,147 @@
+import numpy as np
+import pandas as pd
+
+from utils.geo import meters_per_degree
+
+# Edge length at resolution 0; each finer resolution has 1/7 of the cell area (as in H3)
+BASE_EDGE_METERS = 1_107_712.591
+MAX_RESOLUTION = 15
+
+# Bit layout of a hex ID: resolution, then offset axial q and r coordinates
+_AXIS_BITS = 29
+_AXIS_OFFSET = 1 << (_AXIS_BITS - 1)
+_AXIS_MASK = (1 << _AXIS_BITS) - 1
+
+
+def edge_meters(resolution):
+    """Hexagon edge length (and circumradius) in meters at a resolution"""
+    return BASE_EDGE_METERS / 7 ** (resolution / 2)
+
+
+class HexGrid:
+    """Pointy-top hexagonal grid over a local equirectangular projection
+
+    Coordinates are projected to meters with the scale at ``reference_lat``
+    (by default the data's latitude, rounded to a whole degree so IDs stay
+    stable between datasets of the same region) and snapped to hexagons with
+    vectorized axial/cube rounding. A hex ID is an int64 that encodes the
+    resolution and the hexagon's axial coordinates, so IDs from different
+    resolutions never collide and centers are recovered without a lookup.
+    """
+
+    def __init__(self, resolution=9, reference_lat=None):
+        if not 0 <= resolution <= MAX_RESOLUTION:
+            raise ValueError(f"resolution must be between 0 and {MAX_RESOLUTION}")
+        self.resolution = resolution
+        self.reference_lat = reference_lat
+
+    @property
+    def edge_meters(self):
+        return edge_meters(self.resolution)
+
+    def cell_ids(self, coordinates):
+        """Hex ID of each (lat, lon) row"""
+        coords = np.asarray(coordinates, dtype=float).reshape(-1, 2)
+        if self.reference_lat is None:
+            self.reference_lat = float(np.round(coords[:, 0].mean())) if len(coords) else 0.0
+        x, y = self._project(coords[:, 0], coords[:, 1])
+        q, r = _axial_round((np.sqrt(3) / 3 * x - y / 3), 2 / 3 * y)
+        return ((np.int64(self.resolution) << 2 * _AXIS_BITS)
+                | ((q + _AXIS_OFFSET) << _AXIS_BITS) | (r + _AXIS_OFFSET))
+
+    def cell_centers(self, ids):
+        """(lat, lon) rows of the centers of hex IDs"""
+        q, r = self._axial(ids)
+        x = np.sqrt(3) * (q + r / 2)
+        y = 1.5 * r
+        return np.column_stack(self._unproject(x, y))
+
+    def cell_polygons(self, ids):
+        """Closed hexagon rings as an (n, 7, 2) array of (lon, lat) vertices, GeoJSON order"""
+        q, r = self._axial(ids)
+        x = np.sqrt(3) * (q + r / 2)
+        y = 1.5 * r
+        angles = np.radians(np.arange(7) * 60 - 30)
+        lat, lon = self._unproject(x[:, None] + np.cos(angles), y[:, None] + np.sin(angles))
+        return np.stack([lon, lat], axis=-1)
+
+    def aggregate(self, df, categories=('Weather',)):
+        """Per-hex accident count, mean and max severity, and the mix of each categorical column
+
+        Returns one row per occupied hex, busiest first, with Hex_ID, center
+        Latitude/Longitude, Accidents, Avg_Severity, Max_Severity, and for
+        each column in ``categories`` the share of every category
+        (``<column>_<category>``) plus the most common one (``Main_<column>``).
+        """
+        ids = self.cell_ids(df[['Latitude', 'Longitude']].to_numpy())
+        hex_ids, inverse = np.unique(ids, return_inverse=True)
+        inverse = inverse.ravel()
+        n_hexes = len(hex_ids)
+        counts = np.bincount(inverse, minlength=n_hexes)
+        severity = df['Severity'].to_numpy(dtype=float)
+        max_severity = np.full(n_hexes, -np.inf)
+        np.maximum.at(max_severity, inverse, severity)
+
+        centers = self.cell_centers(hex_ids)
+        table = pd.DataFrame({
+            'Hex_ID': hex_ids,
+            'Latitude': centers[:, 0],
+            'Longitude': centers[:, 1],
+            'Accidents': counts,
+            'Avg_Severity': np.bincount(inverse, weights=severity, minlength=n_hexes) / counts,
+            'Max_Severity': max_severity.astype(df['Severity'].dtype)
+        })
+        for column in categories:
+            if column not in df.columns:
+                continue
+            values = pd.Categorical(df[column])
+            codes = values.codes.astype(np.int64)
+            known = codes >= 0
+            n_categories = len(values.categories)
+            mix = np.bincount(inverse[known] * n_categories + codes[known],
+                              minlength=n_hexes * n_categories).reshape(n_hexes, n_categories)
+            for i, category in enumerate(values.categories):
+                table[f'{column}_{category}'] = mix[:, i] / counts
+            table[f'Main_{column}'] = np.asarray(values.categories, dtype=object)[mix.argmax(axis=1)] \
+                if n_categories else None
+        return table.sort_values('Accidents', ascending=False, ignore_index=True)
+
+    def _project(self, lat, lon):
+        """Degrees to hex-edge units on the local plane"""
+        lat_m, lon_m = meters_per_degree(self.reference_lat)
+        edge = self.edge_meters
+        return np.asarray(lon) * lon_m / edge, np.asarray(lat) * lat_m / edge
+
+    def _unproject(self, x, y):
+        lat_m, lon_m = meters_per_degree(self.reference_lat)
+        edge = self.edge_meters
+        return y * edge / lat_m, x * edge / lon_m
+
+    def _axial(self, ids):
+        ids = np.asarray(ids, dtype=np.int64)
+        resolutions = ids >> 2 * _AXIS_BITS
+        if np.any(resolutions != self.resolution):
+            raise ValueError(f"hex IDs are not at resolution {self.resolution}")
+        q = ((ids >> _AXIS_BITS) & _AXIS_MASK) - _AXIS_OFFSET
+        r = (ids & _AXIS_MASK) - _AXIS_OFFSET
+        return q.astype(float), r.astype(float)
+
+
+def hex_ids(coordinates, resolutions=(7, 8, 9, 10), reference_lat=None):
+    """Hex IDs of (lat, lon) rows at several resolutions, as {resolution: ids}"""
+    coords = np.asarray(coordinates, dtype=float).reshape(-1, 2)
+    if reference_lat is None and len(coords):
+        reference_lat = float(np.round(coords[:, 0].mean()))
+    return {res: HexGrid(res, reference_lat).cell_ids(coords) for res in resolutions}
+
+
+def _axial_round(q, r):
+    """Round fractional axial coordinates to the containing hexagon (cube rounding)"""
+    s = -q - r
+    rq, rr, rs = np.round(q), np.round(r), np.round(s)
+    dq, dr, ds = np.abs(rq - q), np.abs(rr - r), np.abs(rs - s)
+    fix_q = (dq > dr) & (dq > ds)
+    fix_r = ~fix_q & (dr > ds)
+    rq = np.where(fix_q, -rr - rs, rq)
+    rr = np.where(fix_r, -rq - rs, rr)
+    return rq.astype(np.int64), rr.astype(np.int64)
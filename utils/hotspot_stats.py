@@ -0,0 +1,282 @@
+import numpy as np
+import pandas as pd
+from scipy.sparse import coo_matrix, diags
+from scipy.sparse.csgraph import connected_components
+from scipy.stats import norm
+
+from utils.geo import meters_per_degree
+
+# Two-sided critical z-scores by confidence level (percent)
+CONFIDENCE_Z = {90: 1.645, 95: 1.960, 99: 2.576}
+
+
+class GiStarAnalysis:
+    """Getis-Ord Gi* hot spot statistics (optionally local Moran's I) on a grid of cells
+
+    Accidents are aggregated into square cells covering the data's extent,
+    empty cells included, since they are part of the study area (when stray
+    records make that grid larger than ``max_cells``, the study area is the
+    grid over the 0.1%-99.9% quantile extent instead). Only the occupied
+    cells and the cells within ``rings`` of them get a row in the sparse
+    neighbor-weights matrix; the other empty cells enter the global mean
+    and variance analytically, so a stray record costs a few cells rather
+    than a grid spanning the gap. Every statistic is then a handful of
+    vectorized sparse products, and adjacent cells that are significant
+    hot spots are merged into numbered hotspots.
+    """
+
+    def __init__(self, cell_meters=100.0, rings=1, confidence=95, morans_i=False, max_cells=5_000_000):
+        if confidence not in CONFIDENCE_Z:
+            raise ValueError(f"confidence must be one of {sorted(CONFIDENCE_Z)}")
+        self.cell_meters = cell_meters
+        self.rings = rings
+        self.confidence = confidence
+        self.morans_i = morans_i
+        self.max_cells = max_cells
+
+    def fit(self, coordinates, sample_weight=None):
+        """Aggregate points into cells and compute the statistics; results are in ``table_``
+
+        Raises ValueError when there are no points or more than ``max_cells``
+        cells lie within ``rings`` of an accident.
+        """
+        coords = np.asarray(coordinates, dtype=float).reshape(-1, 2)
+        if len(coords) == 0:
+            raise ValueError("no points to analyse")
+        south, west = coords.min(axis=0)
+        north, east = coords.max(axis=0)
+        lat_m, lon_m = meters_per_degree((south + north) / 2)
+        self.cell_lat_ = self.cell_meters / lat_m
+        self.cell_lon_ = self.cell_meters / lon_m
+        self.south_, self.west_ = south, west
+        self.n_rows_ = int((north - south) // self.cell_lat_) + 1
+        self.n_cols_ = int((east - west) // self.cell_lon_) + 1
+        n_cells = self.n_rows_ * self.n_cols_
+
+        rows = np.minimum(((coords[:, 0] - south) // self.cell_lat_).astype(np.int64), self.n_rows_ - 1)
+        cols = np.minimum(((coords[:, 1] - west) // self.cell_lon_).astype(np.int64), self.n_cols_ - 1)
+        occupied, point_cell = np.unique(rows * self.n_cols_ + cols, return_inverse=True)
+        self.cells_ = neighborhood_cells(occupied, self.n_rows_, self.n_cols_, self.rings)
+        if len(self.cells_) > self.max_cells:
+            raise ValueError(f"{len(self.cells_):,} cells of {self.cell_meters:g} m cover the data; "
+                             f"use larger cells")
+        if n_cells > self.max_cells:
+            n_cells = self._robust_area(coords)
+        self.n_cells_ = n_cells
+        self.inverse_ = np.searchsorted(self.cells_, occupied)[point_cell.ravel()]
+        counts = np.bincount(self.inverse_, minlength=len(self.cells_))
+        values = counts.astype(float) if sample_weight is None else np.bincount(
+            self.inverse_, weights=np.asarray(sample_weight, dtype=float), minlength=len(self.cells_))
+
+        weights, w_sum = lattice_weights(self.n_rows_, self.n_cols_, self.rings, cells=self.cells_)
+        self.gi_z_, self.gi_p_ = getis_ord_g_star(values, weights, n_cells=n_cells, w_sum=w_sum)
+        z_crit = CONFIDENCE_Z[self.confidence]
+        self.cell_labels_ = self._label_hot_cells(weights, self.gi_z_ >= z_crit)
+
+        cell_rows, cell_cols = np.divmod(self.cells_, self.n_cols_)
+        table = pd.DataFrame({
+            'Latitude': south + (cell_rows + 0.5) * self.cell_lat_,
+            'Longitude': west + (cell_cols + 0.5) * self.cell_lon_,
+            'Accidents': counts,
+            'Weight': values,
+            'Gi_Z': self.gi_z_,
+            'Gi_P': self.gi_p_,
+            'Hotspot': self.cell_labels_,
+            'Class': classify_gi(self.gi_z_)
+        })
+        if self.morans_i:
+            moran_weights, moran_w_sum = lattice_weights(self.n_rows_, self.n_cols_, self.rings,
+                                                         include_self=False, cells=self.cells_)
+            table['Moran_I'], table['Moran_Z'], table['Moran_P'], quadrant = local_morans_i(
+                values, moran_weights, n_cells=n_cells, w_sum=moran_w_sum)
+            significant = table['Moran_Z'].abs() >= z_crit
+            table['Moran_Cluster'] = np.where(significant, quadrant, 'Not Significant')
+
+        # Keep occupied cells and any significant cell (e.g. an empty cell inside a hot area)
+        keep = (counts > 0) | (np.abs(self.gi_z_) >= CONFIDENCE_Z[90])
+        self.table_ = table[keep].sort_values('Gi_Z', ascending=False)
+        return self
+
+    def _robust_area(self, coords):
+        """Cells in the 0.1%-99.9% quantile extent plus the analysed cells outside it
+
+        Used as the study area when stray records far from the rest would
+        otherwise make it mostly empty, which would flag every occupied
+        cell as significant.
+        """
+        (low_lat, low_lon), (high_lat, high_lon) = np.quantile(coords, [0.001, 0.999], axis=0)
+        row_range = ((np.array([low_lat, high_lat]) - self.south_) // self.cell_lat_).astype(np.int64)
+        col_range = ((np.array([low_lon, high_lon]) - self.west_) // self.cell_lon_).astype(np.int64)
+        rows, cols = np.divmod(self.cells_, self.n_cols_)
+        inside = ((rows >= row_range[0]) & (rows <= row_range[1])
+                  & (cols >= col_range[0]) & (cols <= col_range[1]))
+        box = (row_range[1] - row_range[0] + 1) * (col_range[1] - col_range[0] + 1)
+        return int(box + np.count_nonzero(~inside))
+
+    def fit_predict(self, coordinates, sample_weight=None):
+        """Hotspot number of each point (-1 outside significant hot cells)"""
+        return self.fit(coordinates, sample_weight).cell_labels_[self.inverse_]
+
+    def cell_bounds(self, table=None):
+        """((south, west), (north, east)) rectangle of each row of a cell table"""
+        table = self.table_ if table is None else table
+        half_lat, half_lon = self.cell_lat_ / 2, self.cell_lon_ / 2
+        return [((lat - half_lat, lon - half_lon), (lat + half_lat, lon + half_lon))
+                for lat, lon in zip(table['Latitude'], table['Longitude'])]
+
+    def _label_hot_cells(self, weights, hot):
+        """Number connected groups of hot cells, largest group first; -1 elsewhere"""
+        labels = np.full(len(hot), -1, dtype=np.int64)
+        hot_idx = np.flatnonzero(hot)
+        if len(hot_idx) == 0:
+            return labels
+        _, groups = connected_components(weights[hot_idx][:, hot_idx], directed=False)
+        sizes = np.bincount(groups)
+        rank = np.empty(len(sizes), dtype=np.int64)
+        rank[np.argsort(-sizes, kind='stable')] = np.arange(len(sizes))
+        labels[hot_idx] = rank[groups]
+        return labels
+
+
+def neighborhood_cells(cells, n_rows, n_cols, rings=1):
+    """Sorted ids (row * n_cols + col) of the given cells and every grid cell within ``rings`` of them"""
+    cells = np.asarray(cells, dtype=np.int64)
+    rows, cols = np.divmod(cells, n_cols)
+    found = []
+    for dr in range(-rings, rings + 1):
+        for dc in range(-rings, rings + 1):
+            inside = (rows + dr >= 0) & (rows + dr < n_rows) & (cols + dc >= 0) & (cols + dc < n_cols)
+            found.append((rows[inside] + dr) * n_cols + cols[inside] + dc)
+    return np.unique(np.concatenate(found))
+
+
+def lattice_weights(n_rows, n_cols, rings=1, include_self=True, cells=None):
+    """Binary sparse weights linking grid cells within ``rings`` rows/columns of each other
+
+    With ``cells`` (sorted cell ids) the matrix only covers those cells, and
+    each cell's full neighbor count on the grid is returned alongside it,
+    as the cells left out still border the ones kept.
+    """
+    if cells is None:
+        index = np.arange(n_rows * n_cols).reshape(n_rows, n_cols)
+        src, dst = [], []
+        for dr in range(-rings, rings + 1):
+            for dc in range(-rings, rings + 1):
+                if dr == 0 and dc == 0 and not include_self:
+                    continue
+                rows = slice(max(0, -dr), n_rows - max(0, dr))
+                cols = slice(max(0, -dc), n_cols - max(0, dc))
+                shifted_rows = slice(max(0, dr), n_rows - max(0, -dr))
+                shifted_cols = slice(max(0, dc), n_cols - max(0, -dc))
+                src.append(index[rows, cols].ravel())
+                dst.append(index[shifted_rows, shifted_cols].ravel())
+        src, dst = np.concatenate(src), np.concatenate(dst)
+        n = n_rows * n_cols
+        return coo_matrix((np.ones(len(src)), (src, dst)), shape=(n, n)).tocsr()
+
+    cells = np.asarray(cells, dtype=np.int64)
+    rows, cols = np.divmod(cells, n_cols)
+    src, dst = [], []
+    for dr in range(-rings, rings + 1):
+        for dc in range(-rings, rings + 1):
+            if dr == 0 and dc == 0 and not include_self:
+                continue
+            inside = (rows + dr >= 0) & (rows + dr < n_rows) & (cols + dc >= 0) & (cols + dc < n_cols)
+            neighbor = (rows + dr) * n_cols + cols + dc
+            position = np.minimum(np.searchsorted(cells, neighbor), len(cells) - 1)
+            kept = inside & (cells[position] == neighbor)
+            src.append(np.flatnonzero(kept))
+            dst.append(position[kept])
+    src, dst = np.concatenate(src), np.concatenate(dst)
+    n = len(cells)
+    weights = coo_matrix((np.ones(len(src)), (src, dst)), shape=(n, n)).tocsr()
+    span_rows = np.minimum(rows + rings, n_rows - 1) - np.maximum(rows - rings, 0) + 1
+    span_cols = np.minimum(cols + rings, n_cols - 1) - np.maximum(cols - rings, 0) + 1
+    w_sum = (span_rows * span_cols - (0 if include_self else 1)).astype(float)
+    return weights, w_sum
+
+
+def getis_ord_g_star(values, weights, n_cells=None, w_sum=None):
+    """Gi* z-scores and two-sided p-values; ``weights`` should include each cell itself
+
+    When ``values`` covers only part of a grid of ``n_cells``, the cells
+    left out count as zeros and ``w_sum`` gives each cell's full number of
+    (binary) neighbors on the grid.
+    """
+    x = np.asarray(values, dtype=float)
+    n = len(x) if n_cells is None else n_cells
+    mean = x.sum() / n
+    std = np.sqrt(max((x ** 2).sum() / n - mean ** 2, 0.0))
+    if w_sum is None:
+        w_sum = np.asarray(weights.sum(axis=1)).ravel()
+        w_sq = np.asarray(weights.multiply(weights).sum(axis=1)).ravel()
+    else:
+        w_sq = w_sum
+    lag = weights @ x
+
+    denominator = std * np.sqrt(np.maximum(n * w_sq - w_sum ** 2, 0.0) / (n - 1))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z = np.where(denominator > 0, (lag - mean * w_sum) / denominator, 0.0)
+    return z, 2 * norm.sf(np.abs(z))
+
+
+def local_morans_i(values, weights, n_cells=None, w_sum=None):
+    """Local Moran's I, its z-score and p-value under randomization, and the HH/LL/HL/LH quadrant
+
+    ``weights`` should exclude each cell itself; rows are standardized here.
+    As for ``getis_ord_g_star``, ``n_cells`` and ``w_sum`` describe a grid
+    only partly covered by ``values``, whose other cells are zeros.
+    """
+    x = np.asarray(values, dtype=float)
+    n = len(x) if n_cells is None else n_cells
+    n_missing = n - len(x)
+    mean = x.sum() / n
+    dev = x - mean
+    # Cells left out all deviate from the mean by -mean
+    dev2_sum = (dev ** 2).sum() + n_missing * mean ** 2
+    dev4_sum = (dev ** 4).sum() + n_missing * mean ** 4
+    m2 = dev2_sum / n
+    if m2 == 0:
+        zeros = np.zeros(len(x))
+        return zeros, zeros, np.ones(len(x)), np.full(len(x), 'Not Significant', dtype=object)
+
+    if w_sum is None:
+        w_sum = np.asarray(weights.sum(axis=1)).ravel()
+        standardized = diags(np.where(w_sum > 0, 1 / np.maximum(w_sum, 1e-12), 0.0)) @ weights
+        lag = standardized @ dev
+        wi = np.asarray(standardized.sum(axis=1)).ravel()
+        wi2 = np.asarray(standardized.multiply(standardized).sum(axis=1)).ravel()
+    else:
+        inverse = np.where(w_sum > 0, 1 / np.maximum(w_sum, 1e-12), 0.0)
+        missing_neighbors = w_sum - np.asarray(weights.sum(axis=1)).ravel()
+        lag = inverse * (weights @ dev - missing_neighbors * mean)
+        wi = (w_sum > 0).astype(float)
+        wi2 = inverse
+    local_i = dev / m2 * lag
+
+    # Expectation and randomization variance (Anselin 1995)
+    b2 = n * dev4_sum / dev2_sum ** 2
+    expected = -wi / (n - 1)
+    variance = (wi2 * (n - b2) / (n - 1)
+                + (wi ** 2 - wi2) * (2 * b2 - n) / ((n - 1) * (n - 2))
+                - expected ** 2)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z = np.where(variance > 0, (local_i - expected) / np.sqrt(np.maximum(variance, 1e-300)), 0.0)
+
+    quadrant = np.select(
+        [(dev > 0) & (lag > 0), (dev < 0) & (lag < 0), (dev > 0) & (lag <= 0)],
+        ['High-High', 'Low-Low', 'High-Low'],
+        default='Low-High'
+    )
+    return local_i, z, 2 * norm.sf(np.abs(z)), quadrant
+
+
+def classify_gi(z):
+    """ArcGIS-style hot/cold spot classes from Gi* z-scores"""
+    z = np.asarray(z)
+    classes = np.full(len(z), 'Not Significant', dtype=object)
+    for level in sorted(CONFIDENCE_Z):
+        critical = CONFIDENCE_Z[level]
+        classes[z >= critical] = f'Hot Spot ({level}%)'
+        classes[z <= -critical] = f'Cold Spot ({level}%)'
+    return classes
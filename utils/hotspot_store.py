@@ -0,0 +1,120 @@
+"""Persisted accident dataset with incrementally updated DBSCAN hotspots.
+
+New accident files are appended as they arrive: only the new rows are
+processed, stored as one Arrow part per append, and clustered with
+IncrementalDBSCAN, so an update costs time in proportion to the batch instead
+of the full history. Hotspot IDs stay stable across updates.
+
+Usage: python -m utils.hotspot_store DIR {append FILE [FILE ...],export OUT,stats}
+"""
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from utils.data_processor import DataProcessor
+from utils.incremental_dbscan import IncrementalDBSCAN
+
+
+class HotspotStore:
+    STATE_FILE = 'state.npz'
+    MANIFEST_FILE = 'store.json'
+
+    def __init__(self, directory, eps_meters=100.0, min_samples=3, severity_weighted=False):
+        """Open the store in ``directory``; clustering settings only apply to a new store"""
+        self.directory = directory
+        self.processor = DataProcessor()
+        manifest_path = os.path.join(directory, self.MANIFEST_FILE)
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                self.manifest = json.load(f)
+            self.model = IncrementalDBSCAN.load(os.path.join(directory, self.STATE_FILE))
+        else:
+            self.manifest = {'severity_weighted': severity_weighted, 'parts': []}
+            self.model = IncrementalDBSCAN(eps_meters, min_samples)
+
+    @property
+    def n_rows(self):
+        return sum(part['rows'] for part in self.manifest['parts'])
+
+    def append(self, source):
+        """Process and add a batch of accidents; returns the new rows with their Cluster labels"""
+        df = self.processor.process(source)
+        weights = df['Severity'].to_numpy() if self.manifest['severity_weighted'] else None
+        df['Cluster'] = self.model.partial_fit(df[['Latitude', 'Longitude']].to_numpy(), sample_weight=weights)
+
+        os.makedirs(os.path.join(self.directory, 'parts'), exist_ok=True)
+        name = os.path.join('parts', f"part-{len(self.manifest['parts']):05d}.arrow")
+        df.drop(columns='Cluster').reset_index(drop=True).to_feather(os.path.join(self.directory, name))
+        self.manifest['parts'].append({'file': name, 'rows': len(df)})
+        self._save()
+        return df
+
+    def load(self):
+        """Every stored accident with its current hotspot ID (-1 for noise)"""
+        if not self.manifest['parts']:
+            return pd.DataFrame()
+        parts = [pd.read_feather(os.path.join(self.directory, part['file'])) for part in self.manifest['parts']]
+        df = pd.concat(parts, ignore_index=True)
+        df['Cluster'] = self.model.labels_
+        return df
+
+    def summary(self):
+        labels = self.model.labels_
+        return {
+            'rows': self.n_rows,
+            'appends': len(self.manifest['parts']),
+            'hotspots': len(np.unique(labels[labels >= 0])),
+            'noise': int((labels == -1).sum()),
+            'merged_ids': len(self.model.merged_),
+            'eps_meters': self.model.eps_meters,
+            'min_samples': self.model.min_samples
+        }
+
+    def _save(self):
+        """Write the clustering state and manifest, replacing the old files atomically"""
+        state_path = os.path.join(self.directory, self.STATE_FILE)
+        with open(state_path + '.tmp', 'wb') as f:
+            self.model.save(f)
+        os.replace(state_path + '.tmp', state_path)
+        manifest_path = os.path.join(self.directory, self.MANIFEST_FILE)
+        with open(manifest_path + '.tmp', 'w') as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(manifest_path + '.tmp', manifest_path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Append accidents to a persisted dataset and update its hotspots")
+    parser.add_argument('directory', help="store directory (created on first append)")
+    parser.add_argument('--eps-meters', type=float, default=100.0, help="DBSCAN radius for a new store")
+    parser.add_argument('--min-samples', type=int, default=3, help="DBSCAN minimum samples for a new store")
+    parser.add_argument('--severity-weighted', action='store_true', help="weight points by severity (new store)")
+    sub = parser.add_subparsers(dest='command', required=True)
+    append = sub.add_parser('append', help="add accident files, updating hotspots incrementally")
+    append.add_argument('files', nargs='+')
+    export = sub.add_parser('export', help="write every stored accident with its hotspot ID")
+    export.add_argument('output', help="output .csv or .parquet file")
+    sub.add_parser('stats', help="show rows, hotspots and settings")
+    args = parser.parse_args(argv)
+
+    store = HotspotStore(args.directory, args.eps_meters, args.min_samples, args.severity_weighted)
+
+    if args.command == 'append':
+        for file_path in args.files:
+            rows = store.append(file_path)
+            print(f"{file_path}: {len(rows):,} rows added, {int((rows['Cluster'] >= 0).sum()):,} in hotspots")
+    elif args.command == 'export':
+        df = store.load()
+        if args.output.endswith('.parquet'):
+            df.to_parquet(args.output, index=False)
+        else:
+            df.to_csv(args.output, index=False)
+        print(f"Wrote {len(df):,} rows to {args.output}")
+    if args.command in ('append', 'stats'):
+        print(", ".join(f"{key}: {value}" for key, value in store.summary().items()))
+
+
+if __name__ == '__main__':
+    main()
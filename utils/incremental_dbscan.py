@@ -0,0 +1,262 @@
+import json
+
+import numpy as np
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+from scipy.spatial import cKDTree
+
+from utils.geo import meters_to_chord, to_unit_sphere
+from utils.metric_dbscan import MetricDBSCAN
+
+
+class IncrementalDBSCAN:
+    """Metric DBSCAN that absorbs appended points without reclustering the history
+
+    Inserting points can only create core points and merge clusters, never
+    split them (Ester et al., "Incremental Clustering for Mining in a Data
+    Warehousing Environment"), so each update only revisits the
+    eps-neighborhoods of the inserted points and of points that became core.
+    Neighbors come from a log-structured index: a KD-tree over the bulk of
+    the points plus one small tree per recent append, merged into the bulk
+    tree once the recent part outgrows ``rebuild_fraction`` of it, so
+    rebuilding is amortised over many updates.
+
+    Hotspot IDs are stable: a new cluster gets the next unused ID, and when
+    an update merges clusters the oldest (smallest) ID survives. Retired IDs
+    are recorded in ``merged_``. IDs are therefore not contiguous.
+    """
+
+    STATE_VERSION = 1
+
+    def __init__(self, eps_meters=100.0, min_samples=3, rebuild_fraction=0.25):
+        self.eps_meters = eps_meters
+        self.min_samples = min_samples
+        self.rebuild_fraction = rebuild_fraction
+        self.n_points = 0
+        self.next_label = 0
+        self.merged_ = {}
+        self._xyz = np.empty((0, 3))
+        self._coords = np.empty((0, 2))
+        self._weights = np.empty(0)
+        self._counts = np.empty(0)
+        self._core = np.empty(0, dtype=bool)
+        self._labels = np.empty(0, dtype=np.int64)
+        self._alias = np.empty(0, dtype=np.int64)
+        self._base_tree = None
+        self._base_n = 0
+        self._delta_trees = []
+
+    @property
+    def labels_(self):
+        """Current hotspot ID of every point inserted so far (-1 for noise)"""
+        return self._resolve(self._labels[:self.n_points])
+
+    @property
+    def core_sample_mask_(self):
+        return self._core[:self.n_points].copy()
+
+    @property
+    def coordinates_(self):
+        return self._coords[:self.n_points]
+
+    def partial_fit(self, coordinates, sample_weight=None):
+        """Insert (lat, lon) rows and update labels around them; returns the new rows' labels"""
+        coords = np.asarray(coordinates, dtype=float).reshape(-1, 2)
+        weights = np.ones(len(coords)) if sample_weight is None else np.asarray(sample_weight, dtype=float)
+        if len(coords) == 0:
+            return np.empty(0, dtype=np.int64)
+        if self.n_points == 0:
+            return self.fit_predict(coords, weights)
+        start = self.n_points
+        new = np.arange(start, start + len(coords))
+        self._append(coords, weights)
+
+        # Neighbor weight of the new points, and what they add to existing neighbors
+        src, dst = self._neighbors(new)
+        self._counts[new] = np.bincount(src - start, weights=self._weights[dst], minlength=len(new))
+        existing = dst < start
+        np.add.at(self._counts, dst[existing], self._weights[src[existing]])
+
+        touched = np.union1d(new, dst[existing])
+        became_core = touched[(self._counts[touched] >= self.min_samples) & ~self._core[touched]]
+
+        if len(became_core):
+            # New points' neighborhoods are known; existing points that became core need a query
+            csrc, cdst = self._neighbors(became_core[became_core < start])
+            from_new = np.isin(src, became_core)
+            csrc = np.concatenate([src[from_new], csrc])
+            cdst = np.concatenate([dst[from_new], cdst])
+            self._link(became_core, csrc, cdst)
+            self._core[became_core] = True
+            # Noise around the new core points becomes border of their cluster
+            noise = (~self._core[cdst]) & (self._labels[cdst] == -1)
+            self._assign_border(cdst[noise], csrc[noise])
+
+        # New points that are not core join their nearest core neighbor's cluster
+        pending = ~self._core[src] & self._core[dst] & (self._labels[src] == -1)
+        self._assign_border(src[pending], dst[pending])
+        return self._resolve(self._labels[new])
+
+    def fit_predict(self, coordinates, sample_weight=None):
+        """Cluster a dataset from scratch with one bulk MetricDBSCAN run, ready for partial_fit"""
+        coords = np.asarray(coordinates, dtype=float).reshape(-1, 2)
+        weights = np.ones(len(coords)) if sample_weight is None else np.asarray(sample_weight, dtype=float)
+        self.__init__(self.eps_meters, self.min_samples, self.rebuild_fraction)
+        if len(coords) == 0:
+            return np.empty(0, dtype=np.int64)
+        self._append(coords, weights)
+
+        dbscan = MetricDBSCAN(self.eps_meters, self.min_samples)
+        labels = dbscan.fit_predict(coords, sample_weight=weights)
+        self._labels[:len(coords)] = labels
+        self._core[:len(coords)] = dbscan.core_sample_mask_
+        self._counts[:len(coords)] = dbscan.neighbor_weight_
+        self.next_label = int(labels.max()) + 1
+        self._alias = np.arange(self.next_label, dtype=np.int64)
+        return labels.astype(np.int64)
+
+    def _append(self, coords, weights):
+        """Add rows to the growable point buffers (capacity doubles, so appends are amortised O(batch))"""
+        end = self.n_points + len(coords)
+        if end > len(self._weights):
+            capacity = max(end, 2 * len(self._weights), 1024)
+            self._xyz = self._grow(self._xyz, capacity)
+            self._coords = self._grow(self._coords, capacity)
+            self._weights = self._grow(self._weights, capacity)
+            self._counts = self._grow(self._counts, capacity)
+            self._core = self._grow(self._core, capacity)
+            self._labels = self._grow(self._labels, capacity, fill=-1)
+        self._xyz[self.n_points:end] = to_unit_sphere(coords[:, 0], coords[:, 1])
+        self._coords[self.n_points:end] = coords
+        self._weights[self.n_points:end] = weights
+        self._counts[self.n_points:end] = 0.0
+        self._core[self.n_points:end] = False
+        self._labels[self.n_points:end] = -1
+        self.n_points = end
+
+        # Merge recent appends into the bulk tree once they are a sizeable share of it
+        if self.n_points - self._base_n > self.rebuild_fraction * self._base_n:
+            self._base_tree = cKDTree(self._xyz[:self.n_points])
+            self._base_n = self.n_points
+            self._delta_trees = []
+        else:
+            start = end - len(coords)
+            self._delta_trees.append((cKDTree(self._xyz[start:end]), start))
+
+    def _grow(self, array, capacity, fill=0):
+        grown = np.full((capacity,) + array.shape[1:], fill, dtype=array.dtype)
+        grown[:len(array)] = array
+        return grown
+
+    def _neighbors(self, rows):
+        """(src, dst) pairs of all points within eps of each row, self included"""
+        src, dst = [np.empty(0, dtype=np.int64)], [np.empty(0, dtype=np.int64)]
+        if len(rows):
+            radius = float(meters_to_chord(self.eps_meters))
+            query = cKDTree(self._xyz[rows])
+            for tree, offset in [(self._base_tree, 0)] + self._delta_trees:
+                pairs = query.sparse_distance_matrix(tree, radius, output_type='ndarray')
+                src.append(rows[pairs['i']])
+                dst.append(pairs['j'].astype(np.int64) + offset)
+        return np.concatenate(src), np.concatenate(dst)
+
+    def _link(self, became_core, src, dst):
+        """Give points that became core a cluster: a new ID, an existing one, or a merge of several
+
+        Runs before ``became_core`` is marked, so ``_core`` still holds the core points of earlier updates.
+        """
+        old_core = self._core
+        old_labels = np.unique(self._resolve(self._labels[dst[old_core[dst]]]))
+        # Graph nodes: the new core points, then one node per existing cluster they touch
+        nodes = np.concatenate([became_core, -1 - old_labels])
+        order = np.argsort(nodes)
+
+        def position(keys):
+            return order[np.searchsorted(nodes, keys, sorter=order)]
+
+        # Edges between new core points, and from new core points to existing clusters
+        core_pairs = np.isin(dst, became_core)
+        cluster_pairs = old_core[dst]
+        a = np.concatenate([src[core_pairs], src[cluster_pairs]])
+        b = np.concatenate([dst[core_pairs], -1 - self._resolve(self._labels[dst[cluster_pairs]])])
+        graph = coo_matrix((np.ones(len(a), dtype=np.int8), (position(a), position(b))),
+                           shape=(len(nodes), len(nodes)))
+        n_groups, component = connected_components(graph, directed=False)
+        core_group, cluster_group = component[:len(became_core)], component[len(became_core):]
+
+        # Each group keeps its oldest existing ID; groups without one get fresh IDs
+        survivor = np.full(n_groups, np.iinfo(np.int64).max, dtype=np.int64)
+        np.minimum.at(survivor, cluster_group, old_labels)
+        fresh = survivor == np.iinfo(np.int64).max
+        survivor[fresh] = self.next_label + np.arange(fresh.sum())
+        self.next_label += int(fresh.sum())
+        self._alias = np.concatenate([self._alias, survivor[fresh]])
+
+        absorbed = survivor[cluster_group] != old_labels
+        self._alias[old_labels[absorbed]] = survivor[cluster_group[absorbed]]
+        self.merged_.update(zip(old_labels[absorbed].tolist(), survivor[cluster_group[absorbed]].tolist()))
+        self._labels[became_core] = survivor[core_group]
+
+    def _assign_border(self, points, cores):
+        """Label each point like its nearest core neighbor"""
+        if len(points) == 0:
+            return
+        distance = np.linalg.norm(self._xyz[points] - self._xyz[cores], axis=1)
+        order = np.lexsort((distance, points))
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = points[order[1:]] != points[order[:-1]]
+        chosen = order[first]
+        self._labels[points[chosen]] = self._resolve(self._labels[cores[chosen]])
+
+    def _resolve(self, labels):
+        """Map possibly-retired hotspot IDs to the IDs that absorbed them"""
+        labels = np.asarray(labels, dtype=np.int64)
+        roots = self._alias
+        while len(roots) and not np.array_equal(roots[roots], roots):
+            roots = roots[roots]
+        self._alias = roots
+        resolved = labels.copy()
+        clustered = labels >= 0
+        resolved[clustered] = roots[labels[clustered]]
+        return resolved
+
+    def save(self, file):
+        """Write the clustering state as a compressed .npz (path or binary file object)"""
+        metadata = {
+            'version': self.STATE_VERSION,
+            'eps_meters': self.eps_meters,
+            'min_samples': self.min_samples,
+            'rebuild_fraction': self.rebuild_fraction,
+            'next_label': self.next_label,
+            'merged': self.merged_
+        }
+        n = self.n_points
+        np.savez_compressed(
+            file,
+            metadata=np.array(json.dumps(metadata)),
+            coordinates=self._coords[:n],
+            weights=self._weights[:n],
+            counts=self._counts[:n],
+            core=self._core[:n],
+            labels=self._labels[:n],
+            alias=self._alias
+        )
+
+    @classmethod
+    def load(cls, file):
+        """Restore a state written by save(); later partial_fit calls continue from it"""
+        with np.load(file, allow_pickle=False) as state:
+            metadata = json.loads(str(state['metadata']))
+            if metadata.get('version', 0) > cls.STATE_VERSION:
+                raise ValueError(f"incremental state version {metadata.get('version')} is newer than "
+                                 f"supported version {cls.STATE_VERSION}")
+            model = cls(metadata['eps_meters'], metadata['min_samples'], metadata['rebuild_fraction'])
+            coords = state['coordinates']
+            model._append(coords, state['weights'])
+            model._counts[:len(coords)] = state['counts']
+            model._core[:len(coords)] = state['core']
+            model._labels[:len(coords)] = state['labels']
+            model._alias = state['alias'].astype(np.int64)
+        model.next_label = metadata['next_label']
+        model.merged_ = {int(k): v for k, v in metadata['merged'].items()}
+        return model
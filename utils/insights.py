@@ -0,0 +1,124 @@
+import numpy as np
+import pandas as pd
+
+from utils.data_processor import DAY_CATEGORIES
+
+# Columns the Insights page breaks accidents down by
+FACTOR_COLUMNS = ['Hour', 'DayOfWeek', 'Weather', 'Road_Type', 'Light_Condition', 'Speed_Limit', 'Area']
+NUMERIC_COLUMNS = ['Severity', 'Vehicles_Involved', 'Speed_Limit', 'Hour']
+HIGH_SEVERITY = 3
+FATAL_SEVERITY = 4
+
+
+class InsightAggregator:
+    """Every aggregate of the Insights page, computed in one pass over the frame
+
+    Each factor column is reduced to integer codes once (categoricals
+    already carry them), and its counts, severity sums and high-severity
+    counts all come from ``np.bincount`` over those codes, instead of a
+    separate ``value_counts``, ``groupby().mean()`` or filtered copy per
+    chart. The result is a plain dict of small Series and frames, cheap to
+    cache per dataset version and to read on every rerun.
+    """
+
+    def __init__(self, factors=FACTOR_COLUMNS, numeric=NUMERIC_COLUMNS):
+        self.factors = factors
+        self.numeric = numeric
+
+    def compute(self, df):
+        """Aggregates of df: overview numbers, per-factor tables, severity counts and correlations
+
+        ``factors`` maps each factor column present in df to a frame indexed
+        by its observed values with Accidents, Avg_Severity and High_Severity
+        (accidents of severity 3 or more).
+        """
+        severity = df['Severity'].to_numpy(dtype=float)
+        valid = ~np.isnan(severity)
+        high = valid & (severity >= HIGH_SEVERITY)
+        # Shared by every factor: severity with missing values as 0, and which rows are rated
+        rated = valid.astype(np.float64) if not valid.all() else None
+        severity_filled = np.where(valid, severity, 0.0)
+        high_codes = high.astype(np.int64)
+
+        factors = {}
+        for col in self.factors:
+            if col in df.columns:
+                factors[col] = self._factor_table(df[col], severity_filled, rated, high_codes)
+
+        severity_levels = severity[valid].astype(np.int64)
+        counts = np.bincount(severity_levels - severity_levels.min(initial=0))
+        severity_counts = pd.Series(counts, index=np.arange(len(counts)) + severity_levels.min(initial=0))
+
+        return {
+            'total': len(df),
+            'avg_severity': float(severity[valid].mean()) if valid.any() else float('nan'),
+            'fatal': int(np.count_nonzero(severity == FATAL_SEVERITY)),
+            'high_severity': int(np.count_nonzero(high)),
+            'avg_vehicles': float(df['Vehicles_Involved'].mean()) if 'Vehicles_Involved' in df.columns else float('nan'),
+            'severity_counts': severity_counts[severity_counts > 0],
+            'factors': factors,
+            'correlation': self._correlation(df)
+        }
+
+    def _factor_table(self, values, severity_filled, rated, high_codes):
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            codes, labels = values.cat.codes.to_numpy(), values.cat.categories
+        else:
+            codes, labels = pd.factorize(values, sort=True)
+        n = len(labels)
+        # Bin 0 holds missing values (code -1); each row lands in 2 * bin + is-high-severity
+        bins = np.asarray(codes, dtype=np.int64) + 1
+        by_high = np.bincount(2 * bins + high_codes, minlength=2 * (n + 1)).reshape(n + 1, 2)[1:]
+        accidents = by_high.sum(axis=1)
+        rated_count = accidents if rated is None else np.bincount(bins, weights=rated, minlength=n + 1)[1:]
+        severity_sum = np.bincount(bins, weights=severity_filled, minlength=n + 1)[1:]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            avg = severity_sum / rated_count
+        table = pd.DataFrame({'Accidents': accidents, 'Avg_Severity': avg, 'High_Severity': by_high[:, 1]},
+                             index=pd.Index(labels, name=values.name))
+        return table[table['Accidents'] > 0]
+
+    def _correlation(self, df):
+        """Pearson correlation of the numeric columns, or None if any is missing"""
+        if not all(col in df.columns for col in self.numeric):
+            return None
+        matrix = np.column_stack([df[col].to_numpy(dtype=float) for col in self.numeric])
+        if np.isnan(matrix).any():
+            return df[self.numeric].corr()
+        with np.errstate(invalid='ignore', divide='ignore'):
+            corr = np.corrcoef(matrix, rowvar=False)
+        return pd.DataFrame(corr, index=self.numeric, columns=self.numeric)
+
+
+def summary_report(insights):
+    """Plain-text summary of precomputed insights"""
+    factors = insights['factors']
+
+    def top(col, field):
+        table = factors.get(col)
+        return table[field].idxmax() if table is not None and len(table) else 'n/a'
+
+    return f"""
+    Road Accident Analysis Summary Report
+    ====================================
+
+    Total Accidents: {insights['total']}
+    Average Severity: {insights['avg_severity']:.2f}
+    High Severity Accidents (4): {insights['fatal']}
+
+    Time Patterns:
+    - Peak Hour: {top('Hour', 'Accidents')}:00
+    - Most Common Day: {top('DayOfWeek', 'Accidents')}
+
+    Risk Factors:
+    - Most Dangerous Weather: {top('Weather', 'Avg_Severity')}
+    - Most Dangerous Road Type: {top('Road_Type', 'Avg_Severity')}
+    """
+
+
+def daily_counts(insights):
+    """Accidents per weekday, Monday first, zero for days without accidents"""
+    table = insights['factors'].get('DayOfWeek')
+    if table is None:
+        return pd.Series(0, index=DAY_CATEGORIES)
+    return table['Accidents'].reindex(DAY_CATEGORIES, fill_value=0)
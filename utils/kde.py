@@ -0,0 +1,181 @@
+import io
+import json
+
+import numpy as np
+from scipy.signal import fftconvolve
+
+from utils.geo import meters_per_degree
+
+try:
+    import contourpy
+except ImportError:  # pragma: no cover - contour export is disabled without contourpy
+    contourpy = None
+
+KERNELS = ('gaussian', 'quartic')
+
+
+class GridKDE:
+    """Kernel density risk surface computed on a regular grid
+
+    Points (optionally weighted, e.g. by severity) are binned onto a grid of
+    ``cell_meters`` square cells and convolved with the kernel by FFT, so the
+    cost depends on the grid size rather than the number of points. Density
+    is in weighted accidents per square kilometer.
+    """
+
+    def __init__(self, cell_meters=25.0, bandwidth_meters=150.0, kernel='gaussian', padding=3.0,
+                 max_cells=25_000_000):
+        if kernel not in KERNELS:
+            raise ValueError(f"kernel must be one of {KERNELS}")
+        self.cell_meters = cell_meters
+        self.bandwidth_meters = bandwidth_meters
+        self.kernel = kernel
+        self.padding = padding
+        self.max_cells = max_cells
+
+    def fit(self, coordinates, sample_weight=None, bounds=None):
+        """Build the surface; ``bounds`` is ((south, west), (north, east)), else the data extent plus padding
+
+        When the full data extent would need more than ``max_cells`` cells
+        (typically a few stray records far from the rest), the grid covers
+        the 0.1%-99.9% quantile extent instead and the points outside it are
+        dropped; ``dropped_`` counts them.
+        """
+        coords = np.asarray(coordinates, dtype=float).reshape(-1, 2)
+        if bounds is None:
+            if len(coords) == 0:
+                raise ValueError("cannot infer bounds without points")
+            bounds = (coords.min(axis=0), coords.max(axis=0))
+            if np.prod(self._grid_shape(bounds)) > self.max_cells:
+                bounds = tuple(np.quantile(coords, [0.001, 0.999], axis=0))
+        n_rows, n_cols = self._grid_shape(bounds)
+        if n_rows * n_cols > self.max_cells:
+            raise ValueError(f"{n_rows * n_cols:,} cells of {self.cell_meters:g} m cover the data; "
+                             f"use larger cells")
+        (south, west), (north, east) = bounds
+
+        lat_m, lon_m = meters_per_degree((south + north) / 2)
+        self.cell_lat_ = self.cell_meters / lat_m
+        self.cell_lon_ = self.cell_meters / lon_m
+        pad = self.padding * self.bandwidth_meters
+        self.south_ = south - pad / lat_m
+        self.west_ = west - pad / lon_m
+
+        # Bin points onto the grid (rows run south to north); points outside the bounds are dropped
+        rows = np.floor((coords[:, 0] - self.south_) / self.cell_lat_).astype(np.int64)
+        cols = np.floor((coords[:, 1] - self.west_) / self.cell_lon_).astype(np.int64)
+        inside = (rows >= 0) & (rows < n_rows) & (cols >= 0) & (cols < n_cols)
+        self.dropped_ = int(len(coords) - np.count_nonzero(inside))
+        weights = None if sample_weight is None else np.asarray(sample_weight, dtype=float)[inside]
+        counts = np.bincount(rows[inside] * n_cols + cols[inside], weights=weights, minlength=n_rows * n_cols)
+        counts = counts.reshape(n_rows, n_cols).astype(float)
+
+        density = fftconvolve(counts, self._kernel_grid(), mode='same')
+        # FFT round-off leaves tiny negative values where the true density is zero
+        self.density_ = np.clip(density, 0.0, None)
+        self.total_weight_ = float(counts.sum())
+        return self
+
+    def _grid_shape(self, bounds):
+        """(rows, columns) of the padded grid over bounds"""
+        (south, west), (north, east) = bounds
+        lat_m, lon_m = meters_per_degree((south + north) / 2)
+        pad = self.padding * self.bandwidth_meters
+        n_rows = int(np.ceil(((north - south) * lat_m + 2 * pad) / self.cell_meters)) + 1
+        n_cols = int(np.ceil(((east - west) * lon_m + 2 * pad) / self.cell_meters)) + 1
+        return n_rows, n_cols
+
+    @property
+    def shape(self):
+        return self.density_.shape
+
+    @property
+    def nbytes(self):
+        return self.density_.nbytes
+
+    @property
+    def bounds_(self):
+        """((south, west), (north, east)) of the grid's outer cell edges"""
+        n_rows, n_cols = self.density_.shape
+        return ((self.south_, self.west_),
+                (self.south_ + n_rows * self.cell_lat_, self.west_ + n_cols * self.cell_lon_))
+
+    def cell_centers(self):
+        """Latitudes of the grid rows and longitudes of its columns"""
+        n_rows, n_cols = self.density_.shape
+        return (self.south_ + (np.arange(n_rows) + 0.5) * self.cell_lat_,
+                self.west_ + (np.arange(n_cols) + 0.5) * self.cell_lon_)
+
+    def sample(self, coordinates):
+        """Density at (lat, lon) points, 0 outside the grid"""
+        coords = np.asarray(coordinates, dtype=float).reshape(-1, 2)
+        rows = np.floor((coords[:, 0] - self.south_) / self.cell_lat_).astype(np.int64)
+        cols = np.floor((coords[:, 1] - self.west_) / self.cell_lon_).astype(np.int64)
+        n_rows, n_cols = self.density_.shape
+        inside = (rows >= 0) & (rows < n_rows) & (cols >= 0) & (cols < n_cols)
+        values = np.zeros(len(coords))
+        values[inside] = self.density_[rows[inside], cols[inside]]
+        return values
+
+    def levels(self, n_levels=5):
+        """Contour levels at evenly spaced quantiles of the non-zero density"""
+        positive = self.density_[self.density_ > self.density_.max() * 1e-6]
+        if len(positive) == 0:
+            return np.array([])
+        return np.unique(np.quantile(positive, np.linspace(0.5, 0.98, n_levels)))
+
+    def contours(self, levels=None):
+        """Filled density bands as a GeoJSON FeatureCollection of MultiPolygons (lon, lat order)"""
+        if contourpy is None:
+            raise ImportError("contour export requires contourpy")
+        levels = self.levels() if levels is None else np.asarray(levels, dtype=float)
+        lats, lons = self.cell_centers()
+        generator = contourpy.contour_generator(lons, lats, self.density_,
+                                                fill_type=contourpy.FillType.OuterOffset)
+        bounds = list(levels) + [np.inf]
+        features = []
+        for lower, upper in zip(bounds[:-1], bounds[1:]):
+            points, offsets = generator.filled(lower, upper)
+            polygons = [
+                [ring.round(6).tolist() for ring in np.split(outer, offset[1:-1])]
+                for outer, offset in zip(points, offsets)
+            ]
+            if polygons:
+                features.append({
+                    'type': 'Feature',
+                    'properties': {'lower': float(lower), 'upper': None if np.isinf(upper) else float(upper)},
+                    'geometry': {'type': 'MultiPolygon', 'coordinates': polygons}
+                })
+        return {'type': 'FeatureCollection', 'features': features}
+
+    def to_ascii_grid(self, path=None):
+        """ESRI ASCII grid of the surface (readable by GDAL/QGIS; non-square cells use dx/dy)
+
+        Written to ``path`` when given, otherwise returned as a string.
+        """
+        n_rows, n_cols = self.density_.shape
+        buffer = io.StringIO()
+        buffer.write(f"ncols {n_cols}\nnrows {n_rows}\nxllcorner {self.west_:.8f}\nyllcorner {self.south_:.8f}\n"
+                     f"dx {self.cell_lon_:.10f}\ndy {self.cell_lat_:.10f}\nNODATA_value -9999\n")
+        # ASCII grids list rows from north to south
+        np.savetxt(buffer, self.density_[::-1], fmt='%.6g')
+        if path is None:
+            return buffer.getvalue()
+        with open(path, 'w') as f:
+            f.write(buffer.getvalue())
+
+    def to_geojson(self, levels=None):
+        return json.dumps(self.contours(levels))
+
+    def _kernel_grid(self):
+        """Kernel sampled on the grid, normalised so density is per square kilometer"""
+        sigma = self.bandwidth_meters / self.cell_meters
+        reach = int(np.ceil(3 * sigma if self.kernel == 'gaussian' else sigma))
+        offsets = np.arange(-reach, reach + 1)
+        d2 = (offsets[:, None] ** 2 + offsets[None, :] ** 2) / sigma ** 2
+        if self.kernel == 'gaussian':
+            kernel = np.exp(-0.5 * d2)
+        else:
+            kernel = np.where(d2 < 1, (1 - d2) ** 2, 0.0)
+        cell_km2 = (self.cell_meters / 1000) ** 2
+        return kernel / (kernel.sum() * cell_km2)
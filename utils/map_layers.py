@@ -0,0 +1,101 @@
+import json
+
+import numpy as np
+import pandas as pd
+from branca.element import MacroElement
+from jinja2 import Template
+
+# Characters that could end the inline <script> or open markup, as JSON escapes
+SCRIPT_ESCAPES = {ord('<'): '\\u003c', ord('>'): '\\u003e', ord('&'): '\\u0026'}
+
+
+class PointLayer(MacroElement):
+    """Circle markers for many points in one canvas-rendered Leaflet layer
+
+    The points travel to the browser as column arrays (coordinates, a color
+    index into a small palette, and the popup fields as category codes plus
+    their labels) instead of one marker and popup object per row, and each
+    popup is filled in from a template only when it is opened. Building the
+    layer is vectorized, and the HTML costs a few dozen bytes per point.
+    The payload is embedded with ``<``, ``>`` and ``&`` escaped, and field
+    values are HTML-escaped in the popup, so no data value can break out
+    of the script or inject markup.
+    """
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        var {{ this.get_name() }} = (function() {
+            var data = {{ this.payload }};
+            var renderer = L.canvas({padding: 0.5});
+            var layer = L.featureGroup();
+            function escapeHtml(text) {
+                return String(text).replace(/[&<>"']/g, function(c) {
+                    return {'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'}[c];
+                });
+            }
+            function fieldValue(field, i) {
+                var value = field.values[i];
+                if (field.labels) {
+                    return value < 0 ? '' : escapeHtml(field.labels[value]);
+                }
+                return value;
+            }
+            function popup(marker) {
+                var i = marker.options.row;
+                var html = data.title.replace(/\\{(\\w+)\\}/g, function(match, name) {
+                    var field = data.fields.find(function(f) { return f.name === name; });
+                    return field ? fieldValue(field, i) : match;
+                });
+                data.fields.forEach(function(field) {
+                    if (field.label) {
+                        html += '<br>' + field.label + ': ' + fieldValue(field, i);
+                    }
+                });
+                return html;
+            }
+            for (var i = 0; i < data.lat.length; i++) {
+                var color = data.palette[data.color[i]];
+                L.circleMarker([data.lat[i], data.lon[i]], {
+                    renderer: renderer, row: i, weight: data.weight,
+                    radius: Array.isArray(data.radius) ? data.radius[i] : data.radius,
+                    color: color, fill: true, fillColor: color, fillOpacity: data.opacity
+                }).bindPopup(popup, {maxWidth: 300}).addTo(layer);
+            }
+            return layer.addTo({{ this._parent.get_name() }});
+        })();
+        {% endmacro %}
+    """)
+
+    def __init__(self, lat, lon, color_codes, palette, fields=None, title='', radius=6, opacity=0.7,
+                 weight=1):
+        """``fields`` maps column name to (popup label or None, values); values are encoded here
+
+        ``title`` is shown in bold at the top of each popup and may refer to
+        fields as ``{name}`` (fields with a None label only feed the title).
+        ``radius`` is one size for every marker or an array with one per point.
+        """
+        super().__init__()
+        self._name = 'PointLayer'
+        encoded = [dict(self._encode(values), name=name, label=label)
+                   for name, (label, values) in (fields or {}).items()]
+        self.n_points = len(lat)
+        self.payload = json.dumps({
+            'lat': np.round(np.asarray(lat, dtype=float), 5).tolist(),
+            'lon': np.round(np.asarray(lon, dtype=float), 5).tolist(),
+            'color': np.asarray(color_codes, dtype=np.int64).tolist(),
+            'palette': list(palette),
+            'fields': encoded,
+            'title': f'<b>{title}</b>' if title else '',
+            'radius': radius if np.isscalar(radius) else np.round(np.asarray(radius, dtype=float), 1).tolist(),
+            'weight': weight,
+            'opacity': opacity
+        }, separators=(',', ':')).translate(SCRIPT_ESCAPES)
+
+    @staticmethod
+    def _encode(values):
+        """Integers go as they are; anything else as category codes and labels"""
+        values = pd.Series(values)
+        if pd.api.types.is_integer_dtype(values.dtype):
+            return {'values': values.to_numpy(dtype=np.int64).tolist()}
+        codes, labels = pd.factorize(values)
+        return {'values': codes.tolist(), 'labels': [str(label) for label in labels]}
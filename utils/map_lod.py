@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+from utils.grid_aggregation import GridAggregator
+from utils.heat_data import meters_per_pixel
+
+# Web-map tiles are 256 pixels wide
+TILE_PIXELS = 256
+
+
+def viewport_bounds(center, zoom, width=1200, height=600):
+    """((south, west), (north, east)) seen by a width x height pixel map at center and zoom"""
+    lat, lon = center
+    half_lon = width / 2 * 360 / (TILE_PIXELS * 2 ** zoom)
+    half_lat = height / 2 * meters_per_pixel(zoom, lat) / 111_320
+    return (lat - half_lat, lon - half_lon), (lat + half_lat, lon + half_lon)
+
+
+class ViewportIndex:
+    """Accidents inside a map viewport, at a level of detail that fits a payload budget
+
+    Individual accidents are only returned from ``marker_zoom`` on, and only
+    when at most ``budget`` of them are in view; they are found with a
+    KD-tree box query. Otherwise the view gets grid cells about
+    ``cell_pixels`` wide on screen, precomputed once per zoom level, and
+    coarsened further if more than ``budget`` of them are visible. Either
+    way a view never holds more than ``budget`` features, whatever the
+    dataset size.
+    """
+
+    def __init__(self, df, budget=5000, marker_zoom=15, cell_pixels=48):
+        self.df = df
+        self.budget = budget
+        self.marker_zoom = marker_zoom
+        self.cell_pixels = cell_pixels
+        self.coords = df[['Latitude', 'Longitude']].to_numpy(dtype=float)
+        self.severity = df['Severity'].to_numpy(dtype=float)
+        self.tree = cKDTree(self.coords) if len(self.coords) else None
+        self._cells = {}
+
+    def view(self, bounds, zoom):
+        """What to draw for a viewport: individual accidents ('markers') or aggregated 'cells'
+
+        Returns a dict with the ``mode``, the ``data`` frame (accident rows,
+        or cells with Latitude, Longitude, Accidents and Avg_Severity), the
+        number of accidents ``in_view`` and the ``zoom`` the cells were built at.
+        """
+        (south, west), (north, east) = bounds
+        zoom = max(int(round(zoom)), 0)
+        if self.tree is None:
+            return {'mode': 'markers', 'data': self.df.iloc[:0], 'in_view': 0, 'zoom': zoom}
+        center = [(south + north) / 2, (west + east) / 2]
+        radius = max(north - south, east - west) / 2
+        in_box = self.tree.query_ball_point(center, radius, p=np.inf, return_length=True)
+        # The square query covers the view; only fetch rows when markers are possible
+        if zoom >= self.marker_zoom and in_box <= 4 * self.budget:
+            rows = np.asarray(self.tree.query_ball_point(center, radius, p=np.inf), dtype=np.int64)
+            lat, lon = self.coords[rows, 0], self.coords[rows, 1]
+            rows = np.sort(rows[(lat >= south) & (lat <= north) & (lon >= west) & (lon <= east)])
+            if len(rows) <= self.budget:
+                return {'mode': 'markers', 'data': self.df.iloc[rows], 'in_view': len(rows), 'zoom': zoom}
+
+        for level in range(zoom, -1, -1):
+            cells = self.cells(level)
+            visible = cells[cells['Latitude'].between(south, north) & cells['Longitude'].between(west, east)]
+            if len(visible) <= self.budget:
+                break
+        return {'mode': 'cells', 'data': visible, 'in_view': int(visible['Accidents'].sum()), 'zoom': level}
+
+    def cells(self, zoom):
+        """Accident counts and mean severity per grid cell of ``cell_pixels`` at a zoom level (cached)"""
+        if zoom not in self._cells:
+            lat = float(np.mean(self.coords[:, 0]))
+            grid = GridAggregator(self.cell_pixels * meters_per_pixel(zoom, lat)).fit(
+                self.coords, sample_weight=self.severity)
+            self._cells[zoom] = pd.DataFrame({
+                'Latitude': grid.centroids_[:, 0],
+                'Longitude': grid.centroids_[:, 1],
+                'Accidents': grid.counts_,
+                'Avg_Severity': grid.weights_ / grid.counts_
+            })
+        return self._cells[zoom]
@@ -0,0 +1,250 @@
+import numpy as np
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+from scipy.spatial import cKDTree
+
+from utils.geo import meters_to_chord, to_unit_sphere
+
+
+class BlockedDBSCANMixin:
+    """Machinery shared by the DBSCAN variants that query neighbors in bounded blocks
+
+    Subclasses implement ``_cluster(points, weights)`` over distinct rows,
+    setting ``_core_mask`` and ``_neighbor_weight``; this mixin collapses
+    duplicate rows into weighted points, maps results back to every input
+    row, and provides the block-wise pair queries and vectorized union-find
+    the clustering passes are built from.
+    """
+
+    def set_params(self, **params):
+        for key, value in params.items():
+            setattr(self, key, value)
+        return self
+
+    def _fit_rows(self, rows, sample_weight=None):
+        """Labels (-1 for noise) of rows clustered by ``_cluster``, duplicates collapsed first"""
+        if len(rows) == 0:
+            return np.empty(0, dtype=np.int64)
+
+        # Collapse exact duplicates into weighted points
+        points, inverse = self._unique_rows(rows)
+        if sample_weight is None:
+            weights = np.bincount(inverse).astype(float)
+        else:
+            weights = np.bincount(inverse, weights=np.asarray(sample_weight, dtype=float))
+
+        labels = self._cluster(points, weights)
+        self.core_sample_mask_ = self._core_mask[inverse]
+        self.neighbor_weight_ = self._neighbor_weight[inverse]
+        return renumber_labels(labels[inverse])
+
+    def _unique_rows(self, coords):
+        """Distinct (lat, lon, ...) rows and the index of each input row's distinct row"""
+        order = np.lexsort(coords.T[::-1])
+        ordered = coords[order]
+        first = np.ones(len(ordered), dtype=bool)
+        first[1:] = np.any(ordered[1:] != ordered[:-1], axis=1)
+        inverse = np.empty(len(coords), dtype=np.int64)
+        inverse[order] = np.cumsum(first) - 1
+        return ordered[first], inverse
+
+    def _pair_blocks(self, tree, xyz, radius, with_distances=False, p=2.0):
+        """Yield (block, local src, global dst) neighbor pairs for spatially coherent blocks
+
+        Blocks follow the KD-tree's leaf order. Every point's neighbor count is
+        taken first with a counting query, and each block ends where its counts
+        would pass batch_neighbors pairs, so no single query materialises more
+        than that (unless one point alone has more neighbors). With
+        ``with_distances`` the last item is a (dst, distance) pair; ``p`` is
+        the Minkowski norm of the query.
+        """
+        order = tree.indices
+        counts = tree.query_ball_point(xyz[order], radius, p=p, return_length=True, workers=-1)
+        cumulative = np.cumsum(counts)
+        start = 0
+        while start < len(order):
+            done = cumulative[start - 1] if start else 0
+            stop = int(np.searchsorted(cumulative, done + self.batch_neighbors, side='right'))
+            block = order[start:min(max(stop, start + 1), start + self.batch_rows)]
+            pairs = cKDTree(xyz[block]).sparse_distance_matrix(tree, radius, p=p, output_type='ndarray')
+            dst = pairs['j'].astype(np.int64)
+            yield block, pairs['i'].astype(np.int64), (dst, pairs['v']) if with_distances else dst
+            start += len(block)
+
+    def _find(self, parent, nodes):
+        """Roots of nodes, compressing their paths"""
+        roots = parent[nodes]
+        while True:
+            up = parent[roots]
+            if np.array_equal(up, roots):
+                break
+            roots = up
+        parent[nodes] = roots
+        return roots
+
+    def _union(self, parent, src, dst):
+        """Merge the sets joined by (src, dst) edges; each set keeps its smallest root"""
+        a = self._find(parent, src)
+        b = self._find(parent, dst)
+        linked = a != b
+        if not linked.any():
+            return
+        a, b = a[linked], b[linked]
+        roots, local = np.unique(np.concatenate([a, b]), return_inverse=True)
+        n = len(roots)
+        local = local.ravel()
+        graph = coo_matrix((np.ones(len(a), dtype=np.int8), (local[:len(a)], local[len(a):])), shape=(n, n))
+        _, groups = connected_components(graph, directed=False)
+        new_root = np.full(groups.max() + 1, np.iinfo(np.int64).max, dtype=np.int64)
+        np.minimum.at(new_root, groups, roots)
+        parent[roots] = new_root[groups]
+
+    def _flatten(self, parent):
+        """Point every node directly at its root"""
+        while True:
+            up = parent[parent]
+            if np.array_equal(up, parent):
+                return parent
+            parent = up
+
+
+class MetricDBSCAN(BlockedDBSCANMixin):
+    """DBSCAN on latitude/longitude with a neighborhood radius in meters
+
+    Points are mapped onto the unit sphere, where a Euclidean KD-tree radius
+    query is an exact great-circle (haversine) query. Exact duplicate
+    coordinates are collapsed into weighted points, and neighbor pairs are
+    only ever materialised in blocks of at most ``batch_neighbors`` entries, so
+    memory stays bounded regardless of how many points share a junction.
+    """
+
+    def __init__(self, eps_meters=100.0, min_samples=3, batch_neighbors=1_000_000, batch_rows=200_000):
+        self.eps_meters = eps_meters
+        self.min_samples = min_samples
+        self.batch_neighbors = batch_neighbors
+        self.batch_rows = batch_rows
+
+    def fit_predict(self, coordinates, sample_weight=None):
+        """Cluster (lat, lon) rows; returns labels with -1 for noise"""
+        return self._fit_rows(np.asarray(coordinates, dtype=float), sample_weight)
+
+    def neighbor_graph(self, coordinates, max_eps_meters=None, sample_weight=None):
+        """Build the radius-neighbor graph once, at the largest eps a sweep will use"""
+        coords = np.asarray(coordinates, dtype=float).reshape(-1, 2)
+        points, inverse = self._unique_rows(coords)
+        if sample_weight is None:
+            weights = np.bincount(inverse, minlength=len(points)).astype(float)
+        else:
+            weights = np.bincount(inverse, weights=np.asarray(sample_weight, dtype=float), minlength=len(points))
+
+        radius = float(meters_to_chord(max_eps_meters or self.eps_meters))
+        xyz = to_unit_sphere(points[:, 0], points[:, 1])
+        tree = cKDTree(xyz)
+        # Seeded with empty arrays so inputs without pairs (or rows) give an empty graph
+        src, dst, dist = [np.empty(0, dtype=np.int32)], [np.empty(0, dtype=np.int32)], [np.empty(0)]
+        for block, i, (j, d) in self._pair_blocks(tree, xyz, radius, with_distances=True):
+            i = block[i]
+            # Keep each undirected edge once; self pairs are implied
+            forward = i < j
+            src.append(i[forward].astype(np.int32))
+            dst.append(j[forward].astype(np.int32))
+            dist.append(d[forward])
+        return NeighborGraph(points, inverse, weights, np.concatenate(src), np.concatenate(dst),
+                             np.concatenate(dist))
+
+    def _cluster(self, points, weights):
+        radius = float(meters_to_chord(self.eps_meters))
+        xyz = to_unit_sphere(points[:, 0], points[:, 1])
+        tree = cKDTree(xyz)
+
+        # Core points: total neighbor weight (self included) reaches min_samples
+        totals = np.zeros(len(xyz))
+        for block, src, dst in self._pair_blocks(tree, xyz, radius):
+            totals[block] = np.bincount(src, weights=weights[dst], minlength=len(block))
+        core = totals >= self.min_samples
+        self._core_mask = core
+        self._neighbor_weight = totals
+
+        labels = np.full(len(xyz), -1, dtype=np.int64)
+        core_idx = np.flatnonzero(core)
+        if len(core_idx) == 0:
+            return labels
+
+        # Connect core points that lie within eps of each other (union-find)
+        core_xyz = xyz[core_idx]
+        core_tree = cKDTree(core_xyz)
+        parent = np.arange(len(core_idx))
+        for block, src, dst in self._pair_blocks(core_tree, core_xyz, radius):
+            src = block[src]
+            # Pairs come in both directions; one is enough to link them
+            forward = src < dst
+            self._union(parent, src[forward], dst[forward])
+        component = self._flatten(parent)
+        labels[core_idx] = component
+
+        # Border points join the cluster of their nearest core point within eps
+        border_idx = np.flatnonzero(~core)
+        if len(border_idx):
+            dist, nearest = core_tree.query(xyz[border_idx], k=1, distance_upper_bound=np.nextafter(radius, np.inf))
+            found = np.isfinite(dist)
+            labels[border_idx[found]] = component[nearest[found]]
+
+        return labels
+
+
+class NeighborGraph:
+    """Radius-neighbor graph of distinct points, edges sorted by distance
+
+    Every eps up to the radius the graph was built with selects a prefix of
+    the edge list, so DBSCAN labels for a whole grid of (eps, min_samples)
+    settings can be derived without another neighbor search.
+    """
+
+    def __init__(self, points, inverse, weights, src, dst, chord):
+        order = np.argsort(chord, kind='stable')
+        self.points = points
+        self.inverse = inverse
+        self.weights = weights
+        self.src = src[order]
+        self.dst = dst[order]
+        self.chord = chord[order]
+
+    def labels(self, eps_meters, min_samples):
+        """DBSCAN labels for every original row at this setting (-1 for noise)"""
+        n = len(self.points)
+        k = int(np.searchsorted(self.chord, meters_to_chord(eps_meters), side='right'))
+        src, dst = self.src[:k], self.dst[:k]
+
+        # Neighbor weight includes the point itself
+        totals = self.weights + np.bincount(src, weights=self.weights[dst], minlength=n) \
+            + np.bincount(dst, weights=self.weights[src], minlength=n)
+        core = totals >= min_samples
+
+        labels = np.full(n, -1, dtype=np.int64)
+        linked = core[src] & core[dst]
+        graph = coo_matrix((np.ones(int(linked.sum()), dtype=np.int8), (src[linked], dst[linked])), shape=(n, n))
+        _, component = connected_components(graph, directed=False)
+        labels[core] = component[core]
+
+        # Border points take the label of their nearest core neighbor (edges are distance-sorted)
+        border_src = np.concatenate([src[core[dst] & ~core[src]], dst[core[src] & ~core[dst]]])
+        border_dst = np.concatenate([dst[core[dst] & ~core[src]], src[core[src] & ~core[dst]]])
+        border_rank = np.concatenate([np.flatnonzero(core[dst] & ~core[src]), np.flatnonzero(core[src] & ~core[dst])])
+        order = np.argsort(border_rank, kind='stable')
+        border, first = np.unique(border_src[order], return_index=True)
+        labels[border] = component[border_dst[order][first]]
+
+        return renumber_labels(labels[self.inverse])
+
+
+def renumber_labels(labels):
+    """Number clusters 0..k-1 in order of first appearance; noise stays -1"""
+    result = np.full(len(labels), -1, dtype=np.int64)
+    clustered = labels >= 0
+    if not clustered.any():
+        return result
+    roots, first, inverse = np.unique(labels[clustered], return_index=True, return_inverse=True)
+    rank = np.empty(len(roots), dtype=np.int64)
+    rank[np.argsort(first)] = np.arange(len(roots))
+    result[clustered] = rank[inverse.ravel()]
+    return result
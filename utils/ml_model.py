@@ -1,41 +1,386 @@
+import json
+from datetime import datetime
+
 import numpy as np
-from sklearn.cluster import DBSCAN, KMeans
+import pandas as pd
+from joblib import Parallel, delayed
+from sklearn.cluster import DBSCAN, KMeans, MiniBatchKMeans
+from sklearn.base import clone
 from sklearn.preprocessing import StandardScaler
-from sklearn.metrics import silhouette_score
+from scipy.spatial import cKDTree
+from utils.geo import meters_to_chord, to_unit_sphere
+from utils.metric_dbscan import MetricDBSCAN
+from utils.st_dbscan import MINUTES_PER_DAY, STDBSCAN
+from utils.grid_aggregation import GridAggregator
+from utils.cluster_quality import ClusterQuality
+from utils.hotspot_stats import GiStarAnalysis
+
+# Algorithms fitted on (lat, lon) with a radius in meters
+METER_ALGORITHMS = ('DBSCAN-meters', 'ST-DBSCAN')
 
 class HotspotModel:
+    ARTIFACT_VERSION = 1
+    
     def __init__(self):
         self.dbscan = DBSCAN(eps=0.01, min_samples=3)
         self.kmeans = KMeans(n_clusters=5, random_state=42)
         self.scaler = StandardScaler()
+        self.metric_dbscan = MetricDBSCAN(eps_meters=100, min_samples=3)
+        self.st_dbscan = STDBSCAN(eps_meters=100, eps_minutes=MINUTES_PER_DAY, min_samples=3)
+        self.minibatch = MiniBatchKMeans(n_clusters=5, random_state=42, batch_size=4096, n_init=3)
+        self.quality = ClusterQuality()
+        self.gi_star = GiStarAnalysis(cell_meters=100, rings=1, confidence=95)
+        self.grid = None
+        self.inertia_ = None
+        self.algorithm_ = None
+        self.labels_ = None
+        self.core_points_ = None
+        self.core_labels_ = None
+        self.radius_ = None
+        self.metadata_ = None
+        self._index = None
     
-    def detect_hotspots_dbscan(self, coordinates):
+    def detect_hotspots_dbscan(self, coordinates, grid_meters=None, sample_weight=None):
         """Detect hotspots using DBSCAN clustering"""
         try:
-            coords_scaled = self.scaler.fit_transform(coordinates)
-            clusters = self.dbscan.fit_predict(coords_scaled)
-            return clusters
+            points, weights = self._prepare(coordinates, grid_meters, sample_weight)
+            coords_scaled = self.scaler.fit_transform(points, sample_weight=self._scale_weight())
+            clusters = self.dbscan.fit_predict(coords_scaled, sample_weight=weights)
+            core = self.dbscan.core_sample_indices_
+            self._remember('DBSCAN', clusters, coords_scaled[core], clusters[core], self.dbscan.eps)
+            return self.labels_
         except Exception as e:
             print(f"DBSCAN Error: {e}")
             return np.zeros(len(coordinates))
     
-    def detect_hotspots_kmeans(self, coordinates, n_clusters=5):
+    def detect_hotspots_dbscan_meters(self, coordinates, grid_meters=None, sample_weight=None):
+        """Detect hotspots using DBSCAN with a haversine radius in meters"""
+        try:
+            points, weights = self._prepare(coordinates, grid_meters, sample_weight)
+            clusters = self.metric_dbscan.fit_predict(points, sample_weight=weights)
+            core = self.metric_dbscan.core_sample_mask_
+            self._remember('DBSCAN-meters', clusters, np.asarray(points, dtype=float)[core], clusters[core],
+                           self.metric_dbscan.eps_meters)
+            return self.labels_
+        except Exception as e:
+            print(f"Metric DBSCAN Error: {e}")
+            return np.zeros(len(coordinates))
+    
+    def detect_hotspots_st_dbscan(self, coordinates, times, sample_weight=None):
+        """Detect short-lived hotspots using DBSCAN over space (meters) and time (minutes)"""
+        try:
+            self.grid = None
+            points = np.asarray(coordinates, dtype=float)
+            clusters = self.st_dbscan.fit_predict(points, times, sample_weight=sample_weight)
+            core = self.st_dbscan.core_sample_mask_
+            self._remember('ST-DBSCAN', clusters, points[core], clusters[core], self.st_dbscan.eps_meters)
+            return self.labels_
+        except Exception as e:
+            print(f"ST-DBSCAN Error: {e}")
+            return np.zeros(len(coordinates))
+    
+    def detect_hotspots_gi(self, coordinates, sample_weight=None):
+        """Detect statistically significant hotspots using Getis-Ord Gi* over grid cells
+
+        Unlike the clustering methods, errors are raised (ValueError for
+        unusable input): a fallback labeling would claim significance the
+        test never established.
+        """
+        self.grid = None
+        return self.gi_star.fit_predict(coordinates, sample_weight=sample_weight)
+    
+    def sweep_dbscan(self, coordinates, eps_values, min_samples_values, n_jobs=-1, quality_sample=4000):
+        """Evaluate a grid of (eps meters, min_samples) DBSCAN settings from one neighbor search
+
+        The radius-neighbor graph is built once at the largest eps and every
+        setting is derived from it in parallel worker processes (joblib
+        memory-maps the shared graph arrays instead of copying them).
+        Returns one row per setting with clusters found, noise ratio and
+        quality metrics.
+        """
+        coordinates = np.asarray(coordinates, dtype=float)
+        graph = self.metric_dbscan.neighbor_graph(coordinates, max(eps_values))
+        quality = ClusterQuality(exact_threshold=quality_sample, sample_size=quality_sample, n_replicates=2,
+                                 random_state=self.quality.random_state)
+        settings = [(eps, ms) for eps in sorted(eps_values) for ms in sorted(min_samples_values)]
+        rows = Parallel(n_jobs=n_jobs)(
+            delayed(_sweep_setting)(graph, coordinates, eps, ms, quality) for eps, ms in settings
+        )
+        return pd.DataFrame(rows)
+    
+    def detect_hotspots_kmeans(self, coordinates, n_clusters=5, grid_meters=None, sample_weight=None):
         """Detect hotspots using K-Means clustering"""
         try:
             self.kmeans.n_clusters = n_clusters
-            coords_scaled = self.scaler.fit_transform(coordinates)
-            clusters = self.kmeans.fit_predict(coords_scaled)
-            return clusters, self.kmeans.cluster_centers_
+            points, weights = self._prepare(coordinates, grid_meters, sample_weight)
+            coords_scaled = self.scaler.fit_transform(points, sample_weight=self._scale_weight())
+            clusters = self.kmeans.fit_predict(coords_scaled, sample_weight=weights)
+            self.inertia_ = self.kmeans.inertia_
+            centers = self.kmeans.cluster_centers_
+            self._remember('K-Means', clusters, centers, np.arange(len(centers)))
+            return self.labels_, centers
         except Exception as e:
             print(f"K-Means Error: {e}")
             return np.zeros(len(coordinates)), None
     
+    def sweep_kmeans(self, coordinates, k_max=10, k_min=2, n_jobs=-1, quality_sample=4000):
+        """Fit K-Means for k = k_min..k_max in parallel and suggest a k
+
+        The coordinates are scaled once; joblib worker processes memory-map
+        that single buffer rather than receiving copies. Returns the inertia
+        and sampled-silhouette curves plus the elbow k, the best-silhouette k
+        and the suggested k (best silhouette, else the elbow). The sweep
+        uses its own scaler, so the fitted model is left untouched.
+        """
+        coords_scaled = np.ascontiguousarray(StandardScaler().fit_transform(coordinates))
+        k_values = list(range(k_min, min(k_max, len(coords_scaled) - 1) + 1))
+        quality = ClusterQuality(exact_threshold=quality_sample, sample_size=quality_sample, n_replicates=2,
+                                 random_state=self.quality.random_state)
+        rows = Parallel(n_jobs=n_jobs)(
+            delayed(_sweep_k)(coords_scaled, k, self.kmeans.get_params(), quality) for k in k_values
+        )
+        curve = pd.DataFrame(rows, columns=['k', 'inertia', 'silhouette'])
+        
+        elbow = elbow_k(curve['k'].to_numpy(), curve['inertia'].to_numpy()) if len(curve) else None
+        best = int(curve.loc[curve['silhouette'].idxmax(), 'k']) if curve['silhouette'].notna().any() else None
+        return {
+            'curve': curve,
+            'elbow_k': elbow,
+            'silhouette_k': best,
+            'suggested_k': best if best is not None else elbow
+        }
+    
+    def detect_hotspots_minibatch(self, coordinates, n_clusters=5, chunk_size=50_000,
+                                  grid_meters=None, sample_weight=None):
+        """Detect hotspots using streaming mini-batch K-Means over array slices"""
+        try:
+            points, weights = self._prepare(coordinates, grid_meters, sample_weight)
+            points = np.asarray(points)
+            # Fit on shuffled slices so the first batch is not one spatial strip
+            shuffled = np.random.default_rng(42).permutation(len(points))
+            
+            def chunks(order=None):
+                for start in range(0, len(points), chunk_size):
+                    rows = slice(start, start + chunk_size) if order is None else order[start:start + chunk_size]
+                    yield points[rows], None if weights is None else weights[rows]
+            
+            centers = self.fit_kmeans_stream(lambda: chunks(shuffled), n_clusters)
+            clusters = np.concatenate(list(self.predict_stream(chunks)))
+            self._remember('K-Means', clusters, centers, np.arange(len(centers)))
+            return self.labels_, centers
+        except Exception as e:
+            print(f"Mini-batch K-Means Error: {e}")
+            return np.zeros(len(coordinates)), None
+    
+    def fit_kmeans_stream(self, chunks, n_clusters=5):
+        """Fit mini-batch K-Means with partial_fit over a re-iterable chunk source
+
+        ``chunks`` is a callable returning a fresh iterator of coordinate
+        arrays (or ``(coordinates, sample_weight)`` pairs), e.g.
+        ``lambda: processor.iter_coordinates(path)``. One pass fits the scaler
+        and a second pass fits the centers, so the full dataset never has to
+        be held in memory.
+        """
+        self.scaler = StandardScaler()
+        for coords, weights in self._stream(chunks):
+            self.scaler.partial_fit(coords, sample_weight=weights)
+        
+        self.minibatch = clone(self.minibatch).set_params(n_clusters=n_clusters)
+        pending = []
+        for coords, weights in self._stream(chunks):
+            # partial_fit initialises from its first batch, which needs at least n_clusters points
+            pending.append((coords, weights))
+            if sum(len(c) for c, _ in pending) < n_clusters:
+                continue
+            coords, weights = self._join(pending)
+            pending = []
+            self.minibatch.partial_fit(self.scaler.transform(coords), sample_weight=weights)
+        if pending and hasattr(self.minibatch, 'cluster_centers_'):
+            coords, weights = self._join(pending)
+            self.minibatch.partial_fit(self.scaler.transform(coords), sample_weight=weights)
+        if not hasattr(self.minibatch, 'cluster_centers_'):
+            raise ValueError(f"need at least {n_clusters} points to fit {n_clusters} clusters")
+        return self.minibatch.cluster_centers_
+    
+    def predict_stream(self, chunks):
+        """Yield streaming K-Means labels chunk by chunk, accumulating inertia_"""
+        self.inertia_ = 0.0
+        for coords, weights in self._stream(chunks):
+            scaled = self.scaler.transform(coords)
+            labels = self.minibatch.predict(scaled)
+            self.inertia_ += -self.minibatch.score(scaled, sample_weight=weights)
+            yield labels
+    
+    def _stream(self, chunks):
+        """Normalise a chunk source to (coordinates, sample_weight) pairs"""
+        for chunk in chunks():
+            coords, weights = chunk if isinstance(chunk, tuple) else (chunk, None)
+            if len(coords):
+                yield np.asarray(coords, dtype=float), weights
+    
+    def _join(self, pending):
+        coords = np.concatenate([c for c, _ in pending])
+        if all(w is None for _, w in pending):
+            return coords, None
+        weights = np.concatenate([np.ones(len(c)) if w is None else w for c, w in pending])
+        return coords, weights
+    
+    def _prepare(self, coordinates, grid_meters, sample_weight):
+        """Optionally pre-aggregate points into grid cells before clustering"""
+        if not grid_meters:
+            self.grid = None
+            return coordinates, sample_weight
+        self.grid = GridAggregator(grid_meters).fit(coordinates, sample_weight)
+        return self.grid.centroids_, self.grid.weights_
+    
+    def _scale_weight(self):
+        """Row counts per cell, so scaling matches the raw points"""
+        return None if self.grid is None else self.grid.counts_
+    
+    def _broadcast(self, clusters):
+        """Map cell labels back onto the original rows"""
+        return clusters if self.grid is None else self.grid.broadcast(clusters)
+    
+    def _remember(self, algorithm, clusters, core_points, core_labels, radius=np.inf):
+        """Keep what predict() and save() need from the latest fit"""
+        self.algorithm_ = algorithm
+        self.labels_ = self._broadcast(clusters)
+        self.core_points_ = np.asarray(core_points, dtype=float)
+        self.core_labels_ = np.asarray(core_labels, dtype=np.int64)
+        self.radius_ = float(radius)
+        self._index = None
+    
+    def predict(self, points):
+        """Assign (lat, lon) points to the nearest hotspot, or -1 for noise
+
+        K-Means assigns every point to its nearest center. DBSCAN assigns a
+        point the hotspot of its nearest core point within the fitted radius,
+        which is how DBSCAN itself labels border points. ST-DBSCAN hotspots
+        are matched in space only, since new points carry no time.
+        """
+        if self.algorithm_ is None:
+            raise ValueError("model is not fitted; run a detect_hotspots_* method or load() first")
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        labels = np.full(len(points), -1, dtype=np.int64)
+        if len(points) == 0 or len(self.core_points_) == 0:
+            return labels
+        
+        if self._index is None:
+            self._index = cKDTree(self._index_space(self.core_points_, core=True))
+        radius = meters_to_chord(self.radius_) if self.algorithm_ in METER_ALGORITHMS else self.radius_
+        _, nearest = self._index.query(self._index_space(points), k=1, distance_upper_bound=radius, workers=-1)
+        found = nearest < len(self.core_points_)
+        labels[found] = self.core_labels_[nearest[found]]
+        return labels
+    
+    def _index_space(self, points, core=False):
+        """Unit-sphere points for meter radii, scaled coordinates otherwise (core points are already scaled)"""
+        if self.algorithm_ in METER_ALGORITHMS:
+            return to_unit_sphere(points[:, 0], points[:, 1])
+        return points if core else self.scaler.transform(points)
+    
+    def save(self, file):
+        """Write the fitted model as a compressed .npz artifact (path or binary file object)"""
+        if self.algorithm_ is None:
+            raise ValueError("model is not fitted; nothing to save")
+        metadata = {
+            'version': self.ARTIFACT_VERSION,
+            'algorithm': self.algorithm_,
+            'radius': self.radius_,
+            'n_points': len(self.labels_),
+            'n_clusters': int(self.core_labels_.max()) + 1 if len(self.core_labels_) else 0,
+            'grid_meters': None if self.grid is None else self.grid.cell_meters,
+            'inertia': self.inertia_,
+            'created': datetime.now().isoformat(timespec='seconds')
+        }
+        scaled = hasattr(self.scaler, 'mean_')
+        np.savez_compressed(
+            file,
+            metadata=np.array(json.dumps(metadata)),
+            scaler_mean=self.scaler.mean_ if scaled else np.empty(0),
+            scaler_scale=self.scaler.scale_ if scaled else np.empty(0),
+            core_points=self.core_points_,
+            core_labels=self.core_labels_.astype(np.int32),
+            labels=np.asarray(self.labels_, dtype=np.int32)
+        )
+        self.metadata_ = metadata
+        return metadata
+    
+    @classmethod
+    def load(cls, file):
+        """Restore a model saved with save(); it can predict() without refitting"""
+        with np.load(file, allow_pickle=False) as artifact:
+            metadata = json.loads(str(artifact['metadata']))
+            if metadata.get('version', 0) > cls.ARTIFACT_VERSION:
+                raise ValueError(f"model artifact version {metadata.get('version')} is newer than "
+                                 f"supported version {cls.ARTIFACT_VERSION}")
+            model = cls()
+            if artifact['scaler_mean'].size:
+                model.scaler.mean_ = artifact['scaler_mean']
+                model.scaler.scale_ = artifact['scaler_scale']
+                model.scaler.var_ = artifact['scaler_scale'] ** 2
+                model.scaler.n_features_in_ = len(artifact['scaler_mean'])
+                model.scaler.n_samples_seen_ = metadata['n_points']
+            model.algorithm_ = metadata['algorithm']
+            model.radius_ = metadata['radius']
+            model.inertia_ = metadata['inertia']
+            model.core_points_ = artifact['core_points']
+            model.core_labels_ = artifact['core_labels'].astype(np.int64)
+            model.labels_ = artifact['labels'].astype(np.int64)
+        model.metadata_ = metadata
+        return model
+    
+    def cluster_statistics(self, df, drop_noise=True):
+        """Per-cluster accident count, severity, vehicle and speed-limit aggregates, largest first"""
+        if drop_noise:
+            df = df[df['Cluster'] != -1]
+        aggregates = {
+            'Accident_Count': ('Severity', 'count'),
+            'Avg_Severity': ('Severity', 'mean'),
+            'Max_Severity': ('Severity', 'max'),
+            'Avg_Vehicles': ('Vehicles_Involved', 'mean'),
+            'Avg_Speed_Limit': ('Speed_Limit', 'mean')
+        }
+        aggregates = {name: spec for name, spec in aggregates.items() if spec[0] in df.columns}
+        cluster_stats = df.groupby('Cluster').agg(**aggregates).round(2)
+        return cluster_stats.sort_values('Accident_Count', ascending=False)
+    
     def evaluate_clustering(self, coordinates, clusters):
-        """Evaluate clustering quality using silhouette score"""
-        if len(set(clusters)) > 1 and -1 not in clusters:
-            return silhouette_score(coordinates, clusters)
-        elif len(set(clusters)) > 2:  # DBSCAN with noise
-            valid_points = clusters != -1
-            if sum(valid_points) > 1 and len(set(clusters[valid_points])) > 1:
-                return silhouette_score(coordinates[valid_points], clusters[valid_points])
-        return 0.0
\ No newline at end of file
+        """Evaluate clustering quality using silhouette score (sampled on large datasets)"""
+        return self.quality.evaluate(coordinates, clusters, extra_metrics=False)['silhouette']
+
+
+def _sweep_setting(graph, coordinates, eps_meters, min_samples, quality):
+    """Summarise one DBSCAN setting derived from a shared neighbor graph"""
+    labels = graph.labels(eps_meters, min_samples)
+    scores = quality.evaluate(coordinates, labels)
+    return {
+        'eps_meters': eps_meters,
+        'min_samples': min_samples,
+        'n_clusters': int(labels.max()) + 1,
+        'noise_ratio': float(np.mean(labels == -1)),
+        'silhouette': scores['silhouette'],
+        'davies_bouldin': scores['davies_bouldin']
+    }
+
+
+def _sweep_k(coords_scaled, k, kmeans_params, quality):
+    """Fit one K-Means model of a k sweep"""
+    kmeans = KMeans(**dict(kmeans_params, n_clusters=k))
+    labels = kmeans.fit_predict(coords_scaled)
+    return {
+        'k': k,
+        'inertia': float(kmeans.inertia_),
+        'silhouette': quality.evaluate(coords_scaled, labels, extra_metrics=False)['silhouette']
+    }
+
+
+def elbow_k(k_values, inertias):
+    """Elbow of an inertia curve: the k farthest below the chord joining its end points"""
+    if len(k_values) < 3:
+        return int(k_values[0]) if len(k_values) else None
+    x = (k_values - k_values[0]) / (k_values[-1] - k_values[0])
+    spread = inertias[0] - inertias[-1]
+    y = (inertias - inertias[-1]) / spread if spread > 0 else np.zeros(len(inertias))
+    # The chord runs from (0, 1) to (1, 0); distance below it is 1 - x - y
+    return int(k_values[np.argmax(1 - x - y)])
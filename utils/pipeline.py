@@ -0,0 +1,150 @@
+"""Headless batch pipeline: ingest, detect hotspots and export, without Streamlit.
+
+Each input file is loaded, validated, area-tagged and clustered, then written
+out as a clustered CSV or Parquet file plus per-cluster statistics (the same
+aggregates as the Hotspot Detection page). Files are processed concurrently
+in a pool of worker processes.
+
+Usage: python -m utils.pipeline FILE [FILE ...] --output-dir DIR [--algorithm ...]
+"""
+import argparse
+import os
+import time
+
+from joblib import Parallel, delayed
+
+from utils.data_processor import DataProcessor
+from utils.ml_model import HotspotModel
+from utils.visualization import MapVisualizer
+
+ALGORITHMS = ('dbscan-meters', 'dbscan', 'kmeans', 'minibatch')
+OUTPUT_FORMATS = ('csv', 'parquet')
+
+
+def process_file(file_path, output_dir, algorithm='dbscan-meters', eps_meters=100.0, eps=0.01, min_samples=3,
+                 n_clusters=5, grid_meters=None, severity_weighted=False, output_format='csv',
+                 gazetteer=None, save_model=False, save_map=False):
+    """Run load → validate → area-tag → cluster → stats → export for one file; returns a summary dict"""
+    start = time.perf_counter()
+    processor = DataProcessor()
+    model = HotspotModel()
+    if gazetteer:
+        processor.load_gazetteer(gazetteer)
+
+    df = processor.process(file_path)
+    coordinates = df[['Latitude', 'Longitude']].to_numpy()
+    options = {
+        'grid_meters': grid_meters,
+        'sample_weight': df['Severity'].to_numpy() if severity_weighted else None
+    }
+
+    if algorithm == 'dbscan-meters':
+        model.metric_dbscan.set_params(eps_meters=eps_meters, min_samples=min_samples)
+        clusters = model.detect_hotspots_dbscan_meters(coordinates, **options)
+    elif algorithm == 'dbscan':
+        model.dbscan.set_params(eps=eps, min_samples=min_samples)
+        clusters = model.detect_hotspots_dbscan(coordinates, **options)
+    elif algorithm == 'kmeans':
+        clusters, _ = model.detect_hotspots_kmeans(coordinates, n_clusters, **options)
+    else:
+        clusters, _ = model.detect_hotspots_minibatch(coordinates, n_clusters, **options)
+    # The detect methods report errors and fall back to all-zero labels; don't export those
+    if model.algorithm_ is None:
+        raise RuntimeError(f"{algorithm} clustering failed")
+
+    df['Cluster'] = clusters
+    is_dbscan = algorithm.startswith('dbscan')
+    cluster_stats = model.cluster_statistics(df, drop_noise=is_dbscan)
+
+    stem = os.path.splitext(os.path.basename(file_path))[0]
+    os.makedirs(output_dir, exist_ok=True)
+    outputs = [os.path.join(output_dir, f"{stem}_clustered.{output_format}"),
+               os.path.join(output_dir, f"{stem}_cluster_stats.csv")]
+    if output_format == 'parquet':
+        df.to_parquet(outputs[0], index=False)
+    else:
+        df.to_csv(outputs[0], index=False)
+    cluster_stats.to_csv(outputs[1])
+
+    if save_model:
+        outputs.append(os.path.join(output_dir, f"{stem}_model.npz"))
+        model.save(outputs[-1])
+    if save_map:
+        outputs.append(os.path.join(output_dir, f"{stem}_hotspots.html"))
+        MapVisualizer().create_cluster_map(df, 'DBSCAN' if is_dbscan else 'K-Means').save(outputs[-1])
+
+    return {
+        'file': file_path,
+        'rows': len(df),
+        'hotspots': len(cluster_stats),
+        'noise': int((df['Cluster'] == -1).sum()),
+        'seconds': time.perf_counter() - start,
+        'outputs': outputs
+    }
+
+
+def run_batch(file_paths, output_dir, n_jobs=-1, **options):
+    """Process files concurrently in worker processes; failures are reported per file, not raised"""
+    if n_jobs == -1:
+        n_jobs = min(len(file_paths), os.cpu_count() or 1)
+    return Parallel(n_jobs=n_jobs)(
+        delayed(_process_safely)(path, output_dir, options) for path in file_paths
+    )
+
+
+def _process_safely(file_path, output_dir, options):
+    try:
+        return process_file(file_path, output_dir, **options)
+    except Exception as e:
+        return {'file': file_path, 'error': f"{type(e).__name__}: {e}"}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Detect accident hotspots in one or more files without the web app")
+    parser.add_argument('files', nargs='+', help="accident CSV files")
+    parser.add_argument('-o', '--output-dir', default='output', help="directory for exported results")
+    parser.add_argument('--algorithm', choices=ALGORITHMS, default='dbscan-meters',
+                        help="dbscan-meters: DBSCAN with a radius in meters; dbscan: standardized radius; "
+                             "kmeans / minibatch: exact or streaming K-Means")
+    parser.add_argument('--eps-meters', type=float, default=100.0, help="dbscan-meters neighborhood radius")
+    parser.add_argument('--eps', type=float, default=0.01, help="dbscan neighborhood radius (scaled units)")
+    parser.add_argument('--min-samples', type=int, default=3, help="DBSCAN minimum samples")
+    parser.add_argument('--clusters', type=int, default=5, help="number of K-Means clusters")
+    parser.add_argument('--grid-meters', type=float, help="pre-aggregate into grid cells of this size")
+    parser.add_argument('--severity-weighted', action='store_true', help="weight points by severity")
+    parser.add_argument('--format', choices=OUTPUT_FORMATS, default='csv', help="clustered data format")
+    parser.add_argument('--gazetteer', help="CSV of named areas (Area, Latitude, Longitude)")
+    parser.add_argument('--save-model', action='store_true', help="also write the fitted model (.npz)")
+    parser.add_argument('--map', action='store_true', help="also write an HTML hotspot map")
+    parser.add_argument('-j', '--jobs', type=int, default=-1,
+                        help="worker processes (-1: one per file, up to the CPU count)")
+    args = parser.parse_args(argv)
+
+    if args.format == 'parquet':
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            parser.error("--format parquet requires pyarrow")
+
+    results = run_batch(
+        args.files, args.output_dir, n_jobs=args.jobs,
+        algorithm=args.algorithm, eps_meters=args.eps_meters, eps=args.eps, min_samples=args.min_samples,
+        n_clusters=args.clusters, grid_meters=args.grid_meters, severity_weighted=args.severity_weighted,
+        output_format=args.format, gazetteer=args.gazetteer, save_model=args.save_model, save_map=args.map
+    )
+
+    failed = 0
+    for result in results:
+        if 'error' in result:
+            failed += 1
+            print(f"FAILED {result['file']}: {result['error']}")
+        else:
+            print(f"{result['file']}: {result['rows']:,} rows, {result['hotspots']} hotspots, "
+                  f"{result['noise']:,} noise points in {result['seconds']:.1f}s -> {result['outputs'][0]}")
+    print(f"Processed {len(results) - failed} of {len(results)} files")
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+import hashlib
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+
+class ResultCache:
+    """Thread-safe LRU cache bounded by entry count and approximate size in bytes
+
+    One instance can be shared by every browser session of a Streamlit server
+    (e.g. through ``st.cache_resource``), so analysts working on the same
+    dataset reuse each other's results. Cached numpy arrays are made
+    read-only so no session can modify a result another session sees.
+    """
+
+    def __init__(self, max_entries=64, max_bytes=512 * 1024 ** 2):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._sizes = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key]
+
+    def put(self, key, value, extra_bytes=0):
+        """Store value; ``extra_bytes`` counts memory it holds that cannot be measured (e.g. a folium map)"""
+        _freeze(value)
+        size = _sizeof(value) + extra_bytes
+        with self._lock:
+            if key in self._entries:
+                del self._entries[key]
+            self._entries[key] = value
+            self._sizes[key] = size
+            self._evict()
+        return value
+
+    def get_or_compute(self, key, compute):
+        """Return the cached value for key, computing and storing it on a miss
+
+        A failed computation should raise rather than return a placeholder:
+        the exception propagates and nothing is stored, so the next call
+        computes again.
+        """
+        value = self.get(key)
+        if value is None:
+            value = self.put(key, compute())
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def total_bytes(self):
+        return sum(self._sizes.values())
+
+    def _evict(self):
+        """Drop least-recently-used entries until both bounds hold (keeps the newest)"""
+        while len(self._entries) > 1 and (
+            len(self._entries) > self.max_entries or sum(self._sizes.values()) > self.max_bytes
+        ):
+            key, _ = self._entries.popitem(last=False)
+            del self._sizes[key]
+
+
+def make_key(*parts, **params):
+    """Hashable cache key from positional parts and keyword parameters"""
+    return parts + tuple(sorted((name, _hashable(value)) for name, value in params.items()))
+
+
+def dataset_fingerprint(df, columns=('Latitude', 'Longitude', 'Severity')):
+    """Content hash of a frame's key columns, for data that has no upload key"""
+    columns = [col for col in columns if col in df.columns]
+    hashed = pd.util.hash_pandas_object(df[columns], index=False).to_numpy()
+    return hashlib.sha256(hashed.tobytes()).hexdigest()
+
+
+def _hashable(value):
+    if isinstance(value, np.ndarray):
+        return hashlib.sha256(np.ascontiguousarray(value).tobytes()).hexdigest()
+    if isinstance(value, (list, tuple)):
+        return tuple(_hashable(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _hashable(v)) for k, v in value.items()))
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def _freeze(value):
+    if isinstance(value, np.ndarray):
+        value.setflags(write=False)
+    elif isinstance(value, dict):
+        for item in value.values():
+            _freeze(item)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            _freeze(item)
+
+
+def _sizeof(value):
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, dict):
+        return sum(_sizeof(v) for v in value.values()) + sys.getsizeof(value)
+    if isinstance(value, (list, tuple)):
+        return sum(_sizeof(v) for v in value) + sys.getsizeof(value)
+    # Result objects such as GridKDE report the size of their arrays
+    if isinstance(getattr(value, 'nbytes', None), int):
+        return value.nbytes
+    return sys.getsizeof(value)
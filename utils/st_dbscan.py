@@ -0,0 +1,112 @@
+import numpy as np
+from scipy.spatial import cKDTree
+
+from utils.geo import meters_to_chord, to_unit_sphere
+from utils.metric_dbscan import BlockedDBSCANMixin
+
+MINUTES_PER_DAY = 24 * 60
+
+
+class STDBSCAN(BlockedDBSCANMixin):
+    """Spatio-temporal DBSCAN: neighbors lie within eps_meters and within eps_minutes
+
+    Points are indexed once in a combined space-time KD-tree: unit-sphere
+    coordinates divided by the spatial chord radius, plus time divided by the
+    temporal radius. A max-norm radius-1 query on that tree returns the box
+    enclosing both neighborhoods, and candidates are then filtered by exact
+    great-circle distance, so no pairwise comparison is ever brute-forced.
+    """
+
+    def __init__(self, eps_meters=100.0, eps_minutes=MINUTES_PER_DAY, min_samples=3,
+                 batch_neighbors=1_000_000, batch_rows=200_000):
+        self.eps_meters = eps_meters
+        self.eps_minutes = eps_minutes
+        self.min_samples = min_samples
+        self.batch_neighbors = batch_neighbors
+        self.batch_rows = batch_rows
+
+    def fit_predict(self, coordinates, times, sample_weight=None):
+        """Cluster (lat, lon) rows observed at ``times`` (datetimes); returns labels with -1 for noise
+
+        Rows without a time (NaT) cannot be placed in any time window and are
+        always noise.
+        """
+        coords = np.asarray(coordinates, dtype=float).reshape(-1, 2)
+        times = np.asarray(times, dtype='datetime64[ns]')
+        timed = ~np.isnat(times)
+        labels = np.full(len(coords), -1, dtype=np.int64)
+        core_mask = np.zeros(len(coords), dtype=bool)
+        neighbor_weight = np.zeros(len(coords))
+        if timed.any():
+            minutes = to_minutes(times[timed])
+            rows = np.column_stack([coords[timed], minutes - minutes.min()])
+            weights = None if sample_weight is None else np.asarray(sample_weight, dtype=float)[timed]
+            labels[timed] = self._fit_rows(rows, sample_weight=weights)
+            core_mask[timed] = self.core_sample_mask_
+            neighbor_weight[timed] = self.neighbor_weight_
+        self.core_sample_mask_ = core_mask
+        self.neighbor_weight_ = neighbor_weight
+        return labels
+
+    def _cluster(self, points, weights):
+        chord = float(meters_to_chord(self.eps_meters))
+        xyz = to_unit_sphere(points[:, 0], points[:, 1])
+        scaled = np.column_stack([xyz / chord, points[:, 2] / self.eps_minutes])
+        tree = cKDTree(scaled)
+
+        # Core points: total weight of space-time neighbors (self included) reaches min_samples.
+        # Pairs are kept for the second pass unless they outgrow a few blocks' worth of memory
+        totals = np.zeros(len(xyz))
+        kept, n_kept = [], 0
+        for block, src, dst in self._space_time_pairs(tree, scaled, xyz, chord):
+            totals[block] = np.bincount(src, weights=weights[dst], minlength=len(block))
+            n_kept += len(src)
+            if n_kept > 4 * self.batch_neighbors:
+                kept = None
+            elif kept is not None:
+                kept.append((block, src, dst))
+        core = totals >= self.min_samples
+        self._core_mask = core
+        self._neighbor_weight = totals
+
+        labels = np.full(len(xyz), -1, dtype=np.int64)
+        if not core.any():
+            return labels
+
+        # Second pass: link core neighbors, and find each border point's nearest core neighbor
+        parent = np.arange(len(xyz))
+        nearest_core = np.full(len(xyz), -1, dtype=np.int64)
+        nearest_dist = np.full(len(xyz), np.inf)
+        for block, src, dst in kept if kept is not None else self._space_time_pairs(tree, scaled, xyz, chord):
+            src = block[src]
+            linked = core[src] & core[dst] & (src < dst)
+            self._union(parent, src[linked], dst[linked])
+
+            border = ~core[src] & core[dst]
+            src, dst = src[border], dst[border]
+            dist = np.linalg.norm(xyz[src] - xyz[dst], axis=1)
+            order = np.lexsort((dist, src))
+            first = np.ones(len(order), dtype=bool)
+            first[1:] = src[order[1:]] != src[order[:-1]]
+            best = order[first]
+            closer = dist[best] < nearest_dist[src[best]]
+            nearest_dist[src[best[closer]]] = dist[best[closer]]
+            nearest_core[src[best[closer]]] = dst[best[closer]]
+
+        component = self._flatten(parent)
+        labels[core] = component[core]
+        border = nearest_core >= 0
+        labels[border] = component[nearest_core[border]]
+        return labels
+
+    def _space_time_pairs(self, tree, scaled, xyz, chord):
+        """Neighbor pairs within both radii: max-norm box query, then exact spatial filter"""
+        for block, src, dst in self._pair_blocks(tree, scaled, 1.0, p=np.inf):
+            close = np.sum((xyz[block[src]] - xyz[dst]) ** 2, axis=1) <= chord ** 2
+            yield block, src[close], dst[close]
+
+
+def to_minutes(times):
+    """Minutes since the epoch for datetime-like values"""
+    values = np.asarray(times, dtype='datetime64[ns]')
+    return values.astype(np.int64) / 60e9
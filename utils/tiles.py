@@ -0,0 +1,447 @@
+"""Local z/x/y raster tiles for the heat and hotspot layers, cached on disk.
+
+Instead of embedding every accident in the map HTML, layers are rendered
+into 256 px web-mercator PNG tiles that the map requests as it pans and
+zooms. Tiles are content addressed: a layer's key is a hash of its data and
+rendering settings, so tiles of unchanged data are never rendered twice, and
+changed data simply lands under a new key. A small HTTP endpoint on
+localhost serves cached tiles and renders missing ones on demand. The disk
+cache is bounded; least-recently-used tiles are evicted past its budget.
+
+Usage: python -m utils.tiles {render FILE [--layer heat|hotspots] [--zooms MIN MAX],serve,stats,prune} [--dir DIR]
+"""
+import argparse
+import hashlib
+import io
+import json
+import os
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+from PIL import Image
+from scipy.ndimage import gaussian_filter
+from scipy.spatial import cKDTree
+
+DEFAULT_TILE_DIR = os.environ.get('ACCIDENT_TILE_DIR', os.path.join('.cache', 'tiles'))
+DEFAULT_MAX_BYTES = 1024 ** 3
+TILE_SIZE = 256
+# Deepest zoom served; Leaflet's own tile layers stop at 18-20
+MAX_ZOOM = 20
+RENDERER_VERSION = 1
+
+# Leaflet.heat's default gradient, so tiled and embedded heat maps look alike
+HEAT_GRADIENT = [(0.4, '#0000ff'), (0.6, '#00ffff'), (0.7, '#00ff00'), (0.8, '#ffff00'), (1.0, '#ff0000')]
+# folium's marker colors (red, blue, green, purple, orange, darkred, lightred, beige) as RGB
+CLUSTER_COLORS = ['#d63e2a', '#38aadd', '#72b026', '#d252b9', '#f69730', '#a23336', '#ff8e7f', '#ffcb92']
+
+
+def to_world(lat, lon):
+    """Web-mercator position in [0, 1) world units of (lat, lon) arrays, as (x, y) columns"""
+    lat = np.radians(np.clip(np.asarray(lat, dtype=float), -85.0511, 85.0511))
+    x = (np.asarray(lon, dtype=float) + 180.0) / 360.0
+    y = (1.0 - np.log(np.tan(lat) + 1.0 / np.cos(lat)) / np.pi) / 2.0
+    return np.column_stack([x, y])
+
+
+def valid_tile(z, x, y):
+    """Whether z/x/y names a tile of the web-mercator pyramid up to MAX_ZOOM"""
+    return 0 <= z <= MAX_ZOOM and 0 <= x < 2 ** z and 0 <= y < 2 ** z
+
+
+def _rgb(color):
+    return [int(color[i:i + 2], 16) for i in (1, 3, 5)]
+
+
+class TileLayerSource:
+    """Points and settings of one tiled layer; renders any z/x/y tile of it
+
+    ``kind`` is 'heat' (Gaussian-blurred density, ``values`` optional
+    weights) or 'hotspots' (dots colored by the cluster labels in
+    ``values``; label -1 is skipped).
+    """
+
+    def __init__(self, kind, coordinates, values=None, radius=15, opacity=0.8):
+        if kind not in ('heat', 'hotspots'):
+            raise ValueError("kind must be 'heat' or 'hotspots'")
+        coords = np.asarray(coordinates, dtype=float).reshape(-1, 2)
+        values = np.ones(len(coords)) if values is None else np.asarray(values, dtype=float)
+        if kind == 'hotspots':
+            keep = values >= 0
+            coords, values = coords[keep], values[keep]
+        self.kind = kind
+        self.radius = radius
+        self.opacity = opacity
+        self.world = to_world(coords[:, 0], coords[:, 1])
+        self.values = values
+        self.tree = cKDTree(self.world) if len(self.world) else None
+        self._saturation = {}
+
+        digest = hashlib.sha256()
+        digest.update(json.dumps([RENDERER_VERSION, kind, radius, opacity]).encode())
+        digest.update(np.ascontiguousarray(coords).tobytes())
+        digest.update(np.ascontiguousarray(values).tobytes())
+        self.key = digest.hexdigest()[:24]
+
+    def tiles_with_data(self, zoom):
+        """(x, y) of every tile at ``zoom`` that a point or its blur reaches"""
+        if self.tree is None:
+            return []
+        n = 2 ** zoom
+        pixels = self.world * TILE_SIZE * n
+        margin = self._margin()
+        keys = []
+        # A point reaches the tiles its pixel square of +-margin touches (at most four)
+        for dx in (-margin, margin):
+            for dy in (-margin, margin):
+                x = np.clip((pixels[:, 0] + dx) // TILE_SIZE, 0, n - 1).astype(np.int64)
+                y = np.clip((pixels[:, 1] + dy) // TILE_SIZE, 0, n - 1).astype(np.int64)
+                keys.append(np.unique(x * n + y))
+        tiles = np.unique(np.concatenate(keys))
+        return list(zip((tiles // n).tolist(), (tiles % n).tolist()))
+
+    def render(self, z, x, y):
+        """PNG bytes of tile z/x/y (fully transparent where there is no data)"""
+        if not valid_tile(z, x, y):
+            raise ValueError(f"no tile {z}/{x}/{y}; zoom must be 0-{MAX_ZOOM} and x, y within 0-2^zoom")
+        margin = self._margin()
+        size = TILE_SIZE + 2 * margin
+        rows = self._points_near(z, x, y, margin)
+        scale = TILE_SIZE * 2 ** z
+        pixels = self.world[rows] * scale - [x * TILE_SIZE - margin, y * TILE_SIZE - margin]
+        col, row = np.floor(pixels[:, 0]).astype(np.int64), np.floor(pixels[:, 1]).astype(np.int64)
+        inside = (col >= 0) & (col < size) & (row >= 0) & (row < size)
+        col, row, rows = col[inside], row[inside], rows[inside]
+
+        rgba = np.zeros((size, size, 4), dtype=np.uint8)
+        if len(rows) and self.kind == 'heat':
+            counts = np.bincount(row * size + col, weights=self.values[rows], minlength=size * size)
+            density = gaussian_filter(counts.reshape(size, size), self.radius / 3)
+            intensity = np.clip(density / self._heat_saturation(z), 0.0, 1.0)
+            stops = [position for position, _ in HEAT_GRADIENT]
+            for channel in range(3):
+                levels = [_rgb(color)[channel] for _, color in HEAT_GRADIENT]
+                rgba[..., channel] = np.interp(intensity, stops, levels).astype(np.uint8)
+            # Like Leaflet.heat, faint heat fades out instead of showing the bottom color
+            rgba[..., 3] = (np.clip(intensity / stops[0], 0.0, 1.0) * 255 * self.opacity).astype(np.uint8)
+        elif len(rows):
+            dot = max(int(round(self.radius / 4)), 2)
+            offsets = np.array([(dr, dc) for dr in range(-dot, dot + 1) for dc in range(-dot, dot + 1)
+                                if dr * dr + dc * dc <= dot * dot])
+            colors = np.array([_rgb(color) + [int(255 * self.opacity)] for color in CLUSTER_COLORS], dtype=np.uint8)
+            labels = self.values[rows].astype(np.int64) % len(CLUSTER_COLORS)
+            stamp_row = (row[:, None] + offsets[:, 0]).ravel()
+            stamp_col = (col[:, None] + offsets[:, 1]).ravel()
+            stamp_color = np.repeat(colors[labels], len(offsets), axis=0)
+            ok = (stamp_row >= 0) & (stamp_row < size) & (stamp_col >= 0) & (stamp_col < size)
+            rgba[stamp_row[ok], stamp_col[ok]] = stamp_color[ok]
+
+        tile = rgba[margin:margin + TILE_SIZE, margin:margin + TILE_SIZE]
+        buffer = io.BytesIO()
+        Image.fromarray(tile, 'RGBA').save(buffer, format='PNG', optimize=False)
+        return buffer.getvalue()
+
+    def _margin(self):
+        """Pixels around a tile whose points still show inside it"""
+        return int(np.ceil(self.radius)) if self.kind == 'heat' else max(int(round(self.radius / 4)), 2)
+
+    def _points_near(self, z, x, y, margin):
+        if self.tree is None:
+            return np.empty(0, dtype=np.int64)
+        tile_world = 1.0 / 2 ** z
+        center = [(x + 0.5) * tile_world, (y + 0.5) * tile_world]
+        half = tile_world * (0.5 + margin / TILE_SIZE)
+        return np.asarray(self.tree.query_ball_point(center, half, p=np.inf), dtype=np.int64)
+
+    def _heat_saturation(self, zoom):
+        """Density that maps to full heat at a zoom: the densest blur-sized patch, the same for every tile"""
+        # At most MAX_ZOOM + 1 entries, since render() only accepts valid tiles
+        if zoom not in self._saturation:
+            patch = max(self.radius, 1)
+            cells = np.floor(self.world * TILE_SIZE * 2 ** zoom / patch).astype(np.int64)
+            keys = cells[:, 0] * (TILE_SIZE * 2 ** zoom // patch + 1) + cells[:, 1]
+            _, inverse = np.unique(keys, return_inverse=True)
+            peak = np.bincount(inverse.ravel(), weights=self.values).max() if len(keys) else 1.0
+            # A patch of total weight w blurred with sigma = radius / 3 peaks near w / (2 pi sigma^2)
+            self._saturation[zoom] = max(peak / (2 * np.pi * (self.radius / 3) ** 2), 1e-9)
+        return self._saturation[zoom]
+
+
+class TileCache:
+    """Rendered tiles on disk as DIR/<layer key>/<z>/<x>/<y>.png
+
+    Once the tiles grow past ``max_bytes``, the least recently used are
+    deleted down to 90% of the budget (reads touch a tile's mtime).
+    """
+
+    def __init__(self, directory=DEFAULT_TILE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._total = None
+        self._lock = threading.Lock()
+
+    def path(self, key, z, x, y):
+        return os.path.join(self.directory, key, str(z), str(x), f"{y}.png")
+
+    def get(self, source, z, x, y):
+        """Tile bytes, rendered and stored only if this layer's tile is not cached yet"""
+        path = self.path(source.key, z, x, y)
+        tile = self.read(path)
+        if tile is not None:
+            return tile
+        tile = source.render(z, x, y)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Concurrent requests may render the same tile; whichever rename lands last is identical
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, 'wb') as f:
+            f.write(tile)
+        os.replace(tmp, path)
+        self._added(len(tile))
+        return tile
+
+    def read(self, path):
+        """Bytes of a cached tile (marking it recently used), or None"""
+        try:
+            with open(path, 'rb') as f:
+                tile = f.read()
+            os.utime(path, None)
+            return tile
+        except FileNotFoundError:
+            return None
+
+    def prerender(self, source, zooms):
+        """Render every tile with data at the given zoom levels; returns how many were new"""
+        rendered = 0
+        for z in zooms:
+            for x, y in source.tiles_with_data(z):
+                if not os.path.exists(self.path(source.key, z, x, y)):
+                    self.get(source, z, x, y)
+                    rendered += 1
+        return rendered
+
+    def stats(self):
+        layers, tiles, size = 0, 0, 0
+        if os.path.isdir(self.directory):
+            layers = len(os.listdir(self.directory))
+            for path, tile_bytes, _ in self._tiles():
+                tiles += 1
+                size += tile_bytes
+        return {'layers': layers, 'tiles': tiles, 'megabytes': round(size / 1024 ** 2, 1),
+                'budget_megabytes': round(self.max_bytes / 1024 ** 2, 1)}
+
+    def evict(self, max_bytes=None):
+        """Delete least-recently-used tiles until the cache fits in max_bytes; returns how many"""
+        budget = self.max_bytes if max_bytes is None else max_bytes
+        with self._lock:
+            tiles = sorted(self._tiles(), key=lambda tile: tile[2])
+            total = sum(tile_bytes for _, tile_bytes, _ in tiles)
+            removed = 0
+            for path, tile_bytes, _ in tiles:
+                if total <= budget:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= tile_bytes
+                removed += 1
+            self._total = total
+        self._prune_directories()
+        return removed
+
+    def _added(self, tile_bytes):
+        with self._lock:
+            if self._total is None:
+                self._total = sum(size for _, size, _ in self._tiles())
+            else:
+                self._total += tile_bytes
+            over = self._total > self.max_bytes
+        if over:
+            self.evict(int(self.max_bytes * 0.9))
+
+    def _tiles(self):
+        """(path, bytes, last used) of every cached tile"""
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith('.png'):
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    yield path, stat.st_size, stat.st_mtime
+
+    def _prune_directories(self):
+        for root, dirs, files in os.walk(self.directory, topdown=False):
+            if root != self.directory and not dirs and not files:
+                try:
+                    os.rmdir(root)
+                except OSError:
+                    pass
+
+
+class TileServer:
+    """Local HTTP endpoint for tiles: GET /tiles/<layer key>/<z>/<x>/<y>.png
+
+    Cached tiles of any layer are served straight from disk; missing tiles
+    are rendered for the ``max_sources`` layers registered most recently in
+    this process (each holds its points and their spatial index in memory).
+    Map URLs point at ``public_url`` when the browser reaches the server
+    through another address, such as a reverse proxy.
+    """
+
+    def __init__(self, cache=None, host='127.0.0.1', port=0, public_url=None, max_sources=8):
+        self.cache = cache or TileCache()
+        self.max_sources = max_sources
+        self.sources = OrderedDict()
+        self._sources_lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler())
+        self._httpd.daemon_threads = True
+        self.host, self.port = self._httpd.server_address[:2]
+        self.public_url = (public_url or f"http://{self.host}:{self.port}").rstrip('/')
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+            self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self._httpd.serve_forever()
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        self._thread = None
+
+    def register(self, source):
+        """Make a layer renderable, dropping the least recently used beyond max_sources
+
+        Returns the layer's {z}/{x}/{y} URL template. Tiles of dropped
+        layers that are already on disk are still served.
+        """
+        with self._sources_lock:
+            self.sources[source.key] = source
+            self.sources.move_to_end(source.key)
+            while len(self.sources) > self.max_sources:
+                self.sources.popitem(last=False)
+        return self.url_template(source.key)
+
+    def source(self, key):
+        """The registered layer for a key (marking it recently used), or None"""
+        with self._sources_lock:
+            if key in self.sources:
+                self.sources.move_to_end(key)
+            return self.sources.get(key)
+
+    def url_template(self, key):
+        return f"{self.public_url}/tiles/{key}/{{z}}/{{x}}/{{y}}.png"
+
+    def _handler(self):
+        server = self
+
+        class TileHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                parts = self.path.split('?')[0].strip('/').split('/')
+                tile = None
+                if len(parts) == 5 and parts[0] == 'tiles' and parts[4].endswith('.png'):
+                    key, z, x, y = parts[1], parts[2], parts[3], parts[4][:-4]
+                    if z.isdigit() and x.isdigit() and y.isdigit() and key.isalnum() \
+                            and valid_tile(int(z), int(x), int(y)):
+                        z, x, y = int(z), int(x), int(y)
+                        source = server.source(key)
+                        if source is not None:
+                            tile = server.cache.get(source, z, x, y)
+                        else:
+                            tile = server.cache.read(server.cache.path(key, z, x, y))
+                if tile is None:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', 'image/png')
+                self.send_header('Content-Length', str(len(tile)))
+                self.send_header('Access-Control-Allow-Origin', '*')
+                # The URL names the content, so browsers may keep tiles indefinitely
+                self.send_header('Cache-Control', 'public, max-age=31536000, immutable')
+                self.end_headers()
+                self.wfile.write(tile)
+
+            def log_message(self, format, *args):
+                pass
+
+        return TileHandler
+
+
+_shared_server = None
+_shared_lock = threading.Lock()
+
+
+def shared_server(directory=DEFAULT_TILE_DIR):
+    """The process-wide tile endpoint, started on first use
+
+    ACCIDENT_TILE_HOST and ACCIDENT_TILE_PORT set where it listens, and
+    ACCIDENT_TILE_URL the address browsers fetch tiles from.
+    """
+    global _shared_server
+    with _shared_lock:
+        if _shared_server is None:
+            _shared_server = TileServer(TileCache(directory),
+                                        host=os.environ.get('ACCIDENT_TILE_HOST', '127.0.0.1'),
+                                        port=int(os.environ.get('ACCIDENT_TILE_PORT', 0)),
+                                        public_url=os.environ.get('ACCIDENT_TILE_URL') or None).start()
+        return _shared_server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render, serve and inspect cached map tiles")
+    parser.add_argument('--dir', default=DEFAULT_TILE_DIR, help="tile cache directory")
+    sub = parser.add_subparsers(dest='command', required=True)
+    render = sub.add_parser('render', help="pre-render a layer's tiles from an accident file")
+    render.add_argument('file', help="accident CSV, or a clustered CSV/Parquet with a Cluster column")
+    render.add_argument('--layer', choices=['heat', 'hotspots'], default='heat')
+    render.add_argument('--zooms', type=int, nargs=2, default=[10, 15], metavar=('MIN', 'MAX'))
+    render.add_argument('--radius', type=int, default=15, help="heat radius in pixels")
+    render.add_argument('--severity-weighted', action='store_true', help="weight heat by severity")
+    serve = sub.add_parser('serve', help="serve cached tiles over HTTP until interrupted")
+    serve.add_argument('--host', default='127.0.0.1', help="address to listen on (0.0.0.0 for all)")
+    serve.add_argument('--port', type=int, default=8765)
+    sub.add_parser('stats', help="show cached layers, tiles and size")
+    prune = sub.add_parser('prune', help="evict least-recently-used tiles down to a size")
+    prune.add_argument('--max-size', type=float, required=True, metavar='MB')
+    args = parser.parse_args(argv)
+
+    cache = TileCache(args.dir)
+    if args.command == 'render':
+        if not 0 <= args.zooms[0] <= args.zooms[1] <= MAX_ZOOM:
+            parser.error(f"--zooms must satisfy 0 <= MIN <= MAX <= {MAX_ZOOM}")
+        import pandas as pd
+        from utils.data_processor import DataProcessor
+        if args.file.endswith('.parquet'):
+            df = pd.read_parquet(args.file)
+        else:
+            df = pd.read_csv(args.file) if args.layer == 'hotspots' else DataProcessor().process(args.file)
+        coords = df[['Latitude', 'Longitude']].to_numpy()
+        if args.layer == 'hotspots':
+            source = TileLayerSource('hotspots', coords, df['Cluster'].to_numpy(), radius=args.radius)
+        else:
+            weights = df['Severity'].to_numpy(dtype=float) if args.severity_weighted else None
+            source = TileLayerSource('heat', coords, weights, radius=args.radius)
+        count = cache.prerender(source, range(args.zooms[0], args.zooms[1] + 1))
+        print(f"Layer {source.key}: {count:,} new tiles in {args.dir}")
+    elif args.command == 'serve':
+        server = TileServer(cache, host=args.host, port=args.port)
+        print(f"Serving tiles from {args.dir} at {server.public_url}/tiles/<layer>/<z>/<x>/<y>.png")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+    elif args.command == 'prune':
+        print(f"Removed {cache.evict(int(args.max_size * 1024 ** 2)):,} tiles")
+    else:
+        print(", ".join(f"{key}: {value}" for key, value in cache.stats().items()))
+
+
+if __name__ == '__main__':
+    main()
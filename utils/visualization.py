@@ -3,36 +3,47 @@ from folium.plugins import HeatMap
 import pandas as pd
 import numpy as np
 
+from utils.cluster_store import shared_cluster_store
+from utils.heat_data import heat_data
+from utils.map_layers import PointLayer
+
 class MapVisualizer:
-    def __init__(self):
+    def __init__(self, cluster_store=None):
         self.coimbatore_center = [11.0168, 76.9558]  # Gandhipuram as center
+        self.cluster_store = cluster_store or shared_cluster_store()
     
-    def create_cluster_map(self, df, algorithm=None):
-        """Create a map showing accident clusters"""
+    def create_cluster_map(self, df, algorithm=None, vectorized=True, dataset_key=None):
+        """Create a map showing accident clusters
+
+        Without a Cluster column, labels come from the shared cluster store
+        (the dataset's latest detection run, or a default clustering computed
+        once), so rendering never fits a model. With ``vectorized`` all
+        markers go into one PointLayer; otherwise each accident gets its own
+        folium marker and popup (slow beyond ~20k rows).
+        """
         m = folium.Map(location=self.coimbatore_center, zoom_start=12)
         
-        # Check if Cluster column exists
         if 'Cluster' not in df.columns:
-            # Create simple clusters based on location
-            try:
-                from sklearn.cluster import KMeans
-                coords = df[['Latitude', 'Longitude']].values
-                n_clusters = min(5, len(df))
-                if n_clusters > 1:
-                    kmeans = KMeans(n_clusters=n_clusters, random_state=42)
-                    df = df.copy()
-                    df['Cluster'] = kmeans.fit_predict(coords)
-                else:
-                    # If only one point, assign to cluster 0
-                    df = df.copy()
-                    df['Cluster'] = 0
-            except Exception as e:
-                st.warning(f"Could not create clusters: {e}. Using point map instead.")
-                return self.create_point_map(df)
+            df = df.assign(Cluster=self.cluster_store.labels_for(df, dataset_key))
         
         # Color scheme for clusters
         colors = ['red', 'blue', 'green', 'purple', 'orange', 'darkred', 'lightred', 'beige']
         
+        if vectorized:
+            clusters = df['Cluster'].to_numpy(dtype=np.int64)
+            PointLayer(
+                df['Latitude'], df['Longitude'], clusters % len(colors), colors,
+                fields={
+                    'Cluster': (None, clusters),
+                    'Severity': ('Severity', df['Severity']),
+                    'Vehicles': ('Vehicles', df['Vehicles_Involved']),
+                    'Weather': ('Weather', df['Weather']),
+                    'Road': ('Road', df['Road_Type'])
+                },
+                title='Cluster {Cluster}', radius=8, opacity=0.6, weight=2
+            ).add_to(m)
+            return m
+        
         # Add clusters to map
         for cluster_id in df['Cluster'].unique():
             cluster_data = df[df['Cluster'] == cluster_id]
@@ -60,21 +71,26 @@ class MapVisualizer:
         
         return m
     
-    def create_heat_map(self, df, radius=15):
-        """Create a heat map of accident density"""
+    def create_heat_map(self, df, radius=15, severity_weighted=False, max_points=100_000):
+        """Create a heat map of accident density (optionally severity), pre-aggregated into grid cells"""
         m = folium.Map(location=self.coimbatore_center, zoom_start=12)
         
         # Prepare heat data
-        heat_data = [[row['Latitude'], row['Longitude']] for _, row in df.iterrows()]
+        weights = None
+        if severity_weighted:
+            # Relative to the mean severity, so the overall intensity matches the unweighted map
+            weights = df['Severity'].to_numpy(dtype=float) / max(df['Severity'].mean(), 1e-9)
+        data = heat_data(df[['Latitude', 'Longitude']].to_numpy(), sample_weight=weights, radius=radius,
+                         max_points=max_points)
         
         # Add heat map
-        if heat_data:
-            HeatMap(heat_data, radius=radius).add_to(m)
+        if len(data):
+            HeatMap(data, radius=radius).add_to(m)
         
         return m
     
-    def create_point_map(self, df, point_size=6, opacity=0.7):
-        """Create a map with individual accident points"""
+    def create_point_map(self, df, point_size=6, opacity=0.7, vectorized=True):
+        """Create a map with individual accident points (one PointLayer unless ``vectorized`` is False)"""
         m = folium.Map(location=self.coimbatore_center, zoom_start=12)
         
         # Color by severity
@@ -85,6 +101,10 @@ class MapVisualizer:
             4: 'red'
         }
         
+        if vectorized:
+            self._severity_layer(df, severity_colors, point_size, opacity).add_to(m)
+            return m
+        
         for _, row in df.iterrows():
             color = severity_colors.get(row['Severity'], 'gray')
             
@@ -109,6 +129,153 @@ class MapVisualizer:
         
         return m
     
+    def create_base_map(self, zoom_start=12):
+        """Create an empty map centered on the city"""
+        return folium.Map(location=self.coimbatore_center, zoom_start=zoom_start)
+    
+    def create_tiled_map(self, tile_url, name, attribution="Accident data"):
+        """Create a map showing a locally served {z}/{x}/{y} tile layer (see utils.tiles)"""
+        m = self.create_base_map()
+        folium.TileLayer(tiles=tile_url, attr=attribution, name=name, overlay=True, control=True,
+                         max_zoom=19).add_to(m)
+        return m
+    
+    def create_viewport_layer(self, view, point_size=6, opacity=0.7):
+        """Create a feature group for a ViewportIndex view: accident markers, or cells sized by count"""
+        group = folium.FeatureGroup(name="Accidents")
+        data = view['data']
+        if len(data) == 0:
+            return group
+        
+        if view['mode'] == 'markers':
+            severity_colors = {1: 'green', 2: 'yellow', 3: 'orange', 4: 'red'}
+            self._severity_layer(data, severity_colors, point_size, opacity).add_to(group)
+            return group
+        
+        # Cells: area grows with the accident count, color with mean severity
+        counts = data['Accidents'].to_numpy()
+        radius = 4 + 16 * np.sqrt(counts / counts.max())
+        palette = ['#fed976', '#feb24c', '#fd8d3c', '#f03b20', '#bd0026']
+        color_codes = np.clip(np.round((data['Avg_Severity'].to_numpy() - 1) * 4 / 3), 0, 4).astype(int)
+        PointLayer(
+            data['Latitude'], data['Longitude'], color_codes, palette,
+            fields={
+                'Accidents': (None, counts),
+                'Severity': ('Average severity', data['Avg_Severity'].round(2).astype(str))
+            },
+            title='{Accidents} accidents', radius=radius, opacity=opacity
+        ).add_to(group)
+        return group
+    
+    def _severity_layer(self, df, severity_colors, point_size, opacity):
+        """PointLayer of accidents colored by severity, with the standard accident popup"""
+        palette = ['gray'] + list(severity_colors.values())
+        color_codes = df['Severity'].map({level: i + 1 for i, level in enumerate(severity_colors)}).fillna(0)
+        return PointLayer(
+            df['Latitude'], df['Longitude'], color_codes, palette,
+            fields={
+                'Severity': ('Severity', df['Severity']),
+                'Weather': ('Weather', df['Weather']),
+                'Road': ('Road', df['Road_Type']),
+                'Vehicles': ('Vehicles', df['Vehicles_Involved'])
+            },
+            title='Accident Details', radius=point_size, opacity=opacity
+        )
+    
+    def create_risk_surface_map(self, surface, opacity=0.6, levels=None):
+        """Create a map of kernel density risk bands from a fitted GridKDE"""
+        m = folium.Map(location=self.coimbatore_center, zoom_start=12)
+        
+        bands = surface.contours(levels)['features']
+        colors = ['#ffffb2', '#fed976', '#feb24c', '#fd8d3c', '#f03b20', '#bd0026']
+        for i, band in enumerate(bands):
+            color = colors[min(i * len(colors) // max(len(bands), 1), len(colors) - 1)]
+            upper = band['properties']['upper']
+            label = f"{band['properties']['lower']:,.0f}" + (f"–{upper:,.0f}" if upper is not None else "+")
+            folium.GeoJson(
+                band,
+                style_function=lambda _, color=color: {
+                    'fillColor': color, 'color': color, 'weight': 1, 'fillOpacity': opacity
+                },
+                tooltip=f"Risk density {label} accidents/km²"
+            ).add_to(m)
+        
+        return m
+    
+    def create_gi_map(self, cells, cell_lat, cell_lon, opacity=0.6, max_cells=5000):
+        """Create a map of significant Gi* hot and cold spot cells (strongest max_cells by |z|)"""
+        m = folium.Map(location=self.coimbatore_center, zoom_start=12)
+        
+        class_colors = {
+            'Hot Spot (99%)': '#d62f27', 'Hot Spot (95%)': '#ed7551', 'Hot Spot (90%)': '#fab984',
+            'Cold Spot (90%)': '#c0ccbe', 'Cold Spot (95%)': '#849eba', 'Cold Spot (99%)': '#4575b5'
+        }
+        cells = cells[cells['Class'] != 'Not Significant']
+        cells = cells.loc[cells['Gi_Z'].abs().sort_values(ascending=False).index[:max_cells]]
+        
+        south = (cells['Latitude'] - cell_lat / 2).round(6).to_numpy()
+        north = (cells['Latitude'] + cell_lat / 2).round(6).to_numpy()
+        west = (cells['Longitude'] - cell_lon / 2).round(6).to_numpy()
+        east = (cells['Longitude'] + cell_lon / 2).round(6).to_numpy()
+        features = [
+            {
+                'type': 'Feature',
+                'properties': {'class': cls, 'accidents': int(count), 'z': round(float(z), 2),
+                               'color': class_colors[cls]},
+                'geometry': {'type': 'Polygon', 'coordinates': [[[w, s], [e, s], [e, n], [w, n], [w, s]]]}
+            }
+            for s, n, w, e, cls, count, z in zip(south, north, west, east, cells['Class'],
+                                                 cells['Accidents'], cells['Gi_Z'])
+        ]
+        if features:
+            folium.GeoJson(
+                {'type': 'FeatureCollection', 'features': features},
+                style_function=lambda feature: {
+                    'fillColor': feature['properties']['color'], 'color': feature['properties']['color'],
+                    'weight': 0.5, 'fillOpacity': opacity
+                },
+                tooltip=folium.GeoJsonTooltip(fields=['class', 'accidents', 'z'],
+                                              aliases=['Class', 'Accidents', 'Gi* z-score'])
+            ).add_to(m)
+        
+        return m
+    
+    def create_hex_map(self, hexes, grid, value='Accidents', opacity=0.6):
+        """Create a map of hexagon aggregates (from HexGrid.aggregate) colored by quantiles of value"""
+        m = folium.Map(location=self.coimbatore_center, zoom_start=12)
+        if len(hexes) == 0:
+            return m
+
+        colors = ['#ffffb2', '#fed976', '#feb24c', '#fd8d3c', '#f03b20', '#bd0026']
+        values = hexes[value].to_numpy(dtype=float)
+        edges = np.unique(np.quantile(values, np.linspace(0, 1, len(colors) + 1)[1:-1]))
+        classes = np.searchsorted(edges, values, side='right')
+        rings = grid.cell_polygons(hexes['Hex_ID'].to_numpy()).round(6).tolist()
+
+        tooltip_fields = ['Accidents', 'Avg_Severity', 'Max_Severity']
+        if 'Main_Weather' in hexes.columns:
+            tooltip_fields.append('Main_Weather')
+        properties = hexes[tooltip_fields].round(2).to_dict('records')
+        features = [
+            {
+                'type': 'Feature',
+                'properties': dict(props, color=colors[cls]),
+                'geometry': {'type': 'Polygon', 'coordinates': [ring]}
+            }
+            for ring, props, cls in zip(rings, properties, classes)
+        ]
+        folium.GeoJson(
+            {'type': 'FeatureCollection', 'features': features},
+            style_function=lambda feature: {
+                'fillColor': feature['properties']['color'], 'color': feature['properties']['color'],
+                'weight': 0.5, 'fillOpacity': opacity
+            },
+            tooltip=folium.GeoJsonTooltip(fields=tooltip_fields,
+                                          aliases=[field.replace('_', ' ') for field in tooltip_fields])
+        ).add_to(m)
+
+        return m
+
     def get_map_bounds(self, df):
         """Get map bounds to fit all data"""
         if len(df) == 0: